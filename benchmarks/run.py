@@ -0,0 +1,357 @@
+"""
+Benchmarks for the geo lookup, dataset loading, recommendation stages and preprocessing.
+
+Runs fully offline on synthetic data (benchmarks/synthetic.py) with the stub
+classifier and LLM from services/stubs.py, and writes JSON results:
+
+    python -m benchmarks.run --out bench.json
+    python -m benchmarks.run --only geo,service --places 50000
+    python -m benchmarks.run --compare before.json after.json
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+from config.settings import Config
+from benchmarks.synthetic import SyntheticDataset
+
+GROUPS = ('geo', 'loader', 'service', 'preprocess')
+
+# Prompts the service benchmarks cycle through
+QUERIES = [
+    "I want a quiet place for a date with natural wine",
+    "late night spicy ramen with friends",
+    "cheap tacos and cocktails, something lively",
+    "cozy brunch spot with pastries and coffee",
+    "somewhere new I haven't tried, surprise me",
+    "rooftop bar with a sunset view and live music",
+]
+
+
+@contextlib.contextmanager
+def quiet():
+    """Swallow the progress prints of the code under test"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+
+def measure(name, fn, repeats, items=1, setup=None, **params):
+    """Time `fn` `repeats` times (after `setup`, untimed) and summarize the wall times"""
+    times = []
+    for _ in range(repeats):
+        arg = setup() if setup is not None else None
+        started = time.perf_counter()
+        with quiet():
+            if setup is not None:
+                fn(arg)
+            else:
+                fn()
+        times.append(time.perf_counter() - started)
+    return summarize(name, times, items, **params)
+
+
+def summarize(name, times, items=1, **params):
+    median = statistics.median(times)
+    return {
+        'name': name,
+        'params': params,
+        'repeats': len(times),
+        'items': items,
+        'min_s': min(times),
+        'median_s': median,
+        'mean_s': statistics.fmean(times),
+        'max_s': max(times),
+        'median_per_item_s': median / items if items else None,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def bench_geo(data, root, repeats, n_points=1000):
+    from data.spatial import PlaceGrid
+    from geo_locator.locator import BoundaryLocator, find_containing_or_nearest, get_locator
+    from geo_locator.preprocessor import load_and_preprocess, load_boundaries
+    from services.geo_service import GeoService
+
+    csv_path = data.write_boundaries(root)
+    results = [measure('geo.load_and_preprocess', lambda: load_and_preprocess(csv_path), repeats,
+                       boundaries=len(data.boundaries))]
+
+    snapshot_dir = os.path.join(root, 'snapshots')
+    os.makedirs(snapshot_dir, exist_ok=True)
+    with quiet():
+        load_boundaries(csv_path, snapshot_dir)
+    results.append(measure('geo.load_boundaries_snapshot', lambda: load_boundaries(csv_path, snapshot_dir), repeats,
+                           boundaries=len(data.boundaries)))
+
+    with quiet():
+        gdf = load_and_preprocess(csv_path)
+        get_locator(gdf)
+    points = data.places[['location.coordinates[0]', 'location.coordinates[1]']].to_numpy()[:n_points]
+
+    def point_queries():
+        for lon, lat in points:
+            find_containing_or_nearest(gdf, lon, lat)
+    results.append(measure('geo.find_containing_or_nearest', point_queries, repeats, items=len(points),
+                           distance_mode=Config.BOUNDARY_DISTANCE_MODE))
+
+    with quiet():
+        geo = GeoService(csv_path)
+    one_city = data.places[data.places['city'] == data.places['city'].iloc[0]]
+    results.append(measure('geo.find_cities_in_boundaries', lambda: geo.find_cities_in_boundaries(one_city), repeats,
+                           items=len(one_city), places=len(one_city)))
+    results.append(measure('geo.find_cities_in_boundaries', lambda: geo.find_cities_in_boundaries(data.places),
+                           repeats, items=len(data.places), places=len(data.places)))
+
+    results.append(measure('geo.neighbour_graph', lambda locator: locator.neighbours(Config.BOUNDARY_NEIGHBOUR_KM * 1000),
+                           repeats, setup=lambda: BoundaryLocator(gdf), boundaries=len(data.boundaries),
+                           within_km=Config.BOUNDARY_NEIGHBOUR_KM))
+
+    results.append(measure('geo.place_grid_build', lambda: PlaceGrid.build(data.places), repeats,
+                           places=len(data.places)))
+    grid = PlaceGrid.build(data.places)
+    results.append(measure('geo.place_grid_within', lambda: [grid.within(lon, lat, Config.NEARBY_RADIUS_KM)
+                                                             for lon, lat in points],
+                           repeats, items=len(points), radius_km=Config.NEARBY_RADIUS_KM))
+    results.append(measure('geo.place_grid_nearest', lambda: [grid.nearest(lon, lat, Config.NEARBY_MIN_PLACES)
+                                                              for lon, lat in points],
+                           repeats, items=len(points), k=Config.NEARBY_MIN_PLACES))
+    return results
+
+
+def bench_loader(data, root, repeats):
+    from data.loader import LOAD_PROFILES, DatasetLoader
+
+    data.write_version(root)
+    results = []
+    for profile in LOAD_PROFILES:
+        results.append(measure('loader.load_datasets', lambda: DatasetLoader(root, profile=profile).load_datasets(),
+                               repeats, profile=profile))
+        results.append(measure('loader.warm_up', lambda: DatasetLoader(root, profile=profile).warm_up(),
+                               repeats, profile=profile))
+        with quiet():
+            report = DatasetLoader(root, profile=profile).warm_up().memory_report()
+        results.append({'name': 'loader.memory', 'params': {'profile': profile},
+                        'bytes': sum(entry['bytes'] for entry in report.values()),
+                        'tables': {table: entry['bytes'] for table, entry in report.items()}})
+    results.append(check_profiles(data, root))
+    return results
+
+
+def check_profiles(data, root):
+    """Run the same requests against every load profile and fail unless prompts and responses match"""
+    from data.loader import LOAD_PROFILES
+    from services.request_context import RequestContext
+
+    services = {profile: make_service(data, root, profile=profile) for profile in LOAD_PROFILES}
+    cities = data.city_picker['city'].tolist()
+    points = data.places[['location.coordinates[0]', 'location.coordinates[1]']].to_numpy()
+    requests = [(cities[i % len(cities)], QUERIES[i % len(QUERIES)], None) for i in range(len(QUERIES) * 2)]
+    requests += [(cities[i % len(cities)], QUERIES[i % len(QUERIES)], points[i]) for i in range(len(QUERIES))]
+
+    mismatches = []
+    with quiet():
+        for user_city, user_prompt, location in requests:
+            outputs = {}
+            for profile, service in services.items():
+                ctx = RequestContext(user_city, user_prompt, user_location=location, order_by_distance=location is not None)
+                for name in service.STAGES + ('get_response',):
+                    service.run_stage(name, ctx)
+                outputs[profile] = (ctx.compiled_prompt, ctx.response)
+            if len(set(outputs.values())) > 1:
+                mismatches.append((user_city, user_prompt, location))
+    if mismatches:
+        raise AssertionError(f"Load profiles disagree on {len(mismatches)} of {len(requests)} requests: {mismatches[:3]}")
+    return {'name': 'loader.profile_equivalence', 'params': {'profiles': list(LOAD_PROFILES)},
+            'requests': len(requests), 'identical': True}
+
+
+def make_service(data, root, cache=False, llm_latency=0.0, profile=None):
+    """RecommendationService over the synthetic version with stub backends.
+
+    Without `cache` both the result cache and the mood cache are off, so every
+    request pays for each stage.
+    """
+    from data.loader import DatasetLoader
+    from services.geo_service import GeoService
+    from services.mood_classifier import MoodClassifier
+    from services.recommendation_service import RecommendationService
+    from services.stubs import AsyncStubOpenAI, StubOpenAI, StubZeroShotClassifier
+
+    with quiet():
+        service = RecommendationService(
+            datasets=DatasetLoader(root, profile=profile).warm_up(),
+            client=StubOpenAI(first_token_latency=llm_latency),
+            async_client=AsyncStubOpenAI(first_token_latency=llm_latency),
+            mood_classifier=MoodClassifier(classifier=StubZeroShotClassifier(), cache_size=None if cache else 0),
+            geo_service=GeoService(data.write_boundaries(root)),
+            cache_enabled=cache,
+        )
+    return service
+
+
+def bench_service(data, root, repeats):
+    from services.request_context import RequestContext
+
+    if not os.path.isdir(os.path.join(root, 'datasets_v1')):
+        data.write_version(root)
+    service = make_service(data, root)
+    cities = data.city_picker['city'].tolist()
+    requests = [(cities[i % len(cities)], QUERIES[i % len(QUERIES)]) for i in range(len(QUERIES) * 2)]
+
+    stage_times = {name: [] for name in service.STAGES + ('get_response',)}
+    with quiet():
+        for _ in range(repeats):
+            for user_city, user_prompt in requests:
+                ctx = RequestContext(user_city, user_prompt)
+                for name in service.STAGES:
+                    service.run_stage(name, ctx)
+                service.run_stage('get_response', ctx)
+                for name, seconds in ctx.timings.items():
+                    stage_times[name].append(seconds)
+    results = [summarize(f"service.{name}", times, requests=len(requests)) for name, times in stage_times.items()]
+
+    def end_to_end():
+        for user_city, user_prompt in requests:
+            service.get_recommendation(user_city, user_prompt)
+    results.append(measure('service.get_recommendation', end_to_end, repeats, items=len(requests), cache=False))
+
+    points = data.places[['location.coordinates[0]', 'location.coordinates[1]']].to_numpy()[:len(requests)]
+    results.append(measure('service.get_recommendation', lambda: [
+        service.get_recommendation(user_city, user_prompt, user_location=point, order_by_distance=True)
+        for (user_city, user_prompt), point in zip(requests, points)], repeats, items=len(requests), nearby=True))
+
+    cached = make_service(data, root, cache=True)
+    results.append(measure('service.get_recommendation', lambda: [cached.get_recommendation(*r) for r in requests],
+                           repeats, items=len(requests), cache=True))
+
+    results.append(measure('service.get_recommendations', lambda: service.get_recommendations(requests), repeats,
+                           items=len(requests), workers=Config.RECOMMENDATION_WORKERS))
+    return results
+
+
+def bench_preprocess(data, root, repeats):
+    from data.preprocessor import DataPreprocessor
+    from services.stubs import StubZeroShotClassifier
+
+    raw_dir = data.write_raw(os.path.join(root, 'raw'))
+
+    def fresh_root():
+        # Each run starts without earlier versions or a warm label cache
+        run_root = tempfile.mkdtemp(dir=root)
+        for name in os.listdir(raw_dir):
+            shutil.copy(os.path.join(raw_dir, name), run_root)
+        return run_root
+
+    return [
+        measure('preprocess.process_all',
+                lambda run_root: DataPreprocessor(run_root, classifier=StubZeroShotClassifier()).process_all(),
+                repeats, setup=fresh_root, places=len(data.places), posts=len(data.posts)),
+        measure('preprocess.process_streaming',
+                lambda run_root: DataPreprocessor(run_root, classifier=StubZeroShotClassifier()).process_streaming(),
+                repeats, setup=fresh_root, places=len(data.places), posts=len(data.posts),
+                memory_limit_mb=Config.PREPROCESS_MEMORY_LIMIT_MB),
+    ]
+
+
+BENCHMARKS = {'geo': bench_geo, 'loader': bench_loader, 'service': bench_service, 'preprocess': bench_preprocess}
+
+
+def run(groups=GROUPS, repeats=5, workdir=None, **sizes):
+    """Generate the synthetic dataset, run the selected benchmark groups and return the results document"""
+    data = SyntheticDataset(**sizes)
+    root = workdir or tempfile.mkdtemp(prefix='dumplinai-bench-')
+    os.makedirs(root, exist_ok=True)
+    try:
+        results = []
+        for group in groups:
+            started = time.perf_counter()
+            results.extend(BENCHMARKS[group](data, root, repeats))
+            print(f"{group}: done in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+    finally:
+        if workdir is None:
+            shutil.rmtree(root, ignore_errors=True)
+    return {
+        'commit': git_commit(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'numpy': np.__version__,
+        'sizes': data.sizes,
+        'repeats': repeats,
+        'distance_mode': Config.BOUNDARY_DISTANCE_MODE,
+        'results': results,
+    }
+
+
+def result_key(result):
+    return result['name'], json.dumps(result['params'], sort_keys=True)
+
+
+def compare(before, after):
+    """Print median time ratios (after / before) for benchmarks present in both result files"""
+    baseline = {result_key(result): result for result in before['results']}
+    print(f"{'benchmark':58} {'before':>10} {'after':>10} {'ratio':>7}")
+    for result in after['results']:
+        old = baseline.get(result_key(result))
+        if old is None or 'median_s' not in result or 'median_s' not in old:
+            continue
+        label = result['name'] + (f" {result['params']}" if result['params'] else '')
+        ratio = result['median_s'] / old['median_s'] if old['median_s'] else float('nan')
+        print(f"{label[:58]:58} {old['median_s']:>10.4f} {result['median_s']:>10.4f} {ratio:>7.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run DumplinAI benchmarks on synthetic data")
+    parser.add_argument('--out', help="Write JSON results here (default: stdout)")
+    parser.add_argument('--only', default=','.join(GROUPS), help=f"Comma-separated groups from {', '.join(GROUPS)}")
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--cities', type=int, default=50)
+    parser.add_argument('--places', type=int, default=20000)
+    parser.add_argument('--posts', type=int, default=50000)
+    parser.add_argument('--creators', type=int, default=500)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workdir', help="Keep generated data here instead of a temporary directory")
+    parser.add_argument('--compare', nargs=2, metavar=('BEFORE', 'AFTER'), help="Compare two result files and exit")
+    args = parser.parse_args()
+
+    if args.compare:
+        with open(args.compare[0]) as f_before, open(args.compare[1]) as f_after:
+            compare(json.load(f_before), json.load(f_after))
+        return
+
+    groups = [group.strip() for group in args.only.split(',') if group.strip()]
+    unknown = set(groups) - set(GROUPS)
+    if unknown:
+        parser.error(f"Unknown benchmark groups: {', '.join(sorted(unknown))}")
+
+    document = run(groups, args.repeats, args.workdir, n_cities=args.cities, n_places=args.places,
+                   n_posts=args.posts, n_creators=args.creators, seed=args.seed)
+    output = json.dumps(document, indent=2)
+    if args.out:
+        with open(args.out, 'w') as f:
+            f.write(output)
+        print(f"Results written to {args.out}")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+"""
+Synthetic DumplinAI datasets for benchmarks.
+
+Everything is generated from a seed, so two runs with the same sizes produce
+identical files. Cities are laid out on a grid of jittered polygons; places
+scatter around the city centres, and some land between polygons so the
+nearest-boundary fallback is exercised too.
+"""
+
+import json
+import os
+
+import numpy as np
+import pandas as pd
+from config.settings import Config
+from data.columnar import save_table, write_manifest
+from data.retrieval import INDEX_FILE, PlaceIndex
+
+BOUNDARIES_FILE = 'DumplinAI.city_boundaries.csv'
+
+# Raw preprocessing inputs, as DataPreprocessor.load_datasets reads them
+RAW_FILES = {
+    'places': 'DumplinAI.places_los.csv',
+    'city_picker': 'DumplinAI.city_picker.csv',
+    'posts': 'DumplinAI.losposts.csv',
+    'creators': 'DumplinAI.creators.csv',
+}
+
+# Grid origin and spacing in degrees (roughly the Los Angeles basin)
+ORIGIN = (-118.9, 33.6)
+SPACING = 0.12
+
+CATEGORIES = ['Restaurant', 'Bar', 'Cafe', 'Bakery', 'Ramen restaurant', 'Taco stand', 'Wine bar', 'Dessert shop']
+WORDS = ('cozy quiet loud late night brunch spicy ramen tacos natural wine cocktails dumplings noodles pizza '
+         'sushi vegan bakery pastries rooftop patio date friends family cheap fancy hidden local classic '
+         'fusion korean thai mexican italian coffee matcha dessert live music dancing view sunset').split()
+STATES = ['CA', 'NY', 'FL', 'TX', 'WA']
+
+
+def city_names(n_cities):
+    return [f"City {i:04d}" for i in range(n_cities)]
+
+
+def city_centers(n_cities):
+    """Centre (lon, lat) of each city on a square grid"""
+    columns = int(np.ceil(np.sqrt(n_cities)))
+    index = np.arange(n_cities)
+    return np.column_stack([ORIGIN[0] + (index % columns) * SPACING, ORIGIN[1] + (index // columns) * SPACING])
+
+
+def _sentences(rng, n, min_words, max_words):
+    lengths = rng.integers(min_words, max_words + 1, n)
+    words = rng.choice(WORDS, lengths.sum())
+    return [' '.join(chunk) for chunk in np.split(words, np.cumsum(lengths)[:-1])]
+
+
+def generate_boundaries(n_cities=50, max_vertices=24, seed=0):
+    """City boundary polygons in the flattened `geometry.coordinates[0][i][j]` CSV layout.
+
+    Vertex counts vary per city; unused trailing vertex columns are left
+    empty, as in the real export.
+    """
+    rng = np.random.default_rng(seed)
+    centers = city_centers(n_cities)
+    vertices = rng.integers(6, max_vertices + 1, n_cities)
+
+    coords = np.full((n_cities, max_vertices + 1, 2), np.nan)
+    for row, (center, count) in enumerate(zip(centers, vertices)):
+        angles = np.sort(rng.uniform(0, 2 * np.pi, count))
+        radius = SPACING * rng.uniform(0.3, 0.5, count)
+        ring = np.column_stack([center[0] + radius * np.cos(angles), center[1] + radius * np.sin(angles)])
+        coords[row, :count] = ring
+        coords[row, count] = ring[0]
+
+    frame = pd.DataFrame({
+        '_id': [f"b{i:06d}" for i in range(n_cities)],
+        'type': 'Feature',
+        'properties.name': city_names(n_cities),
+        'geometry.type': 'Polygon',
+    })
+    columns = {f"geometry.coordinates[0][{vertex}][{axis}]": coords[:, vertex, axis]
+               for vertex in range(max_vertices + 1) for axis in (0, 1)}
+    return pd.concat([frame, pd.DataFrame(columns)], axis=1)
+
+
+def generate_places(n_places=20000, n_cities=50, seed=0, labels=None):
+    """Raw places with a GeoJSON `location` and its flattened coordinates; adds `label` when labels are given"""
+    rng = np.random.default_rng(seed + 1)
+    centers = city_centers(n_cities)
+    city = rng.integers(0, n_cities, n_places)
+    offsets = rng.normal(0, SPACING * 0.3, (n_places, 2))
+    lon, lat = (centers[city] + offsets).T
+
+    places = pd.DataFrame({
+        'title': [f"Place {i}" for i in range(n_places)],
+        'description': _sentences(rng, n_places, 8, 40),
+        'categoryName': rng.choice(CATEGORIES, n_places),
+        'city': np.array(city_names(n_cities))[city],
+        'location': [json.dumps({'type': 'Point', 'coordinates': [x, y]}) for x, y in zip(lon.round(6), lat.round(6))],
+        'location.coordinates[0]': lon,
+        'location.coordinates[1]': lat,
+    })
+    if labels is not None:
+        places['label'] = rng.choice(labels, n_places)
+    return places
+
+
+def generate_city_picker(n_cities=50, seed=0):
+    rng = np.random.default_rng(seed + 2)
+    return pd.DataFrame({
+        'city': city_names(n_cities),
+        'state': rng.choice(STATES, n_cities),
+        'cuisine_summary': _sentences(rng, n_cities, 20, 60),
+    })
+
+
+def generate_creators(n_creators=500, seed=0):
+    rng = np.random.default_rng(seed + 3)
+    return pd.DataFrame({
+        '_id': [f"c{i:06d}" for i in range(n_creators)],
+        'username': [f"creator_{i}" for i in range(n_creators)],
+        'followersCount': rng.integers(100, 1_000_000, n_creators),
+        'profilePicUrl': [f"https://example.com/creators/{i}.jpg" for i in range(n_creators)],
+        'created_at': pd.Timestamp('2023-01-01') + pd.to_timedelta(rng.integers(0, 700, n_creators), unit='D'),
+    })
+
+
+def generate_posts(n_posts=50000, n_cities=50, creators=None, seed=0):
+    """Raw posts (before the creators join) spread over the cities"""
+    rng = np.random.default_rng(seed + 4)
+    creators = creators if creators is not None else generate_creators(seed=seed)
+    return pd.DataFrame({
+        'city': np.array(city_names(n_cities))[rng.integers(0, n_cities, n_posts)],
+        'platform': rng.choice(['tiktok', 'instagram'], n_posts),
+        'creator_id': rng.choice(creators['_id'].to_numpy(), n_posts),
+        'url': [f"https://example.com/posts/{i}" for i in range(n_posts)],
+        'Phase1.transcript.0': _sentences(rng, n_posts, 20, 80),
+        'caption': _sentences(rng, n_posts, 5, 20),
+    })
+
+
+class SyntheticDataset:
+    """Seeded set of boundaries, places, posts, city picker and creators tables"""
+
+    def __init__(self, n_cities=50, n_places=20000, n_posts=50000, n_creators=500, max_vertices=24, seed=0):
+        self.sizes = {'cities': n_cities, 'places': n_places, 'posts': n_posts,
+                      'creators': n_creators, 'max_vertices': max_vertices, 'seed': seed}
+        self.boundaries = generate_boundaries(n_cities, max_vertices, seed)
+        self.creators = generate_creators(n_creators, seed)
+        self.places = generate_places(n_places, n_cities, seed, labels=Config.MOOD_LABELS)
+        self.city_picker = generate_city_picker(n_cities, seed)
+        self.posts = generate_posts(n_posts, n_cities, self.creators, seed)
+
+    def write_boundaries(self, root):
+        path = os.path.join(root, BOUNDARIES_FILE)
+        self.boundaries.to_csv(path, index=False)
+        return path
+
+    def write_raw(self, root):
+        """Raw CSV inputs for DataPreprocessor.process_all, plus the boundaries CSV"""
+        os.makedirs(root, exist_ok=True)
+        self.places.drop(columns='label').to_csv(os.path.join(root, RAW_FILES['places']), index=False)
+        self.city_picker.to_csv(os.path.join(root, RAW_FILES['city_picker']), index=False)
+        self.posts.to_csv(os.path.join(root, RAW_FILES['posts']), index=False)
+        self.creators.to_csv(os.path.join(root, RAW_FILES['creators']), index=False)
+        self.write_boundaries(root)
+        return root
+
+    def write_version(self, root, version=1):
+        """A labeled datasets_v<version> directory, as DataPreprocessor would compile it"""
+        dir_path = os.path.join(root, f"datasets_v{version}")
+        os.makedirs(dir_path, exist_ok=True)
+        posts = pd.merge(self.posts, self.creators, how='left', left_on='creator_id', right_on='_id')
+        save_table(self.places, dir_path, 'places')
+        save_table(self.city_picker, dir_path, 'city_picker')
+        save_table(posts, dir_path, 'posts')
+        save_table(self.creators, dir_path, 'creators')
+        PlaceIndex.build(self.places).save(os.path.join(dir_path, INDEX_FILE))
+        write_manifest(dir_path, {'places': self.places, 'city_picker': self.city_picker,
+                                  'posts': posts, 'creators': self.creators})
+        return dir_path
@@ -0,0 +1,243 @@
+import abc
+import hashlib
+import os
+import zlib
+import numpy as np
+from config.settings import Config
+from data.retrieval import tokenize
+
+BACKENDS = ('zero-shot', 'embedding', 'linear')
+
+
+def softmax(logits):
+    shifted = logits - logits.max(axis=1, keepdims=True)
+    exp = np.exp(shifted)
+    return exp / exp.sum(axis=1, keepdims=True)
+
+
+class ClassifierBackend(abc.ABC):
+    """Mood classifier with the call signature and output of a transformers zero-shot pipeline.
+
+    `backend(texts, labels)` returns one {'sequence', 'labels', 'scores'}
+    dict per text, labels sorted by descending score (a single dict for a
+    single string), so MoodClassifier and BatchLabeler work with any backend.
+    Subclasses implement `scores(texts, labels)` -> array of shape (texts, labels).
+    `name` identifies the backend and its model in label caches. `backend`
+    is the make_classifier key it was built from, so process pools can build
+    the same classifier in their workers; None when built directly.
+    """
+
+    name = None
+    backend = None
+
+    @abc.abstractmethod
+    def scores(self, texts, labels):
+        """Array of shape (texts, labels) with each label's score for each text"""
+
+    def __call__(self, sequences, candidate_labels, **kwargs):
+        single = isinstance(sequences, str)
+        texts = [sequences] if single else [str(text) for text in sequences]
+        labels = list(candidate_labels)
+        scores = self.scores(texts, labels) if texts else np.empty((0, len(labels)))
+        results = []
+        for text, row in zip(texts, scores):
+            order = np.argsort(-row, kind='stable')
+            results.append({'sequence': text, 'labels': [labels[i] for i in order],
+                            'scores': [float(row[i]) for i in order]})
+        return results[0] if single else results
+
+
+class ZeroShotBackend(ClassifierBackend):
+    """transformers zero-shot NLI pipeline: one entailment pass per (text, label) pair"""
+
+    def __init__(self, model=None):
+        from transformers import pipeline
+        self.name = model or Config.CLASSIFIER_MODEL
+        self.pipeline = pipeline(Config.CLASSIFIER_TYPE, model=self.name)
+
+    def scores(self, texts, labels):
+        results = self.pipeline(texts, labels)
+        results = [results] if isinstance(results, dict) else results
+        return np.array([[dict(zip(result['labels'], result['scores']))[label] for label in labels]
+                         for result in results]).reshape(len(texts), len(labels))
+
+    def __call__(self, sequences, candidate_labels, **kwargs):
+        return self.pipeline(sequences, candidate_labels, **kwargs)
+
+
+class EmbeddingBackend(ClassifierBackend):
+    """Cosine similarity between a small sentence-embedding model's text and label embeddings.
+
+    Each text takes one encoder pass regardless of the number of labels;
+    label embeddings are computed once per label set from
+    Config.MOOD_LABEL_DESCRIPTIONS. Requires sentence-transformers.
+    """
+
+    def __init__(self, model=None, descriptions=None, temperature=None, batch_size=None):
+        try:
+            from sentence_transformers import SentenceTransformer
+        except ImportError as e:
+            raise ImportError("The embedding classifier needs `pip install sentence-transformers`") from e
+        self.model_name = model or Config.EMBEDDING_MODEL
+        self.name = f"embedding:{self.model_name}"
+        self.model = SentenceTransformer(self.model_name)
+        self.descriptions = descriptions or Config.MOOD_LABEL_DESCRIPTIONS
+        self.temperature = temperature or Config.EMBEDDING_TEMPERATURE
+        self.batch_size = batch_size or Config.LABEL_BATCH_SIZE
+        self._label_embeddings = {}
+
+    def encode(self, texts):
+        return self.model.encode(list(texts), batch_size=self.batch_size, convert_to_numpy=True,
+                                 normalize_embeddings=True, show_progress_bar=False)
+
+    def label_embeddings(self, labels):
+        key = tuple(labels)
+        if key not in self._label_embeddings:
+            self._label_embeddings[key] = self.encode([self.descriptions.get(label, label) for label in labels])
+        return self._label_embeddings[key]
+
+    def scores(self, texts, labels):
+        similarity = self.encode(texts) @ self.label_embeddings(labels).T
+        return softmax(similarity / self.temperature)
+
+
+def hashed_features(texts, n_features):
+    """L2-normalized log term counts of unigrams and bigrams, hashed into n_features columns.
+
+    Returns CSR arrays (indptr, indices, values).
+    """
+    indptr = [0]
+    indices, values = [], []
+    for text in texts:
+        tokens = tokenize(text)
+        grams = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+        counts = {}
+        for gram in grams:
+            column = zlib.crc32(gram.encode('utf-8')) % n_features
+            counts[column] = counts.get(column, 0) + 1
+        weights = np.log1p(np.fromiter(counts.values(), dtype=np.float32, count=len(counts)))
+        norm = np.sqrt((weights ** 2).sum())
+        indices.extend(counts)
+        values.extend((weights / norm) if norm else weights)
+        indptr.append(len(indices))
+    return np.asarray(indptr, dtype=np.int64), np.asarray(indices, dtype=np.int64), np.asarray(values, dtype=np.float32)
+
+
+class LinearBackend(ClassifierBackend):
+    """Softmax regression over hashed n-gram features, distilled from zero-shot labels.
+
+    Costs microseconds per text and needs only numpy. Train it with
+    `LinearBackend.fit` on texts the zero-shot model already labelled (e.g.
+    a datasets_vN places table), or `python -m classifiers.report distill`.
+    """
+
+    def __init__(self, labels, weights, bias, n_features, name=None):
+        self.labels = list(labels)
+        self.weights = np.asarray(weights, dtype=np.float32)
+        self.bias = np.asarray(bias, dtype=np.float32)
+        self.n_features = int(n_features)
+        self.name = name or 'linear'
+
+    def logits(self, features):
+        indptr, indices, values = features
+        docs = np.repeat(np.arange(len(indptr) - 1), np.diff(indptr))
+        contributions = values[:, None] * self.weights[indices]
+        out = np.empty((len(indptr) - 1, len(self.labels)), dtype=np.float32)
+        for j in range(len(self.labels)):
+            out[:, j] = np.bincount(docs, weights=contributions[:, j], minlength=len(indptr) - 1)
+        return out + self.bias
+
+    def scores(self, texts, labels):
+        missing = [label for label in labels if label not in self.labels]
+        if missing:
+            raise ValueError(f"Linear model was not trained on labels {missing}")
+        columns = [self.labels.index(label) for label in labels]
+        probabilities = softmax(self.logits(hashed_features(texts, self.n_features)))
+        selected = probabilities[:, columns]
+        return selected / selected.sum(axis=1, keepdims=True)
+
+    @classmethod
+    def fit(cls, texts, targets, labels=None, n_features=2 ** 18, epochs=60, learning_rate=0.2, l2=1e-6):
+        """Fit on (text, label) pairs with full-batch Adam on the cross-entropy loss"""
+        labels = list(labels or Config.MOOD_LABELS)
+        label_ids = {label: i for i, label in enumerate(labels)}
+        y = np.array([label_ids[target] for target in targets])
+        onehot = np.eye(len(labels), dtype=np.float32)[y]
+        model = cls(labels, np.zeros((n_features, len(labels)), np.float32), np.zeros(len(labels), np.float32),
+                    n_features)
+
+        indptr, indices, values = features = hashed_features(texts, n_features)
+        docs = np.repeat(np.arange(len(texts)), np.diff(indptr))
+        # Start from the label priors
+        model.bias = np.log((onehot.mean(axis=0) + 1e-3).astype(np.float32))
+        m_w, v_w = np.zeros_like(model.weights), np.zeros_like(model.weights)
+        m_b, v_b = np.zeros_like(model.bias), np.zeros_like(model.bias)
+        beta1, beta2, eps = 0.9, 0.999, 1e-8
+        for step in range(1, epochs + 1):
+            error = (softmax(model.logits(features)) - onehot) / len(texts)
+            grad_w = np.empty_like(model.weights)
+            for j in range(len(labels)):
+                grad_w[:, j] = np.bincount(indices, weights=values * error[docs, j], minlength=n_features)
+            grad_w += l2 * model.weights
+            grad_b = error.sum(axis=0)
+            for param, grad, m, v in ((model.weights, grad_w, m_w, v_w), (model.bias, grad_b, m_b, v_b)):
+                m *= beta1
+                m += (1 - beta1) * grad
+                v *= beta2
+                v += (1 - beta2) * grad ** 2
+                param -= learning_rate * (m / (1 - beta1 ** step)) / (np.sqrt(v / (1 - beta2 ** step)) + eps)
+        return model
+
+    def save(self, path):
+        """Write the model to path, with an .npz suffix added if missing; returns the path written"""
+        path = os.fspath(path)
+        if not path.endswith('.npz'):
+            path += '.npz'
+        with open(path, 'wb') as f:
+            np.savez(f, weights=self.weights, bias=self.bias, labels=np.array(self.labels, dtype=str),
+                     n_features=np.array(self.n_features))
+        return path
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            digest = hashlib.sha256(f.read()).hexdigest()[:12]
+        with np.load(path, allow_pickle=False) as data:
+            return cls(data['labels'].tolist(), data['weights'], data['bias'], int(data['n_features']),
+                       name=f"linear:{digest}")
+
+
+def linear_model_path(root=None):
+    return os.path.join(root or Config.ROOT, Config.CLASSIFIER_LINEAR_MODEL_FILE)
+
+
+def make_classifier(backend=None, root=None):
+    """Build the mood classifier selected by Config.CLASSIFIER_BACKEND (the linear model is read from root)"""
+    backend = backend or Config.CLASSIFIER_BACKEND
+    if backend == 'zero-shot':
+        classifier = ZeroShotBackend()
+    elif backend == 'embedding':
+        classifier = EmbeddingBackend()
+    elif backend == 'linear':
+        classifier = LinearBackend.load(linear_model_path(root))
+    else:
+        raise ValueError(f"Unknown classifier backend {backend!r}, expected one of {BACKENDS}")
+    classifier.backend = backend
+    return classifier
+
+
+def classifier_name(classifier):
+    """Name label caches key results by.
+
+    Backends carry a `name`; an injected transformers pipeline is named after
+    the model it loaded. Anything else, such as a stub, gets its qualified
+    class name, so its labels never land under a real model's key.
+    """
+    name = getattr(classifier, 'name', None)
+    if name:
+        return name
+    model_name = getattr(getattr(classifier, 'model', None), 'name_or_path', None)
+    if isinstance(model_name, str) and model_name:
+        return model_name
+    cls = type(classifier)
+    return f"{cls.__module__}.{cls.__qualname__}"
@@ -0,0 +1,142 @@
+"""
+Distill the linear mood classifier and compare backends against zero-shot labels.
+
+The labelled sample is a datasets_vN places table, whose `label` column the
+preprocessor wrote with the zero-shot model. A fixed, hash-selected share of
+its rows is held out of distillation and used for every comparison.
+
+    python -m classifiers.report distill --root ROOT
+    python -m classifiers.report compare --root ROOT --backends linear,embedding
+    python -m classifiers.report compare --root ROOT --backends zero-shot,linear --reference zero-shot
+"""
+
+import argparse
+import hashlib
+import json
+import time
+
+import numpy as np
+from config.settings import Config
+from classifiers.backends import BACKENDS, LinearBackend, linear_model_path, make_classifier
+from data.labeling import classify_in_batches, top_label
+from data.loader import DatasetLoader
+
+HOLDOUT_PERCENT = 20
+
+
+def in_holdout(text, percent=HOLDOUT_PERCENT):
+    """Stable train/holdout split by text hash, so distill and compare agree without storing it"""
+    return int(hashlib.sha1(str(text).encode('utf-8')).hexdigest()[:8], 16) % 100 < percent
+
+
+def labelled_sample(root, text_column='description', version_dir=None):
+    """(texts, zero-shot labels) of every labelled place in the dataset version"""
+    places = DatasetLoader(root, version_dir=version_dir).get_places(columns=[text_column, 'label'])
+    if places is None:
+        raise FileNotFoundError(f"No datasets version with a places table under {root}")
+    places = places.dropna()
+    places = places[places['label'].isin(Config.MOOD_LABELS)]
+    return places[text_column].astype(str).tolist(), places['label'].tolist()
+
+
+def distill(root, out=None, text_column='description', version_dir=None, **fit_kwargs):
+    """Fit the linear backend on the non-holdout rows and save it where make_classifier('linear') reads it"""
+    texts, labels = labelled_sample(root, text_column, version_dir)
+    train = [(text, label) for text, label in zip(texts, labels) if not in_holdout(text)]
+    if not train:
+        raise ValueError("No training rows outside the holdout")
+    started = time.perf_counter()
+    model = LinearBackend.fit([text for text, _ in train], [label for _, label in train], **fit_kwargs)
+    path = model.save(out or linear_model_path(root))
+    return {'path': path, 'train_rows': len(train), 'seconds': round(time.perf_counter() - started, 3)}
+
+
+def evaluate(classifier, texts, reference, batch_size=None):
+    """Agreement with the reference labels, per-label recall and latency of one backend"""
+    batch_size = batch_size or Config.LABEL_BATCH_SIZE
+    started = time.perf_counter()
+    predicted = [top_label(result) for result in classify_in_batches(classifier, texts, Config.MOOD_LABELS, batch_size)]
+    elapsed = time.perf_counter() - started
+
+    predicted, reference = np.array(predicted), np.array(reference)
+    recall = {label: float((predicted[reference == label] == label).mean())
+              for label in Config.MOOD_LABELS if (reference == label).any()}
+    return {
+        'agreement': float((predicted == reference).mean()) if len(texts) else None,
+        'recall_by_label': recall,
+        'predicted_distribution': {label: int((predicted == label).sum()) for label in Config.MOOD_LABELS},
+        'seconds': round(elapsed, 3),
+        'ms_per_text': round(1000 * elapsed / len(texts), 3) if texts else None,
+        'texts_per_second': round(len(texts) / elapsed, 1) if elapsed > 0 else None,
+    }
+
+
+def compare(root, backends, sample=500, reference='labels', text_column='description', version_dir=None):
+    """Agreement/latency report of each backend on the holdout sample.
+
+    reference='labels' compares against the stored zero-shot labels;
+    reference='zero-shot' relabels the sample with the zero-shot backend first.
+    """
+    texts, labels = labelled_sample(root, text_column, version_dir)
+    holdout = [(text, label) for text, label in zip(texts, labels) if in_holdout(text)][:sample]
+    texts = [text for text, _ in holdout]
+    reference_labels = [label for _, label in holdout]
+
+    report = {'reference': reference, 'sample': len(texts), 'backends': {}}
+    if reference == 'zero-shot':
+        zero_shot = make_classifier('zero-shot')
+        reference_labels = [top_label(result) for result in
+                            classify_in_batches(zero_shot, texts, Config.MOOD_LABELS, Config.LABEL_BATCH_SIZE)]
+        # Agrees with itself by construction; measured for its latency
+        report['backends']['zero-shot'] = evaluate(zero_shot, texts, reference_labels)
+
+    for backend in backends:
+        if backend in report['backends']:
+            continue
+        report['backends'][backend] = evaluate(make_classifier(backend, root), texts, reference_labels)
+
+    baseline = report['backends'].get('zero-shot')
+    if baseline and baseline['seconds']:
+        for result in report['backends'].values():
+            result['speedup_vs_zero_shot'] = round(baseline['seconds'] / result['seconds'], 1) if result['seconds'] else None
+    return report
+
+
+def print_report(report):
+    reference = 'stored zero-shot labels' if report['reference'] == 'labels' else 'zero-shot relabelling'
+    print(f"Reference: {reference}, {report['sample']} holdout texts")
+    print(f"{'backend':12} {'agreement':>10} {'ms/text':>10} {'texts/s':>10} {'speedup':>8}")
+    for backend, result in report['backends'].items():
+        agreement = f"{result['agreement']:.3f}" if result['agreement'] is not None else '-'
+        print(f"{backend:12} {agreement:>10} {result['ms_per_text']:>10} {result['texts_per_second']:>10} "
+              f"{result.get('speedup_vs_zero_shot', '-'):>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Distill and compare mood classifier backends")
+    parser.add_argument('command', choices=['distill', 'compare'])
+    parser.add_argument('--root', default=Config.ROOT)
+    parser.add_argument('--version-dir', help="datasets_vN directory to read (default: latest)")
+    parser.add_argument('--text-column', default='description', help="'summarization' for summarized datasets")
+    parser.add_argument('--out', help="distill: model path; compare: JSON report path")
+    parser.add_argument('--backends', default='linear', help=f"Comma-separated, from {', '.join(BACKENDS)}")
+    parser.add_argument('--sample', type=int, default=500)
+    parser.add_argument('--reference', choices=['labels', 'zero-shot'], default='labels')
+    parser.add_argument('--epochs', type=int, default=60)
+    args = parser.parse_args()
+
+    if args.command == 'distill':
+        result = distill(args.root, args.out, args.text_column, args.version_dir, epochs=args.epochs)
+        print(f"Linear mood model trained on {result['train_rows']} rows in {result['seconds']}s, saved to {result['path']}")
+        return
+
+    backends = [backend.strip() for backend in args.backends.split(',') if backend.strip()]
+    report = compare(args.root, backends, args.sample, args.reference, args.text_column, args.version_dir)
+    print_report(report)
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
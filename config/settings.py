@@ -10,3 +10,102 @@ class Config:
     CLASSIFIER_TYPE = "zero-shot-classification"
     CLASSIFIER_MODEL = "facebook/bart-large-mnli"
     OPENAI_MODEL = "gpt-4o-mini"
+    OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY")
+    OPENAI_BASE_URL = os.environ.get("OPENAI_BASE_URL")  # e.g. a local stub server for benchmarks
+
+    # Mood classifier backend: "zero-shot" (BART NLI, one pass per label), "embedding"
+    # (sentence-embedding similarity) or "linear" (numpy model distilled from zero-shot labels)
+    CLASSIFIER_BACKEND = "zero-shot"
+    EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+    EMBEDDING_TEMPERATURE = 0.05  # softmax temperature over cosine similarities
+    CLASSIFIER_LINEAR_MODEL_FILE = "mood_linear.npz"  # under ROOT, written by `python -m classifiers.report distill`
+    # What each mood means, embedded by the embedding backend instead of the bare label
+    MOOD_LABEL_DESCRIPTIONS = {
+        'lowkey': "a quiet, relaxed, low-key spot to chill without a crowd",
+        'nightout': "a lively night out with drinks, music, dancing and friends",
+        'comforting': "cozy comfort food that feels warm and familiar",
+        'surprise': "something new, unusual and adventurous to try",
+        'hidden gem': "a little-known local favorite off the beaten path",
+    }
+
+    CLASSIFIER_WARM_UP = "background"  # "background" loads the model in a thread at startup, "lazy" on first use
+    MOOD_CACHE_SIZE = 1024  # normalized user prompts kept in the mood LRU cache
+
+    # Batch labeling in the preprocessors
+    LABEL_BATCH_SIZE = 16
+    LABEL_WORKERS = 1  # >1 shards labeling over a process pool
+    LABEL_THREADS_PER_WORKER = None  # torch intra-op threads per pool worker
+    LABEL_PROGRESS_EVERY = 20  # batches between progress reports
+    LABEL_CACHE_FILE = "label_cache.sqlite"  # under ROOT, reused across preprocessing runs
+
+    # Streaming preprocessing: raw exports read in chunks and written partitioned by city
+    PREPROCESS_STREAMING = False  # process_all() default
+    PREPROCESS_MEMORY_LIMIT_MB = 2048  # ceiling for the chunks in flight, excluding the classifier model
+    PREPROCESS_CHUNK_ROWS = None  # fixed rows per chunk; None derives it from the memory limit
+    PREPROCESS_CITY_WORKERS = 1  # >1 labels and writes cities in parallel processes
+
+    # Concurrent summarization in the summarization preprocessor
+    SUMMARY_WORKERS = 8
+    SUMMARY_REQUESTS_PER_MINUTE = 500
+    SUMMARY_MAX_RETRIES = 5
+    SUMMARY_BACKOFF_SECONDS = 1.0
+    SUMMARY_CACHE_FILE = "summary_cache.sqlite"  # under ROOT, lets interrupted runs resume
+
+    # Candidate retrieval before the LLM
+    RETRIEVAL_TOP_K = 40  # places kept after BM25 ranking against the user prompt
+
+    # Recommendation prompt
+    PROMPT_TOKEN_BUDGET = 6000  # whole user prompt, instructions included
+    PROMPT_MAX_FIELD_CHARS = 300  # longer field values are truncated
+    PROMPT_SNIPPET_CACHE_SIZE = 50000  # rendered place/post/city picker lines kept across requests
+
+    # Concurrent requests served by RecommendationService.get_recommendations
+    RECOMMENDATION_WORKERS = 8
+
+    # Recommendation result cache
+    RESULT_CACHE_ENABLED = True
+    RESULT_CACHE_BACKEND = "memory"  # "memory" (per process) or "sqlite" (shared on disk)
+    RESULT_CACHE_PATH = "recommendation_cache.sqlite"
+    RESULT_CACHE_MAX_ENTRIES = 10000  # per tier
+    CANDIDATE_CACHE_TTL = 6 * 3600  # seconds; candidates only change with the dataset version
+    RESPONSE_CACHE_TTL = 3600  # seconds
+
+    # Geo configurations
+    # Nearest-boundary distance: 'geodesic', 'local' (equal-area) or 'mercator' (legacy EPSG:3857)
+    BOUNDARY_DISTANCE_MODE = "geodesic"
+    # Where GeoParquet boundaries snapshots are cached, outside the source and data trees
+    BOUNDARY_SNAPSHOT_DIR = os.path.join(os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"),
+                                         "dumplinai", "boundaries")
+    # Boundaries touching or closer than this count as neighbouring cities
+    BOUNDARY_NEIGHBOUR_KM = 1.0
+    # Places near a user location: radius search, widened to the k nearest when too few match
+    NEARBY_RADIUS_KM = 5.0
+    NEARBY_MIN_PLACES = 20
+    PLACE_GRID_CELL_KM = 2.0
+
+    # HTTP serving (server.py)
+    SERVER_HOST = "127.0.0.1"
+    SERVER_PORT = 8080
+    SERVER_MAX_CONCURRENCY = 16  # requests running the pipeline at once
+    SERVER_MAX_QUEUE = 64  # requests waiting for a slot before new ones get 503
+    SERVER_CPU_WORKERS = 4  # threads for the CPU-bound stages
+
+    # Tracing: per-stage wall time, rows, prompt tokens, cache hits and model latency
+    TRACING_ENABLED = True
+    TRACING_SINKS = ("prometheus",)  # any of "log", "histogram", "prometheus"
+    TRACING_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300, 1800)
+
+    # Dataset frames held by each serving worker: "full" keeps every column as stored; "compact"
+    # stores repeated strings as categoricals, downcasts numbers and leaves cold text on disk
+    DATASET_LOAD_PROFILE = "full"
+    DATASET_CATEGORY_MAX_SHARE = 0.5  # string columns with at most this share of distinct values become categorical
+    DATASET_FLOAT32_COLUMNS = ('location.coordinates[0]', 'location.coordinates[1]')  # float32 keeps about 1 m
+    # Long text only read for the rows of a prompt, taken from the memory-mapped Arrow files when needed
+    DATASET_COLD_COLUMNS = {
+        'places': ('description', 'location'),  # summaries stay resident: they are what prompts render
+        'posts': ('Phase1.transcript.0', 'caption', 'url', 'profilePicUrl'),
+        'creators': ('profilePicUrl',),
+    }
+
+    # Seconds between checks for a newly published datasets_vN directory (0 disables hot reload)
+    DATASET_WATCH_INTERVAL = 30
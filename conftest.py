@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Let tests import the repo's top-level packages (config, data, services, ...) when run from anywhere
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
@@ -0,0 +1,64 @@
+import hashlib
+import json
+import sqlite3
+import threading
+
+
+def content_key(*parts):
+    """Stable hash of JSON-serializable parts, used as a content address"""
+    payload = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class DiskCache:
+    """Persistent key -> JSON value store in a single SQLite file.
+
+    Several processes may share the file (preprocessing city workers each
+    open the label cache): it runs in WAL mode so readers never block the
+    writer, and a writer waits up to `timeout` seconds for the lock.
+    """
+
+    def __init__(self, path, table='entries', timeout=30.0):
+        self.path = path
+        self.table = table
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=timeout, check_same_thread=False)
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+        with self._lock, self._conn:
+            self._conn.execute(f"CREATE TABLE IF NOT EXISTS {table} (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+
+    def get_many(self, keys):
+        """Return {key: value} for the keys present in the cache"""
+        keys = list(keys)
+        found = {}
+        with self._lock:
+            # Stay under SQLite's bound-parameter limit
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                placeholders = ','.join('?' * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT key, value FROM {self.table} WHERE key IN ({placeholders})", chunk
+                ).fetchall()
+                found.update((key, json.loads(value)) for key, value in rows)
+        return found
+
+    def set_many(self, items):
+        """Store an iterable of (key, value) pairs"""
+        rows = [(key, json.dumps(value, ensure_ascii=False)) for key, value in items]
+        with self._lock, self._conn:
+            self._conn.executemany(f"INSERT OR REPLACE INTO {self.table} (key, value) VALUES (?, ?)", rows)
+
+    def get(self, key, default=None):
+        return self.get_many([key]).get(key, default)
+
+    def set(self, key, value):
+        self.set_many([(key, value)])
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
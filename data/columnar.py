@@ -0,0 +1,195 @@
+import glob
+import hashlib
+import json
+import os
+import re
+import time
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+except ImportError:  # CSV-only installs
+    pa = None
+    feather = None
+
+
+# Logical table name -> file stem inside a datasets_vN directory
+TABLE_FILES = {
+    'places': 'DumplinAI.places',
+    'city_picker': 'DumplinAI.city_picker',
+    'posts': 'DumplinAI.posts',
+    'creators': 'DumplinAI.creators',
+}
+
+# Written last into a datasets_vN directory; its presence marks the version as complete
+MANIFEST_FILE = 'manifest.json'
+
+
+def csv_path(dir_path, table):
+    return os.path.join(dir_path, f"{TABLE_FILES[table]}.csv")
+
+
+def arrow_path(dir_path, table):
+    return os.path.join(dir_path, f"{TABLE_FILES[table]}.arrow")
+
+
+def _write_frame(df, csv_file, arrow_file, name):
+    """Write a frame as CSV plus an uncompressed Arrow IPC file that can be memory-mapped"""
+    df.to_csv(csv_file, index=False)
+    if feather is None:
+        return
+    try:
+        # Uncompressed so readers can map the buffers instead of decoding them
+        feather.write_feather(df.reset_index(drop=True), arrow_file, compression='uncompressed')
+    except Exception as e:
+        print(f"Arrow copy of {name} not written, readers will use CSV: {e}")
+        if os.path.exists(arrow_file):
+            os.remove(arrow_file)
+
+
+def _read_frame(csv_file, arrow_file, columns=None):
+    """Read a frame, memory-mapping its Arrow file when present and falling back to CSV"""
+    if feather is not None and os.path.exists(arrow_file):
+        arrow_table = feather.read_table(arrow_file, columns=columns, memory_map=True)
+        return arrow_table.to_pandas(split_blocks=True)
+    return pd.read_csv(csv_file, usecols=columns)
+
+
+def save_table(df, dir_path, table):
+    """Write a table as CSV plus an uncompressed Arrow IPC file that can be memory-mapped"""
+    _write_frame(df, csv_path(dir_path, table), arrow_path(dir_path, table), table)
+
+
+def partition_dir(dir_path, table):
+    """Directory holding a table written partitioned by city, one subdirectory per city"""
+    return os.path.join(dir_path, TABLE_FILES[table])
+
+
+def partition_key(value):
+    """Filesystem-safe, collision-free directory name for a partition value such as a city name"""
+    text = '' if value is None or (isinstance(value, float) and value != value) else str(value)
+    slug = re.sub(r'[^A-Za-z0-9]+', '_', text).strip('_')[:40] or 'none'
+    return f"{slug}-{hashlib.sha1(text.encode('utf-8')).hexdigest()[:8]}"
+
+
+def save_partition(df, dir_path, table, key, part):
+    """Write one part of a partitioned table, e.g. a chunk of one city's rows"""
+    path = os.path.join(partition_dir(dir_path, table), key)
+    os.makedirs(path, exist_ok=True)
+    stem = os.path.join(path, f"part-{part:05d}")
+    _write_frame(df, f"{stem}.csv", f"{stem}.arrow", f"{table}/{key}/part-{part:05d}")
+
+
+def partition_parts(dir_path, table):
+    """Part file stems of a partitioned table in read order, or None if the table is not partitioned"""
+    path = partition_dir(dir_path, table)
+    if not os.path.isdir(path):
+        return None
+    return sorted(csv_file[:-len('.csv')] for csv_file in glob.glob(os.path.join(glob.escape(path), '*', 'part-*.csv')))
+
+
+def iter_partitions(dir_path, table, columns=None):
+    """Frames of each part of a partitioned table, one at a time, in read order"""
+    for stem in partition_parts(dir_path, table) or []:
+        yield _read_frame(f"{stem}.csv", f"{stem}.arrow", columns)
+
+
+def load_table(dir_path, table, columns=None):
+    """Load a table, memory-mapping its Arrow file when present and falling back to CSV.
+
+    Partitioned tables are read part by part and concatenated in read order.
+    """
+    if partition_parts(dir_path, table) is None:
+        return _read_frame(csv_path(dir_path, table), arrow_path(dir_path, table), columns)
+    frames = list(iter_partitions(dir_path, table, columns))
+    if not frames:
+        return pd.DataFrame(columns=columns)
+    return pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+
+
+def _stems(dir_path, table):
+    """(csv, arrow) file pairs holding a table, one per part for partitioned tables"""
+    parts = partition_parts(dir_path, table)
+    if parts is None:
+        return [(csv_path(dir_path, table), arrow_path(dir_path, table))]
+    return [(f"{stem}.csv", f"{stem}.arrow") for stem in parts]
+
+
+def table_columns(dir_path, table):
+    """Column names of a table, read from the Arrow schema or the CSV header without loading rows"""
+    files = _stems(dir_path, table)
+    if not files:
+        return []
+    csv_file, arrow_file = files[0]
+    if feather is not None and os.path.exists(arrow_file):
+        with pa.memory_map(arrow_file) as source:
+            return pa.ipc.open_file(source).schema.names
+    return list(pd.read_csv(csv_file, nrows=0).columns)
+
+
+def load_column(dir_path, table, column):
+    """One column of a table for row lookups by position.
+
+    Returns a memory-mapped Arrow ChunkedArray when every part has an Arrow
+    file, so only the pages of rows actually taken are read. Otherwise the
+    column is read from CSV into a Series.
+    """
+    files = _stems(dir_path, table)
+    if not files:
+        return pd.Series([], dtype=object)
+    if feather is not None and all(os.path.exists(arrow_file) for _, arrow_file in files):
+        arrays = [feather.read_table(arrow_file, columns=[column], memory_map=True).column(0)
+                  for _, arrow_file in files]
+        arrays = _unify_types(arrays, column)
+        return pa.chunked_array([chunk for array in arrays for chunk in array.chunks], type=arrays[0].type)
+    return pd.concat([pd.read_csv(csv_file, usecols=[column])[column] for csv_file, _ in files], ignore_index=True)
+
+
+def _unify_types(arrays, column):
+    """Cast the parts of a column to one type when parts were written with different ones.
+
+    Parts can differ, e.g. int64 in one city and double (with nulls) in
+    another, or a dictionary-encoded string; the common type matches what
+    concatenating the parts in pandas gives.
+    """
+    if len({array.type for array in arrays}) <= 1:
+        return arrays
+    arrays = [array.cast(array.type.value_type) if pa.types.is_dictionary(array.type) else array for array in arrays]
+    schema = pa.unify_schemas([pa.schema([pa.field(column, array.type)]) for array in arrays],
+                              promote_options='permissive')
+    target = schema.field(column).type
+    return [array if array.type == target else array.cast(target) for array in arrays]
+
+
+def take_rows(values, positions):
+    """Values of a column from load_column at the given row positions, as a Series indexed by position"""
+    positions = np.asarray(positions, dtype=np.int64)
+    if isinstance(values, pd.Series):
+        taken = values.iloc[positions]
+    else:
+        taken = values.take(pa.array(positions)).to_pandas()
+    return taken.set_axis(positions)
+
+
+def write_manifest(dir_path, tables, partitions=None):
+    """Mark a version directory as complete, recording the row count of each table.
+
+    tables maps table names to frames or row counts; partitions, if given,
+    maps partitioned table names to their number of partitions.
+    """
+    manifest = {
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'tables': {table: rows if isinstance(rows, int) else len(rows) for table, rows in tables.items()},
+    }
+    if partitions:
+        manifest['partitions'] = dict(partitions)
+    tmp_path = os.path.join(dir_path, f"{MANIFEST_FILE}.tmp")
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, os.path.join(dir_path, MANIFEST_FILE))
+
+
+def is_complete(dir_path):
+    return os.path.exists(os.path.join(dir_path, MANIFEST_FILE))
@@ -0,0 +1,146 @@
+import os
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import pandas as pd
+from config.settings import Config
+from data.cache import DiskCache, content_key
+
+# Classifier backend of a pool worker, created once by _init_worker
+_worker_classifier = None
+
+
+def top_label(result):
+    """Pick the highest scoring label from a zero-shot result"""
+    return result['labels'][result['scores'].index(max(result['scores']))]
+
+
+def classify_in_batches(classifier, texts, labels, batch_size):
+    """Run texts through a zero-shot pipeline batch_size sequences at a time"""
+    results = []
+    for start in range(0, len(texts), batch_size):
+        batch = texts[start:start + batch_size]
+        output = classifier(batch, labels, batch_size=batch_size)
+        results.extend(output if isinstance(output, list) else [output])
+    return results
+
+
+def _init_worker(backend, root, threads_per_worker):
+    """Cap the worker's intra-op threads and load its own classifier backend"""
+    global _worker_classifier
+    if threads_per_worker:
+        os.environ['OMP_NUM_THREADS'] = str(threads_per_worker)
+        try:
+            import torch
+            torch.set_num_threads(threads_per_worker)
+        except ImportError:
+            pass
+    from classifiers.backends import make_classifier
+    _worker_classifier = make_classifier(backend, root)
+
+
+def _classify_shard(texts, labels, batch_size):
+    return classify_in_batches(_worker_classifier, texts, labels, batch_size)
+
+
+class LabelCache:
+    """Persistent classifier results keyed by the classified text, backend name and label set"""
+
+    def __init__(self, path, model=Config.CLASSIFIER_MODEL, labels=Config.MOOD_LABELS):
+        self.store = DiskCache(path, table='labels')
+        self.model = model
+        self.labels = list(labels)
+
+    def key(self, text):
+        return content_key(text, self.model, self.labels)
+
+    def lookup(self, texts):
+        """Cached results for whichever texts have them"""
+        keys = {self.key(text): text for text in texts}
+        return {keys[key]: result for key, result in self.store.get_many(keys).items()}
+
+    def save(self, results):
+        """Store {text: zero-shot result}"""
+        self.store.set_many(
+            (self.key(text), {'labels': list(result['labels']), 'scores': [float(s) for s in result['scores']]})
+            for text, result in results.items()
+        )
+
+
+class BatchLabeler:
+    """Label texts with a zero-shot classifier in batches, optionally sharded over processes.
+
+    Pool workers build their own classifier with make_classifier(backend, root),
+    so texts are only sharded when backend names how the classifier was built;
+    otherwise they are labeled in-process with the given classifier.
+    """
+
+    def __init__(self, classifier, labels, batch_size=None, workers=None, threads_per_worker=None,
+                 backend=None, progress_every=None, cache=None, root=None):
+        self.classifier = classifier
+        self.labels = labels
+        self.batch_size = batch_size or Config.LABEL_BATCH_SIZE
+        self.workers = workers or Config.LABEL_WORKERS
+        self.threads_per_worker = threads_per_worker or Config.LABEL_THREADS_PER_WORKER
+        self.backend = backend
+        self.root = root
+        self.progress_every = progress_every or Config.LABEL_PROGRESS_EVERY
+        self.cache = cache
+        self.report = None
+
+    def _progress(self, done, total, started):
+        elapsed = time.perf_counter() - started
+        rate = done / elapsed if elapsed > 0 else 0.0
+        print(f"Labeled {done}/{total} unique texts ({rate:.1f} texts/s)")
+
+    def classify(self, texts):
+        """Zero-shot results for each text; identical and already cached texts are not reclassified"""
+        texts = pd.Series(texts, dtype=object).astype(str)
+        all_unique_texts = list(pd.unique(texts))
+        started = time.perf_counter()
+
+        cached = self.cache.lookup(all_unique_texts) if self.cache is not None else {}
+        unique_texts = [text for text in all_unique_texts if text not in cached]
+
+        results = {}
+        if self.workers > 1 and self.backend is None:
+            print("Labeling in-process: the classifier has no backend pool workers could rebuild")
+        if self.workers > 1 and self.backend is not None and len(unique_texts) > self.batch_size:
+            shard_size = self.batch_size * self.progress_every
+            shards = [unique_texts[i:i + shard_size] for i in range(0, len(unique_texts), shard_size)]
+            with ProcessPoolExecutor(max_workers=self.workers,
+                                     mp_context=multiprocessing.get_context('spawn'),
+                                     initializer=_init_worker,
+                                     initargs=(self.backend, self.root, self.threads_per_worker)) as pool:
+                futures = {pool.submit(_classify_shard, shard, self.labels, self.batch_size): shard for shard in shards}
+                for future in as_completed(futures):
+                    results.update(zip(futures[future], future.result()))
+                    self._progress(len(results), len(unique_texts), started)
+        else:
+            step = self.batch_size * self.progress_every
+            for start in range(0, len(unique_texts), step):
+                chunk = unique_texts[start:start + step]
+                results.update(zip(chunk, classify_in_batches(self.classifier, chunk, self.labels, self.batch_size)))
+                self._progress(len(results), len(unique_texts), started)
+
+        if self.cache is not None and results:
+            self.cache.save(results)
+        results.update(cached)
+
+        elapsed = time.perf_counter() - started
+        self.report = {
+            'rows': len(texts),
+            'unique_texts': len(all_unique_texts),
+            'cache_reused': len(cached),
+            'classified': len(unique_texts),
+            'batch_size': self.batch_size,
+            'workers': self.workers,
+            'seconds': round(elapsed, 3),
+            'texts_per_second': round(len(unique_texts) / elapsed, 2) if elapsed > 0 else None,
+        }
+        print(f"Labeling finished: {self.report}")
+        return [results[text] for text in texts]
+
+    def label(self, texts):
+        """Top mood label for each text"""
+        return [top_label(result) for result in self.classify(texts)]
@@ -1,30 +1,205 @@
-import pandas as pd
+import argparse
 import re
 import os
+import threading
+import numpy as np
+import pandas as pd
 from config.settings import Config
+from data.columnar import (MANIFEST_FILE, TABLE_FILES, csv_path, is_complete, load_column, load_table,
+                           partition_parts, table_columns, take_rows)
+from data.retrieval import INDEX_FILE, PlaceIndex
+from data.spatial import LON_COLUMN, LAT_COLUMN, PlaceGrid
+
+VERSION_DIR = re.compile(r'datasets_v(\d+)')
+
+LOAD_PROFILES = ('full', 'compact')
+
+# Tables a version must serve before it is swapped in
+REQUIRED_TABLES = ('places', 'city_picker', 'posts')
+
+
+def version_number(dir_path):
+    """N of a datasets_vN directory path, or None"""
+    match = VERSION_DIR.match(os.path.basename(dir_path)) if dir_path else None
+    return int(match.group(1)) if match else None
+
+
+def has_tables(dir_path, tables):
+    """Whether every given table has a file (or partitions) in a version directory"""
+    return all(os.path.exists(csv_path(dir_path, table)) or partition_parts(dir_path, table) is not None
+               for table in tables)
+
+
+def latest_version_directory(root, legacy=False):
+    """Path of the newest complete datasets_vN directory under root, or None.
+
+    A version is complete once the preprocessor has written its manifest, so
+    a directory still being written is never picked. With legacy, a tree
+    from before manifests existed (none has one) falls back to its newest
+    directory holding every required table; the watcher never does this.
+    """
+    version_dirs = [(version_number(d), os.path.join(root, d)) for d in os.listdir(root)
+                    if os.path.isdir(os.path.join(root, d)) and version_number(d) is not None]
+    candidates = [entry for entry in version_dirs if is_complete(entry[1])]
+    if not candidates and legacy:
+        candidates = [entry for entry in version_dirs if has_tables(entry[1], REQUIRED_TABLES)]
+        if candidates:
+            print(f"No dataset manifests under {root}, using {max(candidates)[1]}")
+    return max(candidates)[1] if candidates else None
+
+
+def version_signature(dir_path):
+    """Changes whenever files are added to a version directory or its manifest is (re)written"""
+    manifest = os.path.join(dir_path, MANIFEST_FILE)
+    return (os.stat(dir_path).st_mtime_ns,
+            os.stat(manifest).st_mtime_ns if os.path.exists(manifest) else None)
+
+
+def _downcast_number(values):
+    """Smallest integer dtype holding a numeric column exactly (nullable if it has gaps), else unchanged"""
+    if pd.api.types.is_integer_dtype(values):
+        return pd.to_numeric(values, downcast='integer')
+    present = values.dropna()
+    if present.empty or not np.isfinite(present).all() or (present.abs() >= 2 ** 53).any() or (present % 1 != 0).any():
+        return values
+    integers = pd.to_numeric(present.astype(np.int64), downcast='integer')
+    if len(present) == len(values):
+        return integers
+    return values.astype(f"Int{integers.dtype.itemsize * 8}")
+
+
+def compact_frame(frame, float32_columns=(), category_max_share=None):
+    """Frame with repeated strings as categoricals and numeric columns downcast.
+
+    Values render the same as before: integral floats become (nullable)
+    integers and only the float32_columns lose precision.
+    """
+    max_share = Config.DATASET_CATEGORY_MAX_SHARE if category_max_share is None else category_max_share
+    columns = {}
+    for column in frame.columns:
+        values = frame[column]
+        if isinstance(values.dtype, pd.CategoricalDtype) or pd.api.types.is_bool_dtype(values):
+            pass
+        elif pd.api.types.is_float_dtype(values) and column in float32_columns:
+            values = values.astype(np.float32)
+        elif pd.api.types.is_integer_dtype(values) or pd.api.types.is_float_dtype(values):
+            values = _downcast_number(values)
+        elif pd.api.types.is_string_dtype(values) and values.nunique() <= max_share * len(values):
+            values = values.astype('category')
+        columns[column] = values
+    return pd.DataFrame(columns, index=frame.index)
+
 
 class DatasetLoader:
-    def __init__(self, root=Config.ROOT):
+    def __init__(self, root=Config.ROOT, lazy=True, version_dir=None, profile=None):
         self.root = root
-        self.latest_dir_path = self._find_latest_version_directory()
-        self.places_dataset = None
-        self.city_picker_dataset = None
-        self.posts_dataset = None
-        self.creators_dataset = None
-        self.load_datasets()
+        self.latest_dir_path = version_dir or latest_version_directory(root, legacy=True)
+        self.profile = profile or Config.DATASET_LOAD_PROFILE
+        if self.profile not in LOAD_PROFILES:
+            raise ValueError(f"Unknown load profile {self.profile!r}, expected one of {LOAD_PROFILES}")
+        self._tables = {}
+        self._cold_names = {}
+        self._cold_values = {}
+        self._indexes = {}
+        self._place_index = None
+        self._place_grid = None
+        self._lock = threading.Lock()
+        if not lazy:
+            self.load_datasets()
+
+    @property
+    def version(self):
+        """Name of the loaded datasets_vN directory, identifying the dataset version"""
+        return os.path.basename(self.latest_dir_path) if self.latest_dir_path else None
+
+    def load_table(self, table, columns=None):
+        """Load one table on first use, memory-mapped from Arrow when the version has it.
+
+        With the compact profile a whole table is compacted and its cold
+        columns are left out; explicitly requested columns are read as stored.
+        """
+        key = (table, tuple(columns) if columns is not None else None)
+        if key in self._tables:
+            return self._tables[key]
+
+        with self._lock:
+            if key not in self._tables:
+                if not self.latest_dir_path:
+                    print("No datasets directories found.")
+                    return None
+                try:
+                    self._tables[key] = self._read_table(table, columns)
+                except FileNotFoundError as e:
+                    print(f"Error loading datasets: {e}")
+                    return None
+        return self._tables[key]
+
+    def _read_table(self, table, columns):
+        if self.profile != 'compact' or columns is not None:
+            return load_table(self.latest_dir_path, table, columns)
+        cold = self.cold_columns(table)
+        hot = [column for column in table_columns(self.latest_dir_path, table) if column not in cold] if cold else None
+        return compact_frame(load_table(self.latest_dir_path, table, hot), Config.DATASET_FLOAT32_COLUMNS)
+
+    def cold_columns(self, table):
+        """Columns of a table the compact profile leaves on disk until rows are asked for"""
+        if self.profile != 'compact' or not self.latest_dir_path:
+            return []
+        names = self._cold_names.get(table)
+        if names is None:
+            cold = Config.DATASET_COLD_COLUMNS.get(table, ())
+            try:
+                names = [column for column in table_columns(self.latest_dir_path, table) if column in cold]
+            except FileNotFoundError:
+                return []
+            self._cold_names[table] = names
+        return names
+
+    def with_columns(self, frame, table, columns):
+        """A slice of a table with those of the given columns that were left on disk added back.
 
-    def _find_latest_version_directory(self):
-        """Find the most recent version directory"""
-        base_path = self.root
-        dir_pattern = re.compile(r'datasets_v(\d+)')
-        existing_dirs = [d for d in os.listdir(base_path) if os.path.isdir(os.path.join(base_path, d))]
-        version_dirs = [(int(match.group(1)), d) for d in existing_dirs for match in [dir_pattern.match(d)] if match]
-
-        if version_dirs:
-            latest_version, latest_dir_name = max(version_dirs)
-            return os.path.join(base_path, latest_dir_name)
-        else:
+        Only the slice's rows are read, so prompts pay for the text they
+        render instead of every worker holding whole text columns.
+        """
+        if frame is None:
             return None
+        missing = [column for column in columns if column not in frame.columns and column in self.cold_columns(table)]
+        if not missing:
+            return frame
+        positions = frame.index.to_numpy()
+        return frame.assign(**{column: take_rows(self._cold_column(table, column), positions) for column in missing})
+
+    def _cold_column(self, table, column):
+        key = (table, column)
+        values = self._cold_values.get(key)
+        if values is None:
+            with self._lock:
+                values = self._cold_values.get(key)
+                if values is None:
+                    values = load_column(self.latest_dir_path, table, column)
+                    self._cold_values[key] = values
+        return values
+
+    def memory_report(self):
+        """Bytes held by each loaded table and its columns, and the columns left on disk"""
+        report = {}
+        for (table, columns), frame in list(self._tables.items()):
+            if columns is not None or frame is None:
+                continue
+            usage = frame.memory_usage(deep=True)
+            report[table] = {
+                'profile': self.profile,
+                'rows': len(frame),
+                'bytes': int(usage.sum()),
+                'columns': {column: {'dtype': str(frame[column].dtype), 'bytes': int(usage[column])}
+                            for column in frame.columns},
+                'cold_columns': self.cold_columns(table),
+            }
+        return report
+
+    def missing_tables(self, tables=REQUIRED_TABLES):
+        """Tables that fail to load from this version, e.g. because it is incomplete"""
+        return [table for table in tables if self.load_table(table) is None]
 
     def load_datasets(self):
         """Load all datasets from the latest version directory"""
@@ -32,23 +207,160 @@ class DatasetLoader:
             print("No datasets directories found.")
             return
 
-        try:
-            self.places_dataset = pd.read_csv(f"{self.latest_dir_path}/DumplinAI.places.csv")
-            self.city_picker_dataset = pd.read_csv(f"{self.latest_dir_path}/DumplinAI.city_picker.csv")
-            self.posts_dataset = pd.read_csv(f"{self.latest_dir_path}/DumplinAI.posts.csv")
-            self.creators_dataset = pd.read_csv(f"{self.latest_dir_path}/DumplinAI.creators.csv")
+        if all(self.load_table(table) is not None for table in TABLE_FILES):
             print(f"Datasets loaded successfully from {self.latest_dir_path}")
-        except FileNotFoundError as e:
-            print(f"Error loading datasets: {e}")
 
-    def get_places(self):
-        return self.places_dataset
+    def row_index(self, table, keys):
+        """Map each value of the key column(s) to its row positions, built once per dataset version"""
+        keys = tuple(keys)
+        index = self._indexes.get((table, keys))
+        if index is None:
+            frame = self.load_table(table)
+            if frame is None:
+                return {}
+            index = frame.groupby(list(keys) if len(keys) > 1 else keys[0], sort=False, observed=True).indices
+            self._indexes[(table, keys)] = index
+        return index
+
+    def get_place_index(self):
+        """BM25 index over the places table, as saved by the preprocessor or built here for older versions"""
+        if self._place_index is None:
+            with self._lock:
+                if self._place_index is None and self.latest_dir_path:
+                    path = os.path.join(self.latest_dir_path, INDEX_FILE)
+                    if os.path.exists(path):
+                        self._place_index = PlaceIndex.load(path)
+            if self._place_index is None:
+                places = self.with_columns(self.get_places(), 'places', self.cold_columns('places'))
+                if places is None:
+                    return None
+                print(f"No place index in {self.latest_dir_path}, building one in memory")
+                self._place_index = PlaceIndex.build(places)
+        return self._place_index
+
+    def get_place_grid(self):
+        """Haversine grid over place coordinates, built once per dataset version"""
+        if self._place_grid is None:
+            places = self.get_places()
+            if places is None:
+                return None
+            if LON_COLUMN not in places.columns or LAT_COLUMN not in places.columns:
+                places = self.with_columns(places, 'places', ['location'])
+            with self._lock:
+                if self._place_grid is None:
+                    self._place_grid = PlaceGrid.build(places, Config.PLACE_GRID_CELL_KM)
+        return self._place_grid
+
+    def _rows_for(self, table, keys, values):
+        """Slice a table down to the rows matching any of the given key values"""
+        frame = self.load_table(table)
+        if frame is None:
+            return None
+        index = self.row_index(table, keys)
+        positions = [index[value] for value in values if value in index]
+        if not positions:
+            return frame.iloc[0:0]
+        return frame.iloc[np.concatenate(positions)]
+
+    def warm_up(self):
+        """Load every table and build the indexes the recommendation hot path uses"""
+        self.load_datasets()
+        self.row_index('places', ['city'])
+        self.row_index('places', ['city', 'label'])
+        self.row_index('city_picker', ['city'])
+        self.row_index('posts', ['city'])
+        self.row_index('places', ['label'])
+        self.get_place_index()
+        self.get_place_grid()
+        return self
+
+    def get_rows(self, table, positions):
+        """Rows of a table by position, e.g. positions remembered from an earlier slice"""
+        frame = self.load_table(table)
+        return None if frame is None else frame.iloc[list(positions)]
+
+    def get_places_for_cities(self, cities, label=None):
+        """Places in the given cities, optionally only those with the given mood label"""
+        if label is None:
+            return self._rows_for('places', ['city'], cities)
+        return self._rows_for('places', ['city', 'label'], [(city, label) for city in cities])
+
+    def get_places_near(self, lon, lat, radius_km=None, label=None, min_places=None):
+        """Places within radius_km of a point, closest first, and their distances in km.
+
+        When fewer than min_places match, the min_places nearest are returned
+        instead. With a label, only places with that mood label are searched.
+        Returns (None, None) when no place has coordinates to search.
+        """
+        radius_km = Config.NEARBY_RADIUS_KM if radius_km is None else radius_km
+        min_places = Config.NEARBY_MIN_PLACES if min_places is None else min_places
+        grid = self.get_place_grid()
+        if grid is None or not len(grid):
+            return None, None
+        allowed = None
+        if label is not None:
+            allowed = self.row_index('places', ['label']).get(label, np.empty(0, dtype=np.int64))
+        positions, distances = grid.within(lon, lat, radius_km, positions=allowed)
+        if len(positions) < min_places:
+            positions, distances = grid.nearest(lon, lat, min_places, positions=allowed)
+        places = self.get_rows('places', positions)
+        return places, pd.Series(distances, index=places.index)
+
+    def get_city_picker_for_cities(self, cities):
+        return self._rows_for('city_picker', ['city'], cities)
+
+    def get_posts_for_cities(self, cities):
+        return self._rows_for('posts', ['city'], cities)
+
+    @property
+    def places_dataset(self):
+        return self.load_table('places')
+
+    @property
+    def city_picker_dataset(self):
+        return self.load_table('city_picker')
+
+    @property
+    def posts_dataset(self):
+        return self.load_table('posts')
+
+    @property
+    def creators_dataset(self):
+        return self.load_table('creators')
+
+    def get_places(self, columns=None):
+        return self.load_table('places', columns)
+
+    def get_city_picker(self, columns=None):
+        return self.load_table('city_picker', columns)
+
+    def get_posts(self, columns=None):
+        return self.load_table('posts', columns)
+
+    def get_creators(self, columns=None):
+        return self.load_table('creators', columns)
+
+
+def print_memory_report(report):
+    for table, entry in report.items():
+        print(f"{table}: {entry['rows']} rows, {entry['bytes'] / 2 ** 20:.1f} MiB ({entry['profile']} profile)")
+        for column, info in sorted(entry['columns'].items(), key=lambda item: -item[1]['bytes']):
+            print(f"  {column:40} {info['dtype']:>20} {info['bytes'] / 2 ** 20:>9.2f} MiB")
+        if entry['cold_columns']:
+            print(f"  left on disk: {', '.join(entry['cold_columns'])}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report the memory each dataset table takes once loaded")
+    parser.add_argument('--root', default=Config.ROOT)
+    parser.add_argument('--version-dir', help="datasets_vN directory to read (default: latest)")
+    parser.add_argument('--profile', choices=LOAD_PROFILES, default=None, help="Default: Config.DATASET_LOAD_PROFILE")
+    args = parser.parse_args()
 
-    def get_city_picker(self):
-        return self.city_picker_dataset
+    loader = DatasetLoader(args.root, version_dir=args.version_dir, profile=args.profile)
+    loader.load_datasets()
+    print_memory_report(loader.memory_report())
 
-    def get_posts(self):
-        return self.posts_dataset
 
-    def get_creators(self):
-        return self.creators_dataset
+if __name__ == "__main__":
+    main()
@@ -1,32 +1,100 @@
 import pandas as pd
 import re
+import json
 import os
-from transformers import pipeline
+from classifiers.backends import classifier_name, make_classifier
 from config.settings import Config
+from data.columnar import iter_partitions, save_table, write_manifest
+from data.labeling import BatchLabeler, LabelCache
+from data.retrieval import INDEX_FILE, PlaceIndex
+from data.streaming import STAGING_DIR, CitySpill, chunk_rows_for, merge_labeling_reports, process_cities
+from tracing.tracer import get_tracer
+
+TABLES = ('places', 'city_picker', 'posts', 'creators')
+
+# Raw exports under ROOT
+RAW_FILES = {
+    'places': 'DumplinAI.places_los.csv',
+    'city_picker': 'DumplinAI.city_picker.csv',
+    'posts': 'DumplinAI.losposts.csv',
+    'creators': 'DumplinAI.creators.csv',
+}
+
+# process_all steps, in order, and the datasets each one reads or rewrites
+PIPELINE_STEPS = (
+    'load_datasets',
+    'clean_datasets',
+    'label_places',
+    'clean_posts',
+    'clean_creators',
+    'leftjoin_posts_creators',
+    'compile_and_save_datasets',
+)
+STEP_TABLES = {
+    'load_datasets': TABLES,
+    'clean_datasets': ('places', 'city_picker'),
+    'label_places': ('places',),
+    'clean_posts': ('posts',),
+    'clean_creators': ('creators',),
+    'leftjoin_posts_creators': ('posts',),
+    'compile_and_save_datasets': TABLES,
+}
+# Steps whose report carries cache reuse and model time
+STEP_REPORTS = {
+    'label_places': 'labeling_report',
+}
+
+# Columns each table keeps
+PLACE_COLUMNS = ['title', 'description', 'categoryName', 'city', 'location']
+CITY_PICKER_COLUMNS = ['city', 'state', 'cuisine_summary']
+POST_COLUMNS = ['city', 'platform', 'creator_id', 'url', 'Phase1.transcript.0', 'caption']
+CREATOR_COLUMNS = ['_id', 'username', 'followersCount', 'profilePicUrl', 'created_at']
+
+
+def clean_places(places):
+    return places[PLACE_COLUMNS].dropna(subset=['description'])
+
+
+def clean_city_picker(city_picker):
+    return city_picker[CITY_PICKER_COLUMNS]
+
+
+def clean_posts(posts):
+    return posts[POST_COLUMNS]
+
+
+def clean_creators(creators):
+    return creators[CREATOR_COLUMNS]
+
+
+def join_posts_creators(posts, creators):
+    return pd.merge(posts, creators, how='left', left_on='creator_id', right_on='_id')
+
 
 class DataPreprocessor:
-    def __init__(self, root=Config.ROOT):
+    def __init__(self, root=Config.ROOT, classifier=None, tracer=None):
         self.places_dataset = None
         self.city_picker_dataset = None
         self.posts_dataset = None
         self.creators_dataset = None
-        self.classifier = pipeline("zero-shot-classification", model=Config.CLASSIFIER_MODEL)
+        self.classifier = classifier if classifier is not None else make_classifier(root=root)
         self.labels = Config.MOOD_LABELS
         self.ROOT = root
+        self.labeling_report = None
+        self.tracer = tracer or get_tracer()
 
     def load_datasets(self):
         """Load all datasets from CSV files"""
-        self.places_dataset = pd.read_csv(f"{self.ROOT}/DumplinAI.places_los.csv")
-        self.city_picker_dataset = pd.read_csv(f"{self.ROOT}/DumplinAI.city_picker.csv")
-        self.posts_dataset = pd.read_csv(f"{self.ROOT}/DumplinAI.losposts.csv")
-        self.creators_dataset = pd.read_csv(f"{self.ROOT}/DumplinAI.creators.csv")
+        self.places_dataset = pd.read_csv(self.raw_path('places'))
+        self.city_picker_dataset = pd.read_csv(self.raw_path('city_picker'))
+        self.posts_dataset = pd.read_csv(self.raw_path('posts'))
+        self.creators_dataset = pd.read_csv(self.raw_path('creators'))
         return self
 
     def clean_datasets(self):
         """Clean and filter datasets to required columns"""
-        self.places_dataset = self.places_dataset[['title', 'description', 'categoryName', 'city', 'location']]
-        self.places_dataset.dropna(subset=['description'], inplace=True)
-        self.city_picker_dataset = self.city_picker_dataset[['city', 'state', 'cuisine_summary']]
+        self.places_dataset = clean_places(self.places_dataset)
+        self.city_picker_dataset = clean_city_picker(self.city_picker_dataset)
         return self
 
     def generate_label(self, row):
@@ -35,27 +103,38 @@ class DataPreprocessor:
         result = self.classifier(sequence_to_classify, self.labels)
         return result['labels'][result['scores'].index(max(result['scores']))]
 
-    def label_places(self):
-        """Apply mood labels to all places"""
-        self.places_dataset['label'] = self.places_dataset.apply(self.generate_label, axis=1)
+    def label_places(self, batch_size=None, workers=None, threads_per_worker=None, use_cache=True):
+        """Apply mood labels to all places, classifying only descriptions missing from the label cache"""
+        cache = self.open_label_cache() if use_cache else None
+        labeler = BatchLabeler(self.classifier, self.labels, batch_size, workers, threads_per_worker,
+                               backend=self.classifier_backend(), cache=cache, root=self.ROOT)
+        self.places_dataset['label'] = labeler.label(self.places_dataset['description'])
+        self.labeling_report = labeler.report
         return self
 
     def clean_posts(self):
         """Clean posts dataset"""
-        self.posts_dataset = self.posts_dataset[['city', 'platform', 'creator_id', 'url', 'Phase1.transcript.0', 'caption']]
+        self.posts_dataset = clean_posts(self.posts_dataset)
         return self
 
     def clean_creators(self):
         """Clean creators dataset"""
-        self.creators_dataset = self.creators_dataset[['_id', 'username', 'followersCount', 'profilePicUrl', 'created_at']]
+        self.creators_dataset = clean_creators(self.creators_dataset)
         return self
 
     def leftjoin_posts_creators(self):
         """Join posts with creators data"""
-        self.posts_dataset = pd.merge(self.posts_dataset, self.creators_dataset, 
-                                    how='left', left_on='creator_id', right_on='_id')
+        self.posts_dataset = join_posts_creators(self.posts_dataset, self.creators_dataset)
         return self
 
+    def classifier_backend(self):
+        """make_classifier key pool workers rebuild the classifier from, None if it was not built by it"""
+        return getattr(self.classifier, 'backend', None)
+
+    def open_label_cache(self):
+        """Open the persistent label cache shared by all preprocessing runs under ROOT"""
+        return LabelCache(os.path.join(self.ROOT, Config.LABEL_CACHE_FILE), classifier_name(self.classifier), self.labels)
+
     def create_dir_new_version(self):
         """Create a new versioned directory for datasets"""
         base_path = self.ROOT
@@ -71,20 +150,120 @@ class DataPreprocessor:
         return new_dir_path
 
     def compile_and_save_datasets(self):
-        """Save all processed datasets to new version directory"""
+        """Save all processed datasets, plus the places retrieval index, to a new version directory and mark it complete"""
+        dir_path = self.create_dir_new_version()
+        save_table(self.places_dataset, dir_path, 'places')
+        save_table(self.city_picker_dataset, dir_path, 'city_picker')
+        save_table(self.posts_dataset, dir_path, 'posts')
+        save_table(self.creators_dataset, dir_path, 'creators')
+        PlaceIndex.build(self.places_dataset).save(f"{dir_path}/{INDEX_FILE}")
+        if self.labeling_report is not None:
+            with open(f"{dir_path}/labeling_summary.json", "w") as f:
+                json.dump(self.labeling_report, f, indent=2)
+        # Last, so the version is only picked up once everything above is on disk
+        write_manifest(dir_path, {'places': self.places_dataset, 'city_picker': self.city_picker_dataset,
+                                  'posts': self.posts_dataset, 'creators': self.creators_dataset})
+        return self
+
+    def row_count(self, tables):
+        """Total rows currently held in the given datasets"""
+        frames = (getattr(self, f"{table}_dataset") for table in tables)
+        return sum(len(frame) for frame in frames if frame is not None)
+
+    def run_step(self, step):
+        """Run one pipeline step, tracing its wall time and the rows it read and produced"""
+        tables = STEP_TABLES[step]
+        rows_in = self.row_count(tables)
+        with self.tracer.span(step, 'preprocess') as span:
+            getattr(self, step)()
+            span.set(rows_in=rows_in, rows_out=self.row_count(tables))
+            report = getattr(self, STEP_REPORTS[step]) if step in STEP_REPORTS else None
+            if report is not None:
+                span.set(cache_hits=report['cache_reused'], model_seconds=report['seconds'])
+        return self
+
+    def process_all(self, streaming=None):
+        """Execute full preprocessing pipeline, in chunks partitioned by city when streaming"""
+        streaming = Config.PREPROCESS_STREAMING if streaming is None else streaming
+        if streaming:
+            return self.process_streaming()
+        for step in PIPELINE_STEPS:
+            self.run_step(step)
+        return self
+
+    def raw_path(self, table):
+        return f"{self.ROOT}/{RAW_FILES[table]}"
+
+    def process_streaming(self, memory_limit_mb=None, chunk_rows=None, workers=None, use_cache=True):
+        """Preprocess raw exports larger than memory into a city-partitioned datasets_vN.
+
+        Places and posts are read in chunks sized to stay under memory_limit_mb
+        (model memory not included), cleaned, joined with creators and staged
+        per city. Each city is then labeled and written as its own partition,
+        in `workers` processes at once. City picker, creators and the places
+        index are kept whole. DatasetLoader reads the partitions like plain tables.
+        """
+        memory_limit_mb = memory_limit_mb or Config.PREPROCESS_MEMORY_LIMIT_MB
+        workers = workers or Config.PREPROCESS_CITY_WORKERS
+        chunk_rows = chunk_rows or Config.PREPROCESS_CHUNK_ROWS
+        chunk_rows = {table: chunk_rows or chunk_rows_for(self.raw_path(table), memory_limit_mb, workers)
+                      for table in ('places', 'posts')}
+
         dir_path = self.create_dir_new_version()
-        self.places_dataset.to_csv(f"{dir_path}/DumplinAI.places.csv", index=False)
-        self.city_picker_dataset.to_csv(f"{dir_path}/DumplinAI.city_picker.csv", index=False)
-        self.posts_dataset.to_csv(f"{dir_path}/DumplinAI.posts.csv", index=False)
-        self.creators_dataset.to_csv(f"{dir_path}/DumplinAI.creators.csv", index=False)
+        with self.tracer.span('partition_raw', 'preprocess') as span:
+            spill = self.partition_raw(os.path.join(dir_path, STAGING_DIR), chunk_rows)
+            span.set(rows_out=sum(spill.rows.values()), cities=len(spill.cities), chunk_rows=chunk_rows['places'])
+        try:
+            with self.tracer.span('process_cities', 'preprocess') as span:
+                rows = self.process_cities(spill, dir_path, chunk_rows, workers, use_cache)
+                span.set(rows_out=sum(rows.values()), workers=workers)
+                if self.labeling_report is not None:
+                    span.set(cache_hits=self.labeling_report['cache_reused'],
+                             model_seconds=self.labeling_report['seconds'])
+        finally:
+            spill.remove()
+        with self.tracer.span('compile_and_save_partitions', 'preprocess'):
+            self.compile_and_save_partitions(dir_path, rows, spill.partitions())
         return self
 
-    def process_all(self):
-        """Execute full preprocessing pipeline"""
-        return (self.load_datasets()
-                   .clean_datasets()
-                   .label_places()
-                   .clean_posts()
-                   .clean_creators()
-                   .leftjoin_posts_creators()
-                   .compile_and_save_datasets())
+    def partition_raw(self, staging_dir, chunk_rows):
+        """Clean places and posts chunk by chunk, join posts with creators, and stage the rows per city"""
+        self.city_picker_dataset = clean_city_picker(pd.read_csv(self.raw_path('city_picker')))
+        self.creators_dataset = clean_creators(pd.read_csv(self.raw_path('creators')))
+        spill = CitySpill(staging_dir)
+        for chunk in pd.read_csv(self.raw_path('places'), chunksize=chunk_rows['places']):
+            spill.add('places', clean_places(chunk))
+        for chunk in pd.read_csv(self.raw_path('posts'), chunksize=chunk_rows['posts']):
+            spill.add('posts', join_posts_creators(clean_posts(chunk), self.creators_dataset))
+        print(f"Staged {sum(spill.rows.values())} rows across {len(spill.cities)} cities")
+        return spill
+
+    def process_cities(self, spill, dir_path, chunk_rows, workers=1, use_cache=True):
+        """Label and write every staged city, on a process pool when workers > 1; returns rows per table"""
+        label_cache = os.path.join(self.ROOT, Config.LABEL_CACHE_FILE) if use_cache else None
+        options = dict(chunk_rows=chunk_rows, labels=self.labels, label_cache=label_cache)
+        results = process_cities(spill.dir_path, dir_path, spill.keys(), workers, classifier=self.classifier,
+                                 backend=self.classifier_backend(), root=self.ROOT, **options)
+
+        rows = {'places': 0, 'posts': 0}
+        for result in results:
+            for table, count in result['rows'].items():
+                rows[table] += count
+        self.labeling_report = merge_labeling_reports(
+            [report for result in results for report in result['labeling']])
+        print(f"Processed {len(results)} cities: {rows}")
+        return rows
+
+    def compile_and_save_partitions(self, dir_path, rows, partitions):
+        """Save the whole tables and the places index next to the city partitions and mark the version complete"""
+        save_table(self.city_picker_dataset, dir_path, 'city_picker')
+        save_table(self.creators_dataset, dir_path, 'creators')
+        # Built part by part, in the order DatasetLoader concatenates them
+        PlaceIndex.build_chunks(iter_partitions(dir_path, 'places')).save(f"{dir_path}/{INDEX_FILE}")
+        if self.labeling_report is not None:
+            with open(f"{dir_path}/labeling_summary.json", "w") as f:
+                json.dump(self.labeling_report, f, indent=2)
+        write_manifest(dir_path, {'places': rows['places'], 'city_picker': self.city_picker_dataset,
+                                  'posts': rows['posts'], 'creators': self.creators_dataset},
+                       partitions=partitions)
+        return self
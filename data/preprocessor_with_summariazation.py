@@ -1,18 +1,59 @@
+import hashlib
 import pandas as pd
 import re
-from transformers import pipeline
-import openai
+import json
+import os
+from classifiers.backends import classifier_name, make_classifier
 from config.settings import Config
+from data.cache import content_key
+from data.columnar import save_table, write_manifest
+from data.labeling import BatchLabeler, LabelCache
+from data.retrieval import INDEX_FILE, PlaceIndex
+from data.summarizer import PlaceSummarizer, make_openai_client, open_summary_cache
+from tracing.tracer import get_tracer
+
+TABLES = ('places', 'city_picker', 'posts', 'creators')
+
+# process_all steps, in order, and the datasets each one reads or rewrites
+PIPELINE_STEPS = (
+    'load_datasets',
+    'clean_datasets',
+    'clean_posts',
+    'clean_creators',
+    'leftjoin_posts_creators',
+    'summarize_places_based_on_posts_and_description',
+    'generate_label_for_summarization',
+    'compile_and_save_datasets',
+)
+STEP_TABLES = {
+    'load_datasets': TABLES,
+    'clean_datasets': ('places', 'city_picker'),
+    'clean_posts': ('posts',),
+    'clean_creators': ('creators',),
+    'leftjoin_posts_creators': ('posts',),
+    'summarize_places_based_on_posts_and_description': ('places',),
+    'generate_label_for_summarization': ('places',),
+    'compile_and_save_datasets': TABLES,
+}
+# Steps whose report carries cache reuse and model time
+STEP_REPORTS = {
+    'generate_label_for_summarization': 'labeling_report',
+    'summarize_places_based_on_posts_and_description': 'summarization_report',
+}
 
 class DataPreprocessor:
-    def __init__(self, root=Config.ROOT):
+    def __init__(self, root=Config.ROOT, client=None, classifier=None, tracer=None):
         self.places_dataset = None
         self.city_picker_dataset = None
         self.posts_dataset = None
         self.creators_dataset = None
-        self.classifier = pipeline(Config.CLASSIFIER_TYPE, model=Config.CLASSIFIER_MODEL)
+        self.classifier = classifier if classifier is not None else make_classifier(root=root)
         self.labels = Config.MOOD_LABELS
         self.ROOT = root
+        self.labeling_report = None
+        self.tracer = tracer or get_tracer()
+        self.summarization_report = None
+        self.client = client
 
     def load_datasets(self):
         """Load all datasets from CSV files"""
@@ -36,43 +77,73 @@ class DataPreprocessor:
         result = self.classifier(sequence_to_classify, self.labels)
         return result['labels'][result['scores'].index(max(result['scores']))]
 
+    def make_summarizer(self, workers=None, use_cache=True):
+        """Summarizer sharing one OpenAI client (or the injected one) across its workers"""
+        if self.client is None:
+            self.client = make_openai_client()
+        cache = open_summary_cache(self.ROOT) if use_cache else None
+        return PlaceSummarizer(client=self.client, cache=cache, workers=workers)
+
     def summarize_text_open_ai_request(self, text):
-      client = openai.OpenAI(api_key=Config.OPENAI_API_KEY)
-      try:
-          response = client.chat.completions.create(
-              model=Config.OPENAI_MODEL,
-              messages=[
-                  {"role": "system", "content": "while considering the city name, its decription, city picker line, and social media posts, Summarize the text in such a way that it reflects the fitness of the place for people in one of these labels: lowkey, nightout, comfortable, surprise, hidden gem. We will be recommending the places based on the people mood. Do it only in plain text with no formatting"},
-                  {"role": "user", "content": text}
-              ]
-          )
-          return True, response.choices[0].message.content
-      except Exception as e:
-          return False, f"Error generating response: {e}"
-
-    def summerization(self, row):
-        posts_for_the_city = self.posts_dataset[self.posts_dataset['city'] == row['city']]
-        posts_text = "social media posts: "
-        for _, post in posts_for_the_city.iterrows():
-            posts_text += f"{post['Phase1.transcript.0']} {post['caption']}"
+      return self.make_summarizer(workers=1, use_cache=False).summarize_text(text)
 
-        posts_text += f"city name: {row['city']} and its description {row['description']}"
-        city_picker = self.city_picker_dataset[self.city_picker_dataset['city'] == row['city']]
-        posts_text += f"city picker line: {city_picker['cuisine_summary'].values[0]}"
-        ai_summarization = self.summarize_text_open_ai_request(posts_text)
-        print(ai_summarization)
-        return ai_summarization[1] if ai_summarization[0] else posts_text
+    def build_city_corpora(self):
+        """Concatenate each city's posts text once, keyed by city"""
+        posts_text = (self.posts_dataset['Phase1.transcript.0'].astype(object).map(str) + ' '
+                      + self.posts_dataset['caption'].astype(object).map(str))
+        return posts_text.groupby(self.posts_dataset['city']).agg(''.join).to_dict()
 
+    def city_picker_lines(self):
+        """First city picker line of each city, keyed by city"""
+        first_rows = self.city_picker_dataset.drop_duplicates('city')
+        return dict(zip(first_rows['city'], first_rows['cuisine_summary']))
 
-    def summarize_places_based_on_posts_and_description(self):
-        """make text ready for summarization"""
-        self.places_dataset['summarization'] = self.places_dataset.apply(self.summerization, axis=1)
+    def build_summarization_text(self, row, city_corpora, city_picker_lines):
+        """Text sent for summarization: the city's posts, the place description and the city picker line"""
+        posts_text = "social media posts: "
+        posts_text += city_corpora.get(row['city'], '')
+        posts_text += f"city name: {row['city']} and its description {row['description']}"
+        posts_text += f"city picker line: {city_picker_lines.get(row['city'], '')}"
+        return posts_text
+
+    def summarize_places_based_on_posts_and_description(self, workers=None, use_cache=True):
+        """Summarize every place concurrently; each city's posts corpus is built once.
+
+        Texts are built one at a time in the summarization workers. Places
+        are deduplicated and cached on a digest of their city corpus,
+        description and city picker line instead of the text itself.
+        """
+        city_corpora = self.build_city_corpora()
+        city_picker_lines = self.city_picker_lines()
+        corpus_digests = {city: hashlib.sha256(corpus.encode('utf-8')).hexdigest() for city, corpus in city_corpora.items()}
+
+        rows = {}
+        keys = []
+        for row in self.places_dataset[['city', 'description']].to_dict('records'):
+            key = content_key(corpus_digests.get(row['city'], ''), row['city'], row['description'],
+                              city_picker_lines.get(row['city'], ''))
+            rows.setdefault(key, row)
+            keys.append(key)
+
+        def build_text(key):
+            return self.build_summarization_text(rows[key], city_corpora, city_picker_lines)
+
+        summarizer = self.make_summarizer(workers, use_cache)
+        summaries = summarizer.summarize_all(keys, build_text)
+        # A failed summary falls back to the text that was sent, as before
+        self.places_dataset['summarization'] = [summary if succeeded else build_text(key)
+                                                for key, (succeeded, summary) in zip(keys, summaries)]
+        self.summarization_report = summarizer.report
         return self
 
 
-    def generate_label_for_summarization(self):
-      """make text ready for summarization"""
-      self.places_dataset['label'] = self.places_dataset.apply(self.generate_label, axis=1)
+    def generate_label_for_summarization(self, batch_size=None, workers=None, threads_per_worker=None, use_cache=True):
+      """Label places from their summaries, classifying only summaries missing from the label cache"""
+      cache = self.open_label_cache() if use_cache else None
+      labeler = BatchLabeler(self.classifier, self.labels, batch_size, workers, threads_per_worker,
+                             backend=self.classifier_backend(), cache=cache, root=self.ROOT)
+      self.places_dataset['label'] = labeler.label(self.places_dataset['summarization'])
+      self.labeling_report = labeler.report
       return self
 
     def clean_posts(self):
@@ -91,6 +162,14 @@ class DataPreprocessor:
                                     how='left', left_on='creator_id', right_on='_id')
         return self
 
+    def classifier_backend(self):
+        """make_classifier key pool workers rebuild the classifier from, None if it was not built by it"""
+        return getattr(self.classifier, 'backend', None)
+
+    def open_label_cache(self):
+        """Open the persistent label cache shared by all preprocessing runs under ROOT"""
+        return LabelCache(os.path.join(self.ROOT, Config.LABEL_CACHE_FILE), classifier_name(self.classifier), self.labels)
+
     def create_dir_new_version(self):
         """Create a new versioned directory for datasets"""
         base_path = self.ROOT
@@ -106,22 +185,43 @@ class DataPreprocessor:
         return new_dir_path
 
     def compile_and_save_datasets(self):
-        """Save all processed datasets to new version directory"""
+        """Save all processed datasets, plus the places retrieval index, to a new version directory and mark it complete"""
         dir_path = self.create_dir_new_version()
-        self.places_dataset.to_csv(f"{dir_path}/DumplinAI.places.csv", index=False)
-        self.city_picker_dataset.to_csv(f"{dir_path}/DumplinAI.city_picker.csv", index=False)
-        self.posts_dataset.to_csv(f"{dir_path}/DumplinAI.posts.csv", index=False)
-        self.creators_dataset.to_csv(f"{dir_path}/DumplinAI.creators.csv", index=False)
+        save_table(self.places_dataset, dir_path, 'places')
+        save_table(self.city_picker_dataset, dir_path, 'city_picker')
+        save_table(self.posts_dataset, dir_path, 'posts')
+        save_table(self.creators_dataset, dir_path, 'creators')
+        PlaceIndex.build(self.places_dataset).save(f"{dir_path}/{INDEX_FILE}")
+        if self.labeling_report is not None:
+            with open(f"{dir_path}/labeling_summary.json", "w") as f:
+                json.dump(self.labeling_report, f, indent=2)
+        if self.summarization_report is not None:
+            with open(f"{dir_path}/summarization_summary.json", "w") as f:
+                json.dump(self.summarization_report, f, indent=2)
+        # Last, so the version is only picked up once everything above is on disk
+        write_manifest(dir_path, {'places': self.places_dataset, 'city_picker': self.city_picker_dataset,
+                                  'posts': self.posts_dataset, 'creators': self.creators_dataset})
+        return self
+
+    def row_count(self, tables):
+        """Total rows currently held in the given datasets"""
+        frames = (getattr(self, f"{table}_dataset") for table in tables)
+        return sum(len(frame) for frame in frames if frame is not None)
+
+    def run_step(self, step):
+        """Run one pipeline step, tracing its wall time and the rows it read and produced"""
+        tables = STEP_TABLES[step]
+        rows_in = self.row_count(tables)
+        with self.tracer.span(step, 'preprocess') as span:
+            getattr(self, step)()
+            span.set(rows_in=rows_in, rows_out=self.row_count(tables))
+            report = getattr(self, STEP_REPORTS[step]) if step in STEP_REPORTS else None
+            if report is not None:
+                span.set(cache_hits=report['cache_reused'], model_seconds=report['seconds'])
         return self
 
     def process_all(self):
         """Execute full preprocessing pipeline"""
-        (self.load_datasets()
-                  .clean_datasets()
-                  .clean_posts()
-                  .clean_creators()
-                  .leftjoin_posts_creators()
-                  .summarize_places_based_on_posts_and_description()
-                  .generate_label_for_summarization()
-                  .compile_and_save_datasets())
+        for step in PIPELINE_STEPS:
+            self.run_step(step)
         return self
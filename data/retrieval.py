@@ -0,0 +1,129 @@
+import re
+import numpy as np
+
+# Place text the index is built over; missing columns are skipped
+INDEX_COLUMNS = ['title', 'categoryName', 'description', 'summarization']
+
+INDEX_FILE = 'DumplinAI.places_index.npz'
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset("""
+a an and are as at be but by for from has have i i'm im in is it its just me my of on or so
+that the this to was we with you your don't dont want not
+""".split())
+
+
+def tokenize(text):
+    """Lowercase word tokens without stopwords"""
+    return [token for token in _TOKEN.findall(str(text).lower()) if token not in STOPWORDS]
+
+
+class PlaceIndex:
+    """BM25 inverted index over place text, addressed by row position in the places table.
+
+    Postings are stored CSR-style (one slice of document ids and term
+    frequencies per vocabulary term), so scoring a query touches only the
+    postings of its own terms.
+    """
+
+    def __init__(self, terms, indptr, doc_ids, term_freqs, doc_lengths, k1=1.2, b=0.75):
+        self.terms = np.asarray(terms)
+        self.vocabulary = {term: term_id for term_id, term in enumerate(self.terms.tolist())}
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.doc_ids = np.asarray(doc_ids, dtype=np.int32)
+        self.term_freqs = np.asarray(term_freqs, dtype=np.float32)
+        self.doc_lengths = np.asarray(doc_lengths, dtype=np.float32)
+        self.k1 = float(k1)
+        self.b = float(b)
+        self.avg_doc_length = float(self.doc_lengths.mean()) if len(self.doc_lengths) else 0.0
+        document_frequency = np.diff(self.indptr)
+        n_docs = len(self.doc_lengths)
+        self.idf = np.log1p((n_docs - document_frequency + 0.5) / (document_frequency + 0.5)).astype(np.float32)
+
+    def __len__(self):
+        return len(self.doc_lengths)
+
+    @classmethod
+    def build(cls, places, columns=INDEX_COLUMNS):
+        """Index every row of the places frame, in row order"""
+        return cls.build_chunks([places], columns)
+
+    @classmethod
+    def build_chunks(cls, chunks, columns=INDEX_COLUMNS):
+        """Index consecutive places frames as one table, e.g. the parts of a partitioned table in read order.
+
+        Postings are collected as flat integer arrays per chunk, so building
+        over many chunks holds little more than the finished index.
+        """
+        vocabulary = {}
+        doc_lengths = []
+        term_chunks, doc_chunks, tf_chunks = [], [], []
+        for places in chunks:
+            if places.empty:
+                continue
+            present = [column for column in columns if column in places.columns]
+            texts = places[present].astype(object).where(places[present].notna(), '').astype(str)
+            documents = texts.agg(' '.join, axis=1) if present else ['' for _ in range(len(places))]
+
+            term_ids, doc_ids, term_freqs = [], [], []
+            for document in documents:
+                doc_id = len(doc_lengths)
+                tokens = tokenize(document)
+                doc_lengths.append(len(tokens))
+                counts = {}
+                for token in tokens:
+                    counts[token] = counts.get(token, 0) + 1
+                for token, count in counts.items():
+                    term_ids.append(vocabulary.setdefault(token, len(vocabulary)))
+                    doc_ids.append(doc_id)
+                    term_freqs.append(count)
+            term_chunks.append(np.asarray(term_ids, dtype=np.int64))
+            doc_chunks.append(np.asarray(doc_ids, dtype=np.int32))
+            tf_chunks.append(np.asarray(term_freqs, dtype=np.float32))
+
+        # Renumber terms alphabetically, then group postings by term; the stable
+        # sort keeps each term's documents in row order
+        terms = sorted(vocabulary)
+        rank = np.empty(len(terms), dtype=np.int64)
+        rank[[vocabulary[term] for term in terms]] = np.arange(len(terms))
+        term_ids = rank[np.concatenate(term_chunks)] if term_chunks else np.empty(0, dtype=np.int64)
+        order = np.argsort(term_ids, kind='stable')
+        indptr = np.zeros(len(terms) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(term_ids, minlength=len(terms)), out=indptr[1:])
+        doc_ids = np.concatenate(doc_chunks)[order] if doc_chunks else np.empty(0, dtype=np.int32)
+        term_freqs = np.concatenate(tf_chunks)[order] if tf_chunks else np.empty(0, dtype=np.float32)
+        return cls(np.array(terms, dtype=str), indptr, doc_ids, term_freqs, np.asarray(doc_lengths, dtype=np.float32))
+
+    def save(self, path):
+        np.savez(path, terms=self.terms, indptr=self.indptr, doc_ids=self.doc_ids,
+                 term_freqs=self.term_freqs, doc_lengths=self.doc_lengths, params=np.array([self.k1, self.b]))
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            k1, b = data['params']
+            return cls(data['terms'], data['indptr'], data['doc_ids'], data['term_freqs'], data['doc_lengths'], k1, b)
+
+    def score(self, query, positions=None):
+        """BM25 score of the query against each row position (all rows by default)"""
+        scores = np.zeros(len(self), dtype=np.float32)
+        for token in set(tokenize(query)):
+            term_id = self.vocabulary.get(token)
+            if term_id is None:
+                continue
+            start, end = self.indptr[term_id], self.indptr[term_id + 1]
+            docs = self.doc_ids[start:end]
+            tf = self.term_freqs[start:end]
+            norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[docs] / max(self.avg_doc_length, 1e-9))
+            scores[docs] += self.idf[term_id] * tf * (self.k1 + 1) / (tf + norm)
+        return scores if positions is None else scores[np.asarray(positions, dtype=np.int64)]
+
+    def top_k(self, query, positions, k):
+        """The k best scoring of the given row positions, best first, and their scores.
+
+        Ties (including rows that match no query term) keep their input order.
+        """
+        positions = np.asarray(positions, dtype=np.int64)
+        scores = self.score(query, positions)
+        order = np.argsort(-scores, kind='stable')[:k]
+        return positions[order], scores[order]
@@ -0,0 +1,155 @@
+import json
+import numpy as np
+import pandas as pd
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = np.pi * EARTH_RADIUS_KM / 180
+
+# Flattened place coordinate columns, as in the raw export
+LON_COLUMN = 'location.coordinates[0]'
+LAT_COLUMN = 'location.coordinates[1]'
+
+
+def haversine_km(lon1, lat1, lon2, lat2):
+    """Great-circle distance in km, broadcasting over arrays"""
+    lon1, lat1, lon2, lat2 = (np.radians(np.asarray(value, dtype=float)) for value in (lon1, lat1, lon2, lat2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def _point_coordinates(location):
+    """(lon, lat) of a GeoJSON point given as a dict or JSON string, NaNs if unreadable"""
+    try:
+        if isinstance(location, str):
+            location = json.loads(location)
+        lon, lat = location['coordinates'][:2]
+        return float(lon), float(lat)
+    except (ValueError, TypeError, KeyError, IndexError):
+        return np.nan, np.nan
+
+
+def place_coordinates(places):
+    """Longitude and latitude arrays of a places frame, NaN where a place has no location.
+
+    Reads the flattened coordinate columns when present, else the GeoJSON
+    `location` column the non-summarizing preprocessor keeps.
+    """
+    if LON_COLUMN in places.columns and LAT_COLUMN in places.columns:
+        lons = pd.to_numeric(places[LON_COLUMN], errors='coerce').to_numpy(dtype=float)
+        lats = pd.to_numeric(places[LAT_COLUMN], errors='coerce').to_numpy(dtype=float)
+        return lons, lats
+    if 'location' in places.columns:
+        pairs = [_point_coordinates(location) for location in places['location'].tolist()]
+        coords = np.array(pairs, dtype=float).reshape(-1, 2)
+        return coords[:, 0], coords[:, 1]
+    return np.full(len(places), np.nan), np.full(len(places), np.nan)
+
+
+class PlaceGrid:
+    """Grid index over place coordinates for radius and k-nearest queries by haversine distance.
+
+    Points are bucketed into square cells `cell_km` of latitude on a side
+    and stored sorted by cell, so a query reads one contiguous slice per grid
+    row of its bounding box and measures exact distances only for those
+    candidates. Results are row positions in the places table.
+    """
+
+    def __init__(self, lons, lats, cell_km=2.0):
+        lons = np.asarray(lons, dtype=float)
+        lats = np.asarray(lats, dtype=float)
+        self.size = len(lons)
+        self.cell_deg = cell_km / KM_PER_DEGREE
+        self.n_columns = int(np.ceil(360 / self.cell_deg))
+
+        valid = np.flatnonzero(np.isfinite(lons) & np.isfinite(lats)
+                               & (np.abs(lats) <= 90) & (np.abs(lons) <= 180))
+        keys = self._cell_keys(lons[valid], lats[valid])
+        order = np.argsort(keys, kind='stable')
+        self.keys = keys[order]
+        self.positions = valid[order]
+        self.lons = lons[self.positions]
+        self.lats = lats[self.positions]
+
+    @classmethod
+    def build(cls, places, cell_km=2.0):
+        lons, lats = place_coordinates(places)
+        return cls(lons, lats, cell_km)
+
+    def __len__(self):
+        return len(self.positions)
+
+    def _rows(self, lats):
+        return np.floor((np.asarray(lats) + 90) / self.cell_deg).astype(np.int64)
+
+    def _columns(self, lons):
+        return np.floor((np.asarray(lons) + 180) / self.cell_deg).astype(np.int64) % self.n_columns
+
+    def _cell_keys(self, lons, lats):
+        return self._rows(lats) * self.n_columns + self._columns(lons)
+
+    def _candidates(self, lon, lat, radius_km):
+        """Slots of the points in the cells covering the query circle's bounding box"""
+        lat_span = radius_km / KM_PER_DEGREE
+        max_lat = min(abs(lat) + lat_span, 90.0)
+        cos_lat = np.cos(np.radians(max_lat))
+        lon_span = radius_km / (KM_PER_DEGREE * cos_lat) if cos_lat > 1e-9 else 360.0
+
+        first_row, last_row = self._rows([max(lat - lat_span, -90.0), min(lat + lat_span, 90.0)])
+        first_column, last_column = np.floor((np.array([lon - lon_span, lon + lon_span]) + 180) / self.cell_deg)
+        if lon_span >= 180 or last_column - first_column + 1 >= self.n_columns:
+            column_ranges = [(0, self.n_columns - 1)]
+        else:
+            # Boxes crossing the antimeridian wrap around to the first columns
+            first_column, last_column = int(first_column) % self.n_columns, int(last_column) % self.n_columns
+            column_ranges = ([(first_column, last_column)] if first_column <= last_column
+                             else [(first_column, self.n_columns - 1), (0, last_column)])
+
+        rows = np.arange(first_row, last_row + 1)
+        starts = np.concatenate([rows * self.n_columns + low for low, _ in column_ranges])
+        ends = np.concatenate([rows * self.n_columns + high + 1 for _, high in column_ranges])
+        lower = np.searchsorted(self.keys, starts, side='left')
+        upper = np.searchsorted(self.keys, ends, side='left')
+        lengths = upper - lower
+        if not lengths.sum():
+            return np.empty(0, dtype=np.int64)
+        return np.repeat(lower - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+
+    def _allowed(self, positions):
+        """Boolean mask over grid slots, restricted to the given row positions"""
+        if positions is None:
+            return None
+        mask = np.zeros(self.size, dtype=bool)
+        mask[np.asarray(positions, dtype=np.int64)] = True
+        return mask[self.positions]
+
+    def within(self, lon, lat, radius_km, positions=None, allowed=None):
+        """Row positions within radius_km of (lon, lat) and their distances in km, closest first.
+
+        positions, when given, restricts the search to those row positions
+        (e.g. the places with the user's mood). Ties keep row order.
+        """
+        if allowed is None:
+            allowed = self._allowed(positions)
+        slots = self._candidates(lon, lat, radius_km)
+        if allowed is not None:
+            slots = slots[allowed[slots]]
+        distances = haversine_km(lon, lat, self.lons[slots], self.lats[slots])
+        keep = distances <= radius_km
+        slots, distances = slots[keep], distances[keep]
+        order = np.lexsort((self.positions[slots], distances))
+        return self.positions[slots][order], distances[order]
+
+    def nearest(self, lon, lat, k, positions=None, max_km=None):
+        """The k row positions closest to (lon, lat) and their distances in km, closest first.
+
+        The search radius grows from one cell until k places are found, or
+        max_km (default: half the Earth's circumference) is reached.
+        """
+        allowed = self._allowed(positions)
+        limit = max_km if max_km is not None else np.pi * EARTH_RADIUS_KM
+        radius_km = min(self.cell_deg * KM_PER_DEGREE, limit)
+        while True:
+            found, distances = self.within(lon, lat, radius_km, allowed=allowed)
+            if len(found) >= k or radius_km >= limit:
+                return found[:k], distances[:k]
+            radius_km = min(radius_km * 4, limit)
@@ -0,0 +1,163 @@
+import multiprocessing
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+from data.columnar import partition_key, save_partition
+from data.labeling import BatchLabeler, LabelCache
+
+# Scratch directory inside the version directory while it is being written
+STAGING_DIR = '_staging'
+
+# Rough memory of a chunk in flight, in multiples of its parsed size (parser buffers,
+# cleaned, joined and per-city copies)
+CHUNK_COPIES = 8
+MIN_CHUNK_ROWS = 1000
+
+# Classifier of a city worker process, created once by _init_city_worker
+_worker_classifier = None
+
+
+def chunk_rows_for(csv_file, memory_limit_mb, workers=1, sample_rows=1000):
+    """Rows per chunk that keep `workers` concurrent chunks of a CSV under the memory limit.
+
+    The in-memory size of a row is estimated from the first sample_rows rows.
+    """
+    sample = pd.read_csv(csv_file, nrows=sample_rows)
+    bytes_per_row = max(sample.memory_usage(deep=True).sum() / max(len(sample), 1), 1.0)
+    budget = memory_limit_mb * 2 ** 20 / max(workers, 1)
+    return max(MIN_CHUNK_ROWS, int(budget / (bytes_per_row * CHUNK_COPIES)))
+
+
+class CitySpill:
+    """Stages cleaned chunks on disk, split by city, until each city is processed on its own.
+
+    Every chunk adds one pickled piece per city it contains, so memory holds
+    at most one chunk while the raw files are read.
+    """
+
+    def __init__(self, dir_path):
+        self.dir_path = dir_path
+        self.rows = {}
+        self.cities = {}
+        self._pieces = 0
+
+    def add(self, table, frame):
+        for city, group in frame.groupby('city', dropna=False, sort=False):
+            key = partition_key(city)
+            path = os.path.join(self.dir_path, table, key)
+            os.makedirs(path, exist_ok=True)
+            group.to_pickle(os.path.join(path, f"{self._pieces:08d}.pkl"))
+            self._pieces += 1
+            self.rows[(table, key)] = self.rows.get((table, key), 0) + len(group)
+            self.cities.setdefault(key, city)
+
+    def keys(self):
+        """Partition keys of every staged city, largest first so long cities start early"""
+        totals = {}
+        for (_, key), rows in self.rows.items():
+            totals[key] = totals.get(key, 0) + rows
+        return sorted(totals, key=lambda key: -totals[key])
+
+    def partitions(self):
+        """Number of city partitions staged per table"""
+        counts = {}
+        for table, _ in self.rows:
+            counts[table] = counts.get(table, 0) + 1
+        return counts
+
+    def remove(self):
+        shutil.rmtree(self.dir_path, ignore_errors=True)
+
+
+def staged_pieces(staging_dir, table, key):
+    """Staged frames of one city of a table, in the order they were read"""
+    path = os.path.join(staging_dir, table, key)
+    if not os.path.isdir(path):
+        return
+    for name in sorted(os.listdir(path)):
+        yield pd.read_pickle(os.path.join(path, name))
+
+
+def _init_city_worker(backend, root):
+    """Load the worker's own classifier backend"""
+    global _worker_classifier
+    from classifiers.backends import make_classifier
+    _worker_classifier = make_classifier(backend, root)
+
+
+def coalesce(pieces, chunk_rows):
+    """Concatenate consecutive pieces into frames of at least chunk_rows rows (the last may be smaller)"""
+    buffer, buffered = [], 0
+    for piece in pieces:
+        buffer.append(piece)
+        buffered += len(piece)
+        if buffered >= chunk_rows:
+            yield pd.concat(buffer, ignore_index=True)
+            buffer, buffered = [], 0
+    if buffer:
+        yield pd.concat(buffer, ignore_index=True)
+
+
+def process_city(staging_dir, dir_path, key, chunk_rows, labels, label_cache=None, batch_size=None, classifier=None):
+    """Label one city's places and write its places and posts partitions.
+
+    Parts hold about chunk_rows[table] rows, so at most one part is in memory.
+    Runs in a city worker process (with its own classifier) or in-process
+    with the given classifier. Returns row counts and the labeling reports.
+    """
+    classifier = classifier if classifier is not None else _worker_classifier
+    cache = None
+    if label_cache is not None:
+        from classifiers.backends import classifier_name
+        cache = LabelCache(label_cache, classifier_name(classifier), labels)
+
+    result = {'key': key, 'rows': {}, 'labeling': []}
+    try:
+        for table in ('places', 'posts'):
+            rows = 0
+            for part, frame in enumerate(coalesce(staged_pieces(staging_dir, table, key), chunk_rows[table])):
+                if table == 'places':
+                    labeler = BatchLabeler(classifier, labels, batch_size, workers=1, cache=cache)
+                    frame['label'] = labeler.label(frame['description'])
+                    result['labeling'].append(labeler.report)
+                save_partition(frame, dir_path, table, key, part)
+                rows += len(frame)
+            result['rows'][table] = rows
+    finally:
+        if cache is not None:
+            cache.store.close()
+    return result
+
+
+def process_cities(staging_dir, dir_path, keys, workers=1, classifier=None, backend=None, root=None, **options):
+    """process_city for every staged city key, in key order; returns their results.
+
+    With workers > 1 and a backend the cities run on a spawn process pool
+    whose workers each build their own classifier with
+    make_classifier(backend, root). Otherwise they run here with the given
+    classifier. options are passed on to process_city.
+    """
+    if workers > 1 and backend is None:
+        print("Processing cities in-process: the classifier has no backend pool workers could rebuild")
+    if workers <= 1 or backend is None or len(keys) <= 1:
+        return [process_city(staging_dir, dir_path, key, classifier=classifier, **options) for key in keys]
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                             initializer=_init_city_worker,
+                             initargs=(backend, root)) as pool:
+        futures = [pool.submit(process_city, staging_dir, dir_path, key, **options) for key in keys]
+        return [future.result() for future in futures]
+
+
+def merge_labeling_reports(reports):
+    """One labeling report summing the per-part reports of every city"""
+    reports = [report for report in reports if report]
+    if not reports:
+        return None
+    merged = {field: sum(report[field] for report in reports)
+              for field in ('rows', 'unique_texts', 'cache_reused', 'classified')}
+    merged['seconds'] = round(sum(report['seconds'] for report in reports), 3)
+    merged['batch_size'] = reports[0]['batch_size']
+    merged['parts'] = len(reports)
+    merged['texts_per_second'] = round(merged['classified'] / merged['seconds'], 2) if merged['seconds'] > 0 else None
+    return merged
@@ -0,0 +1,146 @@
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from config.settings import Config
+from data.cache import DiskCache, content_key
+
+SUMMARY_SYSTEM_PROMPT = "while considering the city name, its decription, city picker line, and social media posts, Summarize the text in such a way that it reflects the fitness of the place for people in one of these labels: lowkey, nightout, comfortable, surprise, hidden gem. We will be recommending the places based on the people mood. Do it only in plain text with no formatting"
+
+# Client errors that will not succeed on retry
+NON_RETRYABLE_STATUS = {400, 401, 403, 404, 422}
+
+
+def make_openai_client():
+    """OpenAI client shared by all summarization workers; OPENAI_BASE_URL can point it at a local stub"""
+    import openai
+    return openai.OpenAI(api_key=Config.OPENAI_API_KEY, base_url=Config.OPENAI_BASE_URL)
+
+
+class TokenBucket:
+    """Thread-safe token bucket: `rate` tokens per second, bursts of up to `capacity`"""
+
+    def __init__(self, rate, capacity=1):
+        self.rate = float(rate)
+        self.capacity = max(1.0, float(capacity))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a token is available, then take it"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class PlaceSummarizer:
+    """Concurrent, rate-limited, retried and disk-cached OpenAI summarization"""
+
+    def __init__(self, client=None, cache=None, workers=None, requests_per_minute=None,
+                 max_retries=None, backoff_seconds=None, model=Config.OPENAI_MODEL):
+        self._client = client
+        self._client_lock = threading.Lock()
+        self.cache = cache
+        self.workers = workers or Config.SUMMARY_WORKERS
+        rpm = requests_per_minute or Config.SUMMARY_REQUESTS_PER_MINUTE
+        self.rate_limiter = TokenBucket(rpm / 60.0, capacity=self.workers)
+        self.max_retries = Config.SUMMARY_MAX_RETRIES if max_retries is None else max_retries
+        self.backoff_seconds = Config.SUMMARY_BACKOFF_SECONDS if backoff_seconds is None else backoff_seconds
+        self.model = model
+        self.report = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    self._client = make_openai_client()
+        return self._client
+
+    def cache_key(self, key):
+        return content_key(key, self.model, SUMMARY_SYSTEM_PROMPT)
+
+    def summarize_text(self, text):
+        """Summarize one text; returns (succeeded, summary or error message)"""
+        for attempt in range(self.max_retries + 1):
+            self.rate_limiter.acquire()
+            try:
+                response = self.client.chat.completions.create(
+                    model=self.model,
+                    messages=[
+                        {"role": "system", "content": SUMMARY_SYSTEM_PROMPT},
+                        {"role": "user", "content": text}
+                    ]
+                )
+                return True, response.choices[0].message.content
+            except Exception as e:
+                retryable = getattr(e, 'status_code', None) not in NON_RETRYABLE_STATUS
+                if not retryable or attempt == self.max_retries:
+                    return False, f"Error generating response: {e}"
+                # Exponential backoff with jitter so workers do not retry in lockstep
+                time.sleep(self.backoff_seconds * (2 ** attempt) * (0.5 + random.random()))
+
+    def summarize_key(self, key, build_text):
+        """Build the text of one key and summarize it"""
+        return self.summarize_text(build_text(key))
+
+    def summarize_all(self, keys, build_text):
+        """Summarize the text of every key, skipping duplicate keys and summaries already in the cache.
+
+        Keys are small digests of what goes into a text; build_text(key)
+        builds the text inside the worker that sends it, so only the texts
+        in flight are held in memory. Returns one (succeeded, summary or
+        error message) tuple per key. Each summary is cached as soon as it
+        arrives, so an interrupted run resumes where it stopped. Failures
+        are not cached.
+        """
+        unique_keys = list(dict.fromkeys(keys))
+        started = time.perf_counter()
+
+        results = {}
+        if self.cache is not None:
+            cache_keys = {self.cache_key(key): key for key in unique_keys}
+            results = {cache_keys[cache_key]: (True, summary)
+                       for cache_key, summary in self.cache.get_many(cache_keys).items()}
+        reused = len(results)
+        pending = [key for key in unique_keys if key not in results]
+
+        failed = 0
+        if pending:
+            with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                futures = {pool.submit(self.summarize_key, key, build_text): key for key in pending}
+                for done, future in enumerate(as_completed(futures), start=1):
+                    key = futures[future]
+                    succeeded, summary = future.result()
+                    results[key] = (succeeded, summary)
+                    if succeeded and self.cache is not None:
+                        self.cache.set(self.cache_key(key), summary)
+                    failed += not succeeded
+                    if done % 50 == 0 or done == len(pending):
+                        print(f"Summarized {done}/{len(pending)} places")
+
+        elapsed = time.perf_counter() - started
+        self.report = {
+            'texts': len(keys),
+            'unique_texts': len(unique_keys),
+            'cache_reused': reused,
+            'requested': len(pending),
+            'failed': failed,
+            'workers': self.workers,
+            'seconds': round(elapsed, 3),
+        }
+        print(f"Summarization finished: {self.report}")
+        return [results[key] for key in keys]
+
+
+def open_summary_cache(root):
+    """Persistent summary cache shared by all preprocessing runs under root"""
+    return DiskCache(f"{root}/{Config.SUMMARY_CACHE_FILE}", table='summaries')
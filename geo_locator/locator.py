@@ -1,5 +1,271 @@
-from shapely.geometry import Point
+import numpy as np
+import pandas as pd
+import shapely
+from shapely import STRtree
 import geopandas as gpd
+from pyproj import CRS, Geod, Transformer
+
+
+SOURCE_CRS = "EPSG:4326"
+PROJECTED_CRS = "EPSG:3857"
+
+# How nearest-boundary distances are measured:
+#   mercator - planar distance in EPSG:3857 (legacy, inflated away from the equator)
+#   local    - planar distance in an equal-area projection centred on the boundaries
+#   geodesic - ellipsoidal distance to the nearest boundary point, candidates from `local`
+DISTANCE_MODES = ('mercator', 'local', 'geodesic')
+DEFAULT_DISTANCE_MODE = 'geodesic'
+
+# Candidates within this factor of the closest projected distance are re-ranked geodesically
+GEODESIC_CANDIDATE_SLACK = 1.1
+
+_geod = Geod(ellps="WGS84")
+
+
+class _Projection:
+    """Boundary geometries projected once into one CRS, with their own STRtree."""
+
+    def __init__(self, geometries: gpd.GeoSeries, crs):
+        self.crs = crs
+        self.geometries = np.asarray(geometries.to_crs(crs).array, dtype=object)
+        self.tree = STRtree(self.geometries)
+        self.forward = Transformer.from_crs(SOURCE_CRS, crs, always_xy=True)
+        self.inverse = Transformer.from_crs(crs, SOURCE_CRS, always_xy=True)
+
+    def points(self, lons, lats):
+        xs, ys = self.forward.transform(lons, lats)
+        return shapely.points(xs, ys)
+
+
+def local_equal_area_crs(gdf: gpd.GeoDataFrame) -> CRS:
+    """
+    Lambert azimuthal equal-area CRS centred on the boundaries' extent.
+
+    Args:
+        gdf (GeoDataFrame): GeoDataFrame in EPSG:4326
+
+    Returns:
+        CRS: Projection with low distance distortion across a metro area
+    """
+    min_lon, min_lat, max_lon, max_lat = gdf.total_bounds
+    lon_0, lat_0 = (min_lon + max_lon) / 2, (min_lat + max_lat) / 2
+    return CRS.from_proj4(f"+proj=laea +lat_0={lat_0} +lon_0={lon_0} +datum=WGS84 +units=m +no_defs")
+
+
+class BoundaryLocator:
+    """
+    STRtree-backed index over boundary polygons.
+
+    Answers containment and nearest-boundary queries for whole arrays of
+    points, so resolving thousands of places costs one index query instead
+    of one full scan of the boundaries per place. Projected copies of the
+    boundaries are cached per distance mode, so a nearest-boundary miss never
+    reprojects the boundaries.
+    """
+
+    def __init__(self, gdf: gpd.GeoDataFrame, distance_mode: str = DEFAULT_DISTANCE_MODE):
+        if distance_mode not in DISTANCE_MODES:
+            raise ValueError(f"Unknown distance mode {distance_mode!r}, expected one of {DISTANCE_MODES}")
+        self.gdf = gdf
+        self.distance_mode = distance_mode
+        self.geometries = np.asarray(gdf.geometry.array, dtype=object)
+        self.tree = STRtree(self.geometries)
+        self._projections = {}
+        self._neighbours = {}
+
+        # Projected once here instead of on every nearest-boundary miss
+        self._projection(distance_mode)
+
+    def __len__(self):
+        return len(self.geometries)
+
+    @staticmethod
+    def _as_points(lons, lats):
+        lons = np.atleast_1d(np.asarray(lons, dtype=float))
+        lats = np.atleast_1d(np.asarray(lats, dtype=float))
+        if lons.shape != lats.shape:
+            raise ValueError("lons and lats must have the same shape")
+        return lons, lats
+
+    def _projection(self, mode):
+        """Projected boundaries backing a distance mode, built on first use."""
+        crs = PROJECTED_CRS if mode == 'mercator' else 'local'
+        projection = self._projections.get(crs)
+        if projection is None:
+            target = PROJECTED_CRS if crs == PROJECTED_CRS else local_equal_area_crs(self.gdf)
+            projection = _Projection(self.gdf.geometry, target)
+            self._projections[crs] = projection
+        return projection
+
+    def contains(self, lons, lats):
+        """
+        Find every boundary containing each point.
+
+        Args:
+            lons (array-like): Longitudes
+            lats (array-like): Latitudes
+
+        Returns:
+            tuple: (point positions, boundary positions) as parallel arrays
+        """
+        lons, lats = self._as_points(lons, lats)
+        points = shapely.points(lons, lats)
+        point_pos, boundary_pos = self.tree.query(points, predicate="within")
+        return point_pos, boundary_pos
+
+    def nearest(self, lons, lats, mode: str = None):
+        """
+        Find the nearest boundary to each point.
+
+        Args:
+            lons (array-like): Longitudes
+            lats (array-like): Latitudes
+            mode (str): One of DISTANCE_MODES, defaults to the locator's mode
+
+        Returns:
+            tuple: (boundary positions, distances in meters), one per point
+        """
+        mode = mode or self.distance_mode
+        if mode not in DISTANCE_MODES:
+            raise ValueError(f"Unknown distance mode {mode!r}, expected one of {DISTANCE_MODES}")
+
+        lons, lats = self._as_points(lons, lats)
+        projection = self._projection(mode)
+        points = projection.points(lons, lats)
+        (_, boundary_pos), distances = projection.tree.query_nearest(
+            points, return_distance=True, all_matches=False
+        )
+        if mode != 'geodesic' or not len(points):
+            return boundary_pos, distances
+
+        # Re-rank every boundary close to the projected winner by ellipsoidal distance
+        point_pos, candidate_pos = projection.tree.query(
+            points, predicate='dwithin', distance=distances * GEODESIC_CANDIDATE_SLACK + 1.0
+        )
+        nearest_points = shapely.get_coordinates(
+            shapely.shortest_line(points[point_pos], projection.geometries[candidate_pos])
+        )[1::2]
+        near_lons, near_lats = projection.inverse.transform(nearest_points[:, 0], nearest_points[:, 1])
+        _, _, geodesic = _geod.inv(lons[point_pos], lats[point_pos], near_lons, near_lats)
+
+        candidates = pd.DataFrame({'point': point_pos, 'boundary': candidate_pos, 'distance': geodesic})
+        best = candidates.sort_values(['point', 'distance', 'boundary'], kind='stable').drop_duplicates('point')
+        return best['boundary'].to_numpy(), best['distance'].to_numpy()
+
+    def locate(self, lons, lats) -> pd.DataFrame:
+        """
+        Resolve points to the boundaries containing them, falling back to the nearest boundary.
+
+        Points with missing coordinates are skipped. A point inside several
+        overlapping boundaries yields one row per boundary.
+
+        Args:
+            lons (array-like): Longitudes
+            lats (array-like): Latitudes
+
+        Returns:
+            DataFrame: Columns `point` (input position), `boundary` (row position
+            in the GeoDataFrame), `contained` and `distance_to_point`
+        """
+        lons, lats = self._as_points(lons, lats)
+        valid = np.flatnonzero(np.isfinite(lons) & np.isfinite(lats))
+
+        point_pos, boundary_pos = self.contains(lons[valid], lats[valid])
+        point_pos = valid[point_pos]
+
+        missed = np.setdiff1d(valid, point_pos)
+        if len(missed):
+            nearest_pos, distances = self.nearest(lons[missed], lats[missed])
+        else:
+            nearest_pos, distances = np.empty(0, dtype=np.intp), np.empty(0)
+
+        located = pd.DataFrame({
+            'point': np.concatenate([point_pos, missed]),
+            'boundary': np.concatenate([boundary_pos, nearest_pos]),
+            'contained': np.concatenate([np.ones(len(point_pos), dtype=bool), np.zeros(len(missed), dtype=bool)]),
+            'distance_to_point': np.concatenate([np.zeros(len(point_pos)), distances]),
+        })
+        return located.sort_values(['point', 'boundary'], kind='stable', ignore_index=True)
+
+    def neighbours(self, within_m: float = 0.0):
+        """
+        Boundary adjacency graph: pairs of boundaries that touch or lie within `within_m` meters.
+
+        Distances are measured in the local equal-area projection. The graph
+        is built with one STRtree query over all boundaries and cached per
+        distance, so later lookups are free.
+
+        Args:
+            within_m (float): Gap in meters still counted as neighbouring (0 = touching or overlapping)
+
+        Returns:
+            tuple: (indptr, neighbours) in CSR layout; the neighbours of boundary
+            position i are neighbours[indptr[i]:indptr[i + 1]], closest first
+        """
+        graph = self._neighbours.get(float(within_m))
+        if graph is not None:
+            return graph
+
+        projection = self._projection('local')
+        geometries = projection.geometries
+        if within_m > 0:
+            left, right = projection.tree.query(geometries, predicate='dwithin', distance=within_m)
+        else:
+            left, right = projection.tree.query(geometries, predicate='intersects')
+        pairs = left != right
+        left, right = left[pairs], right[pairs]
+        distances = shapely.distance(geometries[left], geometries[right])
+
+        order = np.lexsort((right, distances, left))
+        left, right = left[order], right[order]
+        indptr = np.zeros(len(geometries) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(left, minlength=len(geometries)), out=indptr[1:])
+        graph = (indptr, right.astype(np.int64))
+        self._neighbours[float(within_m)] = graph
+        return graph
+
+    def find_containing_or_nearest(self, lon: float, lat: float) -> gpd.GeoDataFrame:
+        """
+        Find rows that contain the point. If none, return the nearest geometry.
+
+        Args:
+            lon (float): Longitude
+            lat (float): Latitude
+
+        Returns:
+            GeoDataFrame: Matched rows
+        """
+        _, boundary_pos = self.contains(lon, lat)
+        if len(boundary_pos):
+            return self.gdf.iloc[np.sort(boundary_pos)]
+
+        boundary_pos, distances = self.nearest(lon, lat)
+        nearest = self.gdf.iloc[boundary_pos].copy()
+        nearest['distance_to_point'] = distances
+        return nearest
+
+
+def get_locator(gdf: gpd.GeoDataFrame, distance_mode: str = None) -> BoundaryLocator:
+    """
+    Return the BoundaryLocator for a GeoDataFrame, building it on first use.
+
+    The locator is kept on the frame itself, so it lives exactly as long as
+    the frame does. It reflects the geometries at build time; copies of the
+    frame get their own locator.
+
+    Args:
+        gdf (GeoDataFrame): GeoDataFrame with polygon geometries
+        distance_mode (str): Default nearest-boundary distance mode for a new locator
+
+    Returns:
+        BoundaryLocator: Index shared by every lookup against this frame
+    """
+    locator = gdf.__dict__.get('_boundary_locator')
+    if locator is None:
+        locator = BoundaryLocator(gdf, distance_mode or DEFAULT_DISTANCE_MODE)
+        # Bypass pandas attribute handling so this never becomes a column
+        object.__setattr__(gdf, '_boundary_locator', locator)
+    return locator
 
 
 def find_containing_or_nearest(gdf: gpd.GeoDataFrame, lon: float, lat: float) -> gpd.GeoDataFrame:
@@ -14,20 +280,4 @@ def find_containing_or_nearest(gdf: gpd.GeoDataFrame, lon: float, lat: float) ->
     Returns:
         GeoDataFrame: Matched rows
     """
-    point = Point(lon, lat)
-    
-    # Try finding containing polygon(s)
-    matched = gdf[gdf.contains(point)]
-    if not matched.empty:
-        return matched
-
-    # Compute distance for fallback
-    # Make sure CRS is projected for distance (meters)
-    projected_gdf = gdf.to_crs("EPSG:3857")
-    projected_point = gpd.GeoSeries([point], crs="EPSG:4326").to_crs("EPSG:3857").iloc[0]
-
-    projected_gdf['distance_to_point'] = projected_gdf.geometry.distance(projected_point)
-    nearest = projected_gdf.sort_values("distance_to_point").head(1)
-
-    # Reproject result back to WGS84 if needed
-    return nearest.to_crs("EPSG:4326")
+    return get_locator(gdf).find_containing_or_nearest(lon, lat)
@@ -1,17 +1,95 @@
+import glob
+import hashlib
+import os
+import re
+import tempfile
+
+import numpy as np
 import pandas as pd
 import geopandas as gpd
-from shapely.geometry import Polygon
+import shapely
+from config.settings import Config
+from geo_locator.locator import get_locator
+
+
+# Flattened polygon vertex columns: geometry.coordinates[0][<vertex>][<0=lon, 1=lat>]
+COORDINATE_COLUMN = re.compile(r"^geometry\.coordinates\[0\]\[(\d+)\]\[([01])\]$")
+
+# Bump when the CSV -> GeoDataFrame conversion changes, so old snapshots are rebuilt
+SNAPSHOT_FORMAT = 1
+
+
+def coordinate_array(df: pd.DataFrame) -> np.ndarray:
+    """
+    Reshapes the flattened coordinate columns into a single array.
+
+    Vertices are ordered by their numeric index, so vertex 10 comes after
+    vertex 9 rather than after vertex 1.
+
+    Args:
+        df (pd.DataFrame): Boundaries as read from the flattened CSV.
+
+    Returns:
+        np.ndarray: Array of shape (rows, vertices, 2) holding lon/lat, NaN where missing.
+    """
+    positions = {}
+    for col in df.columns:
+        match = COORDINATE_COLUMN.match(col)
+        if match:
+            positions[col] = (int(match.group(1)), int(match.group(2)))
+
+    if not positions:
+        return np.empty((len(df), 0, 2))
+
+    columns = list(positions)
+    vertex_index = np.array([positions[col][0] for col in columns])
+    axis_index = np.array([positions[col][1] for col in columns])
+
+    values = df[columns].apply(pd.to_numeric, errors='coerce').to_numpy(dtype=float)
+    coords = np.full((len(df), vertex_index.max() + 1, 2), np.nan)
+    coords[:, vertex_index, axis_index] = values
+    return coords
 
 
-def load_and_preprocess(csv_path: str) -> gpd.GeoDataFrame:
+def build_polygons(coords: np.ndarray) -> np.ndarray:
+    """
+    Builds one polygon per row of a coordinate array in bulk.
+
+    Vertices with a missing lon or lat are dropped. Rows left with fewer than
+    three vertices become empty polygons.
+
+    Args:
+        coords (np.ndarray): Array of shape (rows, vertices, 2) from `coordinate_array`.
+
+    Returns:
+        np.ndarray: Polygon geometries, one per row.
+    """
+    polygons = np.array([shapely.Polygon() for _ in range(len(coords))], dtype=object)
+
+    valid = ~np.isnan(coords).any(axis=2)
+    counts = valid.sum(axis=1)
+    buildable = counts >= 3
+    if not buildable.any():
+        return polygons
+
+    valid &= buildable[:, None]
+    ring_index = np.repeat(np.arange(buildable.sum()), counts[buildable])
+    rings = shapely.linearrings(coords[valid], indices=ring_index)
+    polygons[buildable] = shapely.polygons(rings)
+    return polygons
+
+
+def load_and_preprocess(csv_path: str, distance_mode: str = None) -> gpd.GeoDataFrame:
     """
     Loads a flattened CSV with geometry coordinates and constructs a GeoDataFrame.
 
     Args:
         csv_path (str): Path to the CSV file.
+        distance_mode (str): Nearest-boundary distance mode for the spatial index.
 
     Returns:
-        gpd.GeoDataFrame: A GeoDataFrame with proper Polygon geometries.
+        gpd.GeoDataFrame: A GeoDataFrame with proper Polygon geometries and a
+        spatial index built for `find_containing_or_nearest`.
     """
     try:
         df = pd.read_csv(csv_path)
@@ -20,20 +98,103 @@ def load_and_preprocess(csv_path: str) -> gpd.GeoDataFrame:
     except Exception as e:
         raise RuntimeError(f"Error reading file: {e}")
 
-    # Extract coordinate columns
-    coord_cols = [col for col in df.columns if col.startswith("geometry.coordinates[0][")]
-    long_cols = sorted([col for col in coord_cols if col.endswith('[0]')])
-    lat_cols  = sorted([col for col in coord_cols if col.endswith('[1]')])
+    df['geometry'] = build_polygons(coordinate_array(df))
+
+    gdf = gpd.GeoDataFrame(df, geometry='geometry', crs="EPSG:4326")
+    get_locator(gdf, distance_mode)
+    return gdf
 
-    def build_polygon(row):
-        coords = []
-        for lon_col, lat_col in zip(long_cols, lat_cols):
-            lon, lat = row.get(lon_col), row.get(lat_col)
-            if lon != '' and lat != '' and pd.notnull(lon) and pd.notnull(lat):
-                coords.append((lon, lat))
-        return Polygon(coords)
 
-    df['geometry'] = df.apply(build_polygon, axis=1)
+def source_fingerprint(csv_path: str) -> str:
+    """
+    Content hash of a boundaries CSV, used to key its binary snapshot.
 
-    gdf = gpd.GeoDataFrame(df, geometry='geometry', crs="EPSG:4326")
+    Args:
+        csv_path (str): Path to the CSV file.
+
+    Returns:
+        str: Hex digest covering the file contents and the snapshot format.
+    """
+    digest = hashlib.sha1(f"boundaries-snapshot-v{SNAPSHOT_FORMAT}".encode())
+    with open(csv_path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def snapshot_path(csv_path: str, fingerprint: str, snapshot_dir: str = None) -> str:
+    """
+    Location of the GeoParquet snapshot for a given CSV version.
+
+    Args:
+        csv_path (str): Path to the CSV file.
+        fingerprint (str): Result of `source_fingerprint`.
+        snapshot_dir (str): Directory for snapshots, defaults to Config.BOUNDARY_SNAPSHOT_DIR.
+
+    Returns:
+        str: Snapshot file path.
+    """
+    return os.path.join(snapshot_dir or Config.BOUNDARY_SNAPSHOT_DIR, f"{_snapshot_stem(csv_path)}.{fingerprint[:16]}.parquet")
+
+
+def _snapshot_stem(csv_path: str) -> str:
+    """CSV name plus a hash of its location, so CSVs sharing a name never share or evict snapshots"""
+    location = hashlib.sha1(os.path.abspath(csv_path).encode('utf-8')).hexdigest()[:8]
+    return f"{os.path.splitext(os.path.basename(csv_path))[0]}.{location}"
+
+
+def load_boundaries(csv_path: str, snapshot_dir: str = None, distance_mode: str = None) -> gpd.GeoDataFrame:
+    """
+    Loads boundaries from a GeoParquet snapshot, reparsing the CSV only when it changed.
+
+    The snapshot name carries a hash of the CSV contents, so editing the CSV
+    invalidates it. Stale snapshots of the same CSV are removed when a new
+    one is written. Without pyarrow, or on a read-only directory, this falls
+    back to `load_and_preprocess`.
+
+    Args:
+        csv_path (str): Path to the CSV file.
+        snapshot_dir (str): Directory for snapshots, defaults to Config.BOUNDARY_SNAPSHOT_DIR.
+        distance_mode (str): Nearest-boundary distance mode for the spatial index.
+
+    Returns:
+        gpd.GeoDataFrame: Same frame `load_and_preprocess` would return.
+    """
+    try:
+        fingerprint = source_fingerprint(csv_path)
+    except FileNotFoundError:
+        raise FileNotFoundError(f"CSV file not found at {csv_path}")
+
+    path = snapshot_path(csv_path, fingerprint, snapshot_dir)
+    if os.path.exists(path):
+        try:
+            gdf = gpd.read_parquet(path)
+            get_locator(gdf, distance_mode)
+            return gdf
+        except Exception as e:
+            print(f"Error reading boundaries snapshot {path}: {e}, reparsing CSV")
+
+    gdf = load_and_preprocess(csv_path, distance_mode)
+    tmp_path = None
+    try:
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        stale = glob.glob(os.path.join(glob.escape(directory), f"{glob.escape(_snapshot_stem(csv_path))}.*.parquet"))
+        # Private temporary file: workers rebuilding the same snapshot must not write into each other's file
+        with tempfile.NamedTemporaryFile(dir=directory, suffix='.parquet.tmp', delete=False) as tmp:
+            tmp_path = tmp.name
+        gdf.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, path)
+        tmp_path = None
+        for old in stale:
+            if old != path and os.path.exists(old):
+                try:
+                    os.remove(old)
+                except FileNotFoundError:  # removed by a concurrent worker
+                    pass
+    except (ImportError, OSError) as e:
+        print(f"Boundaries snapshot not written: {e}")
+    finally:
+        if tmp_path is not None and os.path.exists(tmp_path):
+            os.remove(tmp_path)
     return gdf
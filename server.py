@@ -0,0 +1,286 @@
+import argparse
+import asyncio
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from config.settings import Config
+
+MAX_BODY_BYTES = 64 * 1024
+
+REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+           413: 'Payload Too Large', 500: 'Internal Server Error', 503: 'Service Unavailable'}
+
+
+class HttpError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class RecommendationServer:
+    """Asyncio HTTP front end for RecommendationService.
+
+    Endpoints:
+        GET  /healthz    - process is up
+        GET  /readyz     - 200 once datasets, boundary index and classifier are warm
+        GET  /stats      - in-flight/queued counts and cache hit rates
+        GET  /metrics    - per-stage traces in Prometheus text format
+        POST /recommend  - {"city": ..., "prompt": ..., "stream": false}, optionally
+                           "location": [lon, lat] and "order_by_distance": true
+
+    At most `max_concurrency` requests run the pipeline at once; up to
+    `max_queue` more wait for a slot, and anything beyond that is rejected
+    with 503 so callers back off instead of piling up latency.
+    """
+
+    def __init__(self, service_factory, max_concurrency=None, max_queue=None, cpu_workers=None, watch_interval=None):
+        self.service_factory = service_factory
+        self.service = None
+        self.watcher = None
+        self.watch_interval = Config.DATASET_WATCH_INTERVAL if watch_interval is None else watch_interval
+        self.ready = False
+        self.max_concurrency = max_concurrency or Config.SERVER_MAX_CONCURRENCY
+        self.max_queue = Config.SERVER_MAX_QUEUE if max_queue is None else max_queue
+        self.cpu_pool = ThreadPoolExecutor(max_workers=cpu_workers or Config.SERVER_CPU_WORKERS,
+                                           thread_name_prefix='recommend-cpu')
+        self._slots = None
+        self.in_flight = 0
+        self.queued = 0
+        self.rejected = 0
+
+    def _build_and_warm_up(self):
+        """Build the service and touch everything a first request would otherwise load"""
+        started = time.perf_counter()
+        service = self.service_factory()
+        service.datasets.warm_up()
+        service.mood_classifier.wait_until_ready()
+        service.mood_classifier.classify_user_mood("warm up")
+        print(f"Warm-up finished in {time.perf_counter() - started:.2f}s")
+        return service
+
+    async def warm_up(self):
+        loop = asyncio.get_running_loop()
+        self.service = await loop.run_in_executor(self.cpu_pool, self._build_and_warm_up)
+        if self.watch_interval > 0:
+            from services.dataset_watcher import DatasetWatcher
+            self.watcher = DatasetWatcher(self.service, self.watch_interval).start()
+        self.ready = True
+
+    async def start(self, host, port):
+        """Listen right away (so /healthz and /readyz answer during warm-up), then warm up"""
+        self._slots = asyncio.Semaphore(self.max_concurrency)
+        server = await asyncio.start_server(self.handle, host, port)
+        print(f"Listening on http://{host}:{port}, warming up")
+        await self.warm_up()
+        print("Ready to serve recommendations")
+        return server
+
+    # HTTP plumbing
+
+    @staticmethod
+    async def _read_request(reader):
+        request_line = await reader.readline()
+        if not request_line:
+            return None
+        try:
+            method, target, _ = request_line.decode('latin-1').split(' ', 2)
+        except ValueError:
+            raise HttpError(400, "Malformed request line")
+
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        length = int(headers.get('content-length') or 0)
+        if length > MAX_BODY_BYTES:
+            raise HttpError(413, "Request body too large")
+        body = await reader.readexactly(length) if length else b''
+        return method.upper(), target.split('?', 1)[0], headers, body
+
+    @staticmethod
+    async def _send(writer, status, payload, extra_headers=None):
+        body = json.dumps(payload).encode('utf-8')
+        headers = {'Content-Type': 'application/json', 'Content-Length': str(len(body)), 'Connection': 'close'}
+        headers.update(extra_headers or {})
+        head = f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+        head += ''.join(f"{name}: {value}\r\n" for name, value in headers.items())
+        writer.write(head.encode('latin-1') + b'\r\n' + body)
+        await writer.drain()
+
+    @staticmethod
+    async def _start_chunked(writer):
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/plain; charset=utf-8\r\n"
+                     b"Transfer-Encoding: chunked\r\nConnection: close\r\n\r\n")
+        await writer.drain()
+
+    @staticmethod
+    async def _send_chunk(writer, text):
+        data = text.encode('utf-8')
+        if data:
+            writer.write(f"{len(data):x}\r\n".encode('latin-1') + data + b"\r\n")
+            await writer.drain()
+
+    async def handle(self, reader, writer):
+        try:
+            request = await self._read_request(reader)
+            if request is None:
+                return
+            method, path, headers, body = request
+            await self.route(method, path, body, writer)
+        except HttpError as e:
+            await self._send(writer, e.status, {'error': str(e)})
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except Exception as e:
+            print(f"Error handling request: {e}")
+            try:
+                await self._send(writer, 500, {'error': 'internal error'})
+            except ConnectionError:
+                pass
+        finally:
+            writer.close()
+
+    async def route(self, method, path, body, writer):
+        if path == '/healthz':
+            return await self._send(writer, 200, {'status': 'ok'})
+        if path == '/readyz':
+            return await self._send(writer, 200 if self.ready else 503, {'ready': self.ready})
+        if path == '/stats':
+            return await self._send(writer, 200, self.stats())
+        if path == '/metrics':
+            return await self._send_metrics(writer)
+        if path == '/recommend':
+            if method != 'POST':
+                raise HttpError(405, "Use POST")
+            return await self.recommend(body, writer)
+        raise HttpError(404, f"No route for {path}")
+
+    async def _send_metrics(self, writer):
+        from tracing.sinks import PrometheusSink
+        sink = self.service.tracer.find_sink(PrometheusSink) if self.service is not None else None
+        if sink is None:
+            raise HttpError(404, "No Prometheus trace sink configured")
+        body = sink.render().encode('utf-8')
+        writer.write(f"HTTP/1.1 200 OK\r\nContent-Type: text/plain; version=0.0.4\r\n"
+                     f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode('latin-1') + body)
+        await writer.drain()
+
+    # Recommendation endpoint
+
+    def stats(self):
+        stats = {'ready': self.ready, 'in_flight': self.in_flight, 'queued': self.queued,
+                 'rejected': self.rejected, 'max_concurrency': self.max_concurrency, 'max_queue': self.max_queue}
+        if self.service is not None:
+            stats['datasets_version'] = self.service.datasets.version
+        if self.watcher is not None:
+            stats['dataset_swaps'] = self.watcher.swaps
+        if self.service is not None and self.service.cache is not None:
+            stats['cache'] = self.service.cache.stats()
+        return stats
+
+    async def recommend(self, body, writer):
+        if not self.ready:
+            return await self._send(writer, 503, {'error': 'warming up'}, {'Retry-After': '1'})
+        try:
+            payload = json.loads(body or b'{}')
+            city, prompt = payload['city'], payload['prompt']
+        except (ValueError, KeyError, TypeError):
+            raise HttpError(400, 'Expected JSON body with "city" and "prompt"')
+        location = payload.get('location')
+        if location is not None:
+            try:
+                lon, lat = (float(value) for value in location)
+            except (ValueError, TypeError):
+                raise HttpError(400, '"location" must be [lon, lat]')
+            location = (lon, lat)
+
+        # Back-pressure: reject instead of queueing without bound
+        if self._slots.locked() and self.queued >= self.max_queue:
+            self.rejected += 1
+            return await self._send(writer, 503, {'error': 'overloaded'}, {'Retry-After': '1'})
+
+        self.queued += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self.queued -= 1
+        self.in_flight += 1
+        try:
+            from services.request_context import RequestContext
+            ctx = RequestContext(city, prompt, user_location=location,
+                                 order_by_distance=bool(payload.get('order_by_distance')))
+            chunks = self.service.astream_recommendation(city, prompt, executor=self.cpu_pool, ctx=ctx)
+            if payload.get('stream'):
+                await self._start_chunked(writer)
+                async for text in chunks:
+                    await self._send_chunk(writer, text)
+                writer.write(b"0\r\n\r\n")
+                await writer.drain()
+            else:
+                response = "".join([text async for text in chunks])
+                result = ctx.as_dict()
+                result['response'] = response
+                await self._send(writer, 200, result)
+        finally:
+            self.in_flight -= 1
+            self._slots.release()
+
+
+def build_service_factory(args):
+    """Factory building the RecommendationService, with stubbed LLM/classifier when requested"""
+    def factory():
+        from data.loader import DatasetLoader
+        from services.geo_service import GeoService
+        from services.mood_classifier import MoodClassifier
+        from services.recommendation_service import RecommendationService
+        from services.stubs import AsyncStubOpenAI, StubOpenAI, StubZeroShotClassifier
+
+        client = async_client = None
+        if args.stub_llm:
+            client = StubOpenAI(first_token_latency=args.stub_latency)
+            async_client = AsyncStubOpenAI(first_token_latency=args.stub_latency)
+        classifier = MoodClassifier(classifier=StubZeroShotClassifier()) if args.stub_classifier else None
+        return RecommendationService(
+            datasets=DatasetLoader(args.root),
+            client=client,
+            async_client=async_client,
+            mood_classifier=classifier,
+            geo_service=GeoService(args.boundaries or os.path.join(args.root, 'DumplinAI.city_boundaries.csv')),
+        )
+    return factory
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve DumplinAI recommendations over HTTP")
+    parser.add_argument('--host', default=Config.SERVER_HOST)
+    parser.add_argument('--port', type=int, default=Config.SERVER_PORT)
+    parser.add_argument('--root', default=Config.ROOT, help="Directory holding the datasets_vN directories")
+    parser.add_argument('--boundaries', default=None, help="City boundaries CSV (default: ROOT/DumplinAI.city_boundaries.csv)")
+    parser.add_argument('--max-concurrency', type=int, default=None)
+    parser.add_argument('--max-queue', type=int, default=None)
+    parser.add_argument('--cpu-workers', type=int, default=None)
+    parser.add_argument('--watch-interval', type=float, default=None,
+                        help="Seconds between checks for new dataset versions (0 disables hot reload)")
+    parser.add_argument('--stub-llm', action='store_true', help="Answer with a local stub instead of OpenAI")
+    parser.add_argument('--stub-latency', type=float, default=0.0, help="Stub time to first token, seconds")
+    parser.add_argument('--stub-classifier', action='store_true', help="Use a stub mood classifier instead of BART")
+    args = parser.parse_args()
+
+    server = RecommendationServer(build_service_factory(args), args.max_concurrency, args.max_queue, args.cpu_workers,
+                                  args.watch_interval)
+
+    async def serve():
+        http_server = await server.start(args.host, args.port)
+        async with http_server:
+            await http_server.serve_forever()
+
+    asyncio.run(serve())
+
+
+if __name__ == "__main__":
+    main()
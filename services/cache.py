@@ -0,0 +1,208 @@
+import abc
+import json
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from config.settings import Config
+from data.cache import content_key
+
+
+class CacheBackend(abc.ABC):
+    """Key -> JSON-serializable value store with LRU eviction and optional TTL"""
+
+    @abc.abstractmethod
+    def get(self, key):
+        """Stored value, or None when missing or expired"""
+
+    @abc.abstractmethod
+    def set(self, key, value, ttl=None):
+        """Store value, expiring after ttl seconds (the backend's default when None)"""
+
+    @abc.abstractmethod
+    def clear(self):
+        """Drop every entry"""
+
+    @abc.abstractmethod
+    def __len__(self):
+        """Number of stored entries"""
+
+
+class MemoryCache(CacheBackend):
+    """In-process LRU cache; entries expire `ttl` seconds after being set"""
+
+    def __init__(self, max_entries=None, ttl=None):
+        self.max_entries = max_entries or Config.RESULT_CACHE_MAX_ENTRIES
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        ttl = ttl if ttl is not None else self.ttl
+        with self._lock:
+            self._entries[key] = (value, time.time() + ttl if ttl else None)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+
+class SqliteCache(CacheBackend):
+    """On-disk LRU cache in a SQLite file, shared by every process on the host"""
+
+    def __init__(self, path=None, table='entries', max_entries=None, ttl=None):
+        self.path = path or Config.RESULT_CACHE_PATH
+        if not re.fullmatch(r'\w+', table):
+            raise ValueError(f"Invalid cache table name {table!r}")
+        self.table = table
+        self.max_entries = max_entries or Config.RESULT_CACHE_MAX_ENTRIES
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {table} ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL, accessed_at REAL NOT NULL)"
+            )
+            self._conn.execute(f"CREATE INDEX IF NOT EXISTS {table}_accessed ON {table} (accessed_at)")
+
+    def get(self, key):
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute(f"SELECT value, expires_at FROM {self.table} WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            value, expires_at = row
+            if expires_at is not None and expires_at <= now:
+                self._conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+                return None
+            self._conn.execute(f"UPDATE {self.table} SET accessed_at = ? WHERE key = ?", (now, key))
+            return json.loads(value)
+
+    def set(self, key, value, ttl=None):
+        ttl = ttl if ttl is not None else self.ttl
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), now + ttl if ttl else None, now)
+            )
+            # Evict least recently used rows beyond the size bound
+            self._conn.execute(
+                f"DELETE FROM {self.table} WHERE key IN ("
+                f"SELECT key FROM {self.table} ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+
+    def clear(self):
+        with self._lock, self._conn:
+            self._conn.execute(f"DELETE FROM {self.table}")
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+
+
+def make_backend(name, table, ttl, max_entries=None):
+    """Build the backend selected by Config.RESULT_CACHE_BACKEND ('memory' or 'sqlite')"""
+    if name == 'memory':
+        return MemoryCache(max_entries=max_entries, ttl=ttl)
+    if name == 'sqlite':
+        return SqliteCache(table=table, max_entries=max_entries, ttl=ttl)
+    raise ValueError(f"Unknown cache backend {name!r}, expected 'memory' or 'sqlite'")
+
+
+class CacheTier:
+    """A named cache with hit and miss counters"""
+
+    def __init__(self, name, backend):
+        self.name = name
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        value = self.backend.get(key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def set(self, key, value, ttl=None):
+        self.backend.set(key, value, ttl)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {'hits': self.hits, 'misses': self.misses,
+                    'hit_rate': self.hits / lookups if lookups else 0.0, 'size': len(self.backend)}
+
+
+def normalize_prompt(text):
+    """Cache key for a user prompt: case and whitespace differences are ignored"""
+    return re.sub(r'\s+', ' ', str(text)).strip().lower()
+
+
+class RecommendationCache:
+    """Two-tier cache around the recommendation pipeline.
+
+    Intermediate tier:
+        candidates - mood-matching place and city picker rows per (version, city, mood, location)
+        prompts    - LLM responses per compiled prompt hash, shared by any
+                     requests that compile to the same prompt
+    Final tier:
+        responses  - responses per (normalized prompt, city, mood, version, location)
+    """
+
+    def __init__(self, backend=None, candidates=None, prompts=None, responses=None):
+        backend = backend or Config.RESULT_CACHE_BACKEND
+        # Checked against None: an injected backend that is still empty has len() 0
+        if candidates is None:
+            candidates = make_backend(backend, 'candidates', Config.CANDIDATE_CACHE_TTL)
+        if prompts is None:
+            prompts = make_backend(backend, 'prompts', Config.RESPONSE_CACHE_TTL)
+        if responses is None:
+            responses = make_backend(backend, 'responses', Config.RESPONSE_CACHE_TTL)
+        self.candidates = CacheTier('candidates', candidates)
+        self.prompts = CacheTier('prompts', prompts)
+        self.responses = CacheTier('responses', responses)
+
+    @staticmethod
+    def candidates_key(version, user_city, user_mode, nearby=None):
+        parts = ('candidates', version, user_city, user_mode)
+        return content_key(*parts) if nearby is None else content_key(*parts, nearby)
+
+    @staticmethod
+    def prompt_key(compiled_prompt, model=Config.OPENAI_MODEL):
+        return content_key('prompt', model, compiled_prompt)
+
+    @staticmethod
+    def response_key(user_prompt, user_city, user_mode, version, nearby=None):
+        parts = ('response', normalize_prompt(user_prompt), user_city, user_mode, version)
+        return content_key(*parts) if nearby is None else content_key(*parts, nearby)
+
+    def stats(self):
+        return {tier.name: tier.stats() for tier in (self.candidates, self.prompts, self.responses)}
@@ -0,0 +1,89 @@
+import gc
+import threading
+import time
+import weakref
+from config.settings import Config
+from data.loader import DatasetLoader, latest_version_directory, version_number, version_signature
+
+
+class DatasetWatcher:
+    """Hot-swaps newly published dataset versions into a RecommendationService.
+
+    A background thread polls the datasets root every `interval` seconds.
+    When a newer complete datasets_vN directory appears, it is loaded and
+    warmed up off the request path, then swapped in with one reference
+    assignment. Requests already running finish on the version they pinned.
+    The previous loader is dropped right away, so it is freed once the last
+    of those requests finishes, instead of living on beside the new one.
+    """
+
+    def __init__(self, service, interval=None):
+        self.service = service
+        self.interval = Config.DATASET_WATCH_INTERVAL if interval is None else interval
+        self.swaps = 0
+        self._failed = None  # (directory, version_signature) of the last version that failed to load
+        self._stop = threading.Event()
+        self._thread = None
+
+    def check(self):
+        """Load, warm up and swap in a newer complete version if there is one; True if swapped"""
+        root = self.service.datasets.root
+        current_number = version_number(self.service.datasets.latest_dir_path)
+        latest = latest_version_directory(root)
+        if latest is None:
+            return False
+        if current_number is not None and version_number(latest) <= current_number:
+            return False
+        try:
+            signature = version_signature(latest)
+        except FileNotFoundError:  # removed since the listing
+            return False
+        # A version that failed is retried once its directory or manifest changes
+        if self._failed == (latest, signature):
+            return False
+
+        started = time.perf_counter()
+        try:
+            loader = DatasetLoader(root, version_dir=latest).warm_up()
+            missing = loader.missing_tables()
+            if missing:
+                raise ValueError(f"tables {', '.join(missing)} did not load")
+        except Exception as e:
+            self._failed = (latest, signature)
+            print(f"Error loading datasets from {latest}, keeping the current version: {e}")
+            return False
+
+        self._failed = None
+        self._release(self.service.swap_datasets(loader))
+        self.swaps += 1
+        print(f"Swapped in datasets {loader.version} in {time.perf_counter() - started:.2f}s")
+        return True
+
+    @staticmethod
+    def _release(previous):
+        """Drop the watcher's reference to the old loader and report when it is actually freed"""
+        if previous is None:
+            return
+        weakref.finalize(previous, print, f"Released datasets {previous.version}")
+        del previous
+        # Frames can hold reference cycles; collect them now rather than at the next GC pass
+        gc.collect()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.check()
+            except Exception as e:
+                print(f"Error checking for new datasets: {e}")
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="dataset-watcher", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
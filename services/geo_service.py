@@ -1,6 +1,6 @@
 import json
-from geo_locator.preprocessor import load_and_preprocess
-from geo_locator.locator import find_containing_or_nearest
+from geo_locator.preprocessor import load_boundaries
+from geo_locator.locator import get_locator
 from config.settings import Config
 import pandas as pd
 
@@ -8,45 +8,77 @@ class GeoService:
     def __init__(self, boundaries_file=None):
         self.boundaries_file = boundaries_file or f"{Config.ROOT}/DumplinAI.city_boundaries.csv"
         self.gdf = None
+        self.locator = None
+        self.city_neighbours = {}
         self._load_boundaries()
 
     def _load_boundaries(self):
         """Load city boundaries data once during initialization"""
         try:
-            self.gdf = load_and_preprocess(self.boundaries_file)
+            self.gdf = load_boundaries(self.boundaries_file, Config.BOUNDARY_SNAPSHOT_DIR, Config.BOUNDARY_DISTANCE_MODE)
+            self.locator = get_locator(self.gdf)
+            self.city_neighbours = self._build_city_neighbours(Config.BOUNDARY_NEIGHBOUR_KM)
             print("City boundaries loaded successfully")
         except Exception as e:
             print(f"Error loading city boundaries: {e}")
             self.gdf = None
+            self.locator = None
+            self.city_neighbours = {}
+
+    def _build_city_neighbours(self, within_km):
+        """City name -> names of the boundaries touching or within `within_km` of it, closest first"""
+        indptr, neighbours = self.locator.neighbours(within_km * 1000)
+        names = self.gdf['properties.name'].to_numpy()
+        graph = {}
+        for position, name in enumerate(names):
+            if pd.isna(name):
+                continue
+            linked = graph.setdefault(name, [])
+            for neighbour in names[neighbours[indptr[position]:indptr[position + 1]]]:
+                if not pd.isna(neighbour) and neighbour != name and neighbour not in linked:
+                    linked.append(neighbour)
+        return graph
+
+    def neighbouring_cities(self, city):
+        """Cities whose boundaries neighbour the city's own, or None if the city has no boundary"""
+        return self.city_neighbours.get(city)
 
     def extract_coordinates_from_location(self, place_df):
         """Extract coordinates from location string/object"""
         return place_df['location.coordinates[0]'], place_df['location.coordinates[1]']
 
     def find_cities_in_boundaries(self, places_df):
-        """Find all places within the city boundaries of the target city"""
+        """Map every place to the boundary containing it, or the nearest one.
+
+        Returns a columnar frame with one row per (place, boundary) pair:
+        `place_index` (label in places_df), `boundary_index` (label in the
+        boundaries frame), `properties.name`, `contained` and `distance_to_point`.
+        """
         if self.gdf is None:
             print("City boundaries not loaded, falling back to city name matching")
             return False, places_df
 
         try:
+            place_lon, place_lat = self.extract_coordinates_from_location(places_df)
+            located = self.locator.locate(
+                pd.to_numeric(place_lon, errors='coerce').to_numpy(dtype=float),
+                pd.to_numeric(place_lat, errors='coerce').to_numpy(dtype=float),
+            )
 
-            # Now filter all places that fall within this boundary
-            filtered_places = []
-            for idx, place in places_df.iterrows():
-                place_lon, place_lat = self.extract_coordinates_from_location(place)
-                if place_lon is not None and place_lat is not None:
-                    place_boundary = find_containing_or_nearest(self.gdf, lon=place_lon, lat=place_lat)
-                    if (place_boundary is not None and not place_boundary.empty):
-                        for _, boundary_row in place_boundary.iterrows():
-                                filtered_places.append(boundary_row)
-
-            if filtered_places:
-                return True, pd.DataFrame(filtered_places)
-            else:
+            if located.empty:
                 print("No places found within boundaries, falling back to city name matching")
                 return False, places_df
 
+            boundary_rows = self.gdf.iloc[located['boundary'].to_numpy()]
+            place_boundaries = pd.DataFrame({
+                'place_index': places_df.index[located['point'].to_numpy()],
+                'boundary_index': boundary_rows.index,
+                'properties.name': boundary_rows['properties.name'].to_numpy(),
+                'contained': located['contained'].to_numpy(),
+                'distance_to_point': located['distance_to_point'].to_numpy(),
+            })
+            return True, place_boundaries
+
         except Exception as e:
             print(f"Error in boundary search: {e}, falling back to city name matching")
             return False, places_df
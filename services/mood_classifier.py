@@ -1,16 +1,125 @@
-from transformers import pipeline
+import threading
+from collections import OrderedDict
 from config.settings import Config
+from services.cache import normalize_prompt
 
 class MoodClassifier:
-    def __init__(self):
-        self.classifier = pipeline(Config.CLASSIFIER_TYPE, model=Config.CLASSIFIER_MODEL)
+    def __init__(self, classifier=None, warm_up=None, cache_size=None):
         self.labels = Config.MOOD_LABELS
+        self._classifier = classifier
+        self._ready = threading.Event()
+        self._load_lock = threading.Lock()
+        self._load_error = None
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self.cache_size = Config.MOOD_CACHE_SIZE if cache_size is None else cache_size
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+        if classifier is not None:
+            self._ready.set()
+        elif (Config.CLASSIFIER_WARM_UP if warm_up is None else warm_up) == "background":
+            threading.Thread(target=self._warm_up, name="mood-classifier-warmup", daemon=True).start()
+
+    def _load(self):
+        """Build the configured classifier backend once; safe to call from several threads"""
+        with self._load_lock:
+            if self._classifier is None:
+                try:
+                    from classifiers.backends import make_classifier
+                    self._classifier = make_classifier()
+                except Exception as e:
+                    self._load_error = e
+                    raise
+                finally:
+                    self._ready.set()
+        return self._classifier
+
+    def _warm_up(self):
+        try:
+            self._load()
+        except Exception as e:
+            print(f"Error warming up mood classifier: {e}")
+
+    @property
+    def classifier(self):
+        """The classifier backend, loaded on first use if warm-up has not finished it"""
+        return self._classifier if self._classifier is not None else self._load()
+
+    def is_ready(self):
+        """True once the classifier is loaded and can answer without blocking"""
+        return self._ready.is_set() and self._classifier is not None
+
+    def wait_until_ready(self, timeout=None):
+        """Block until background warm-up finishes; returns readiness"""
+        if not self._ready.is_set() and timeout is None:
+            self._load()
+        self._ready.wait(timeout)
+        if self._load_error is not None:
+            raise RuntimeError(f"Mood classifier failed to load: {self._load_error}")
+        return self.is_ready()
+
+    def _cache_get(self, key):
+        with self._cache_lock:
+            result = self._cache.get(key)
+            if result is None:
+                self.cache_misses += 1
+                return None
+            self._cache.move_to_end(key)
+            self.cache_hits += 1
+            return result
+
+    def _cache_put(self, key, result):
+        if self.cache_size <= 0:
+            return
+        with self._cache_lock:
+            self._cache[key] = result
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def classify_many(self, texts):
+        """Classify several prompts with one batched forward pass.
+
+        Returns a list of (label, {label: score}) tuples in input order.
+        Cached and duplicate prompts are not sent to the model.
+        """
+        keys = [normalize_prompt(text) for text in texts]
+        results = {}
+        pending = {}
+        for key, text in zip(keys, texts):
+            if key in results or key in pending:
+                continue
+            cached = self._cache_get(key)
+            if cached is not None:
+                results[key] = cached
+            else:
+                pending[key] = ' '.join(str(text).split())
+
+        if pending:
+            outputs = self.classifier(list(pending.values()), self.labels)
+            if isinstance(outputs, dict):
+                outputs = [outputs]
+            for key, output in zip(pending, outputs):
+                scores = dict(zip(output['labels'], output['scores']))
+                result = (output['labels'][output['scores'].index(max(output['scores']))], scores)
+                self._cache_put(key, result)
+                results[key] = result
+
+        return [results[key] for key in keys]
+
+    def classify(self, text):
+        """Return the top mood label and all label scores for one prompt"""
+        return self.classify_many([text])[0]
 
     def assign_mood(self,text):
-        result = self.classifier(text, self.labels)
-        return result['labels'][result['scores'].index(max(result['scores']))]
-    
+        return self.classify(text)[0]
+
     def classify_user_mood(self, user_prompt):
         """Classify user mood based on their prompt"""
-        result = self.classifier(user_prompt, self.labels)
-        return result['labels'][result['scores'].index(max(result['scores']))]
+        return self.classify(user_prompt)[0]
+
+    def cache_info(self):
+        with self._cache_lock:
+            return {'hits': self.cache_hits, 'misses': self.cache_misses,
+                    'size': len(self._cache), 'max_size': self.cache_size}
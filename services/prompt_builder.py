@@ -0,0 +1,227 @@
+import math
+import re
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+from config.settings import Config
+
+try:
+    import tiktoken
+except ImportError:  # fall back to a character-based estimate
+    tiktoken = None
+
+
+# Columns each section needs; everything else stays out of the prompt
+PLACE_COLUMNS = ['title', 'categoryName', 'city', 'summarization', 'description']
+# Columns rendered only when the column they stand in for is missing: summarized datasets send
+# the summary, others the description
+FALLBACK_COLUMNS = {'description': 'summarization'}
+CITY_PICKER_COLUMNS = ['city', 'state', 'cuisine_summary']
+POST_COLUMNS = ['username', 'followersCount', 'city', 'url', 'Phase1.transcript.0', 'caption']
+
+# Share of the record budget reserved for places; unused place tokens go to posts
+PLACES_BUDGET_SHARE = 0.6
+
+PROMPT_HEADER = """You are DumplinAI, a helpful and creative assistant that recommends places based on user input.
+Here is the user's current city and state, with its city picker line:
+{city_picker}
+Here is the user's description of what they are looking for: {user_prompt}
+Here are the places that match the user's desired mode, one per line:
+"""
+
+PROMPT_POSTS = """Here are the social media posts from influencers in the area, one per line:
+"""
+
+PROMPT_FOOTER = """
+You can reference social media posts like this: Influencer @username who has @followersCount followers posted @url and says: @Phase1.transcript.0
+
+The user mood detected is: "{user_mode}"
+
+Based on the user's description and the provided places within the city boundaries, recommend a place from the list that best fits the user's needs.
+When suggesting, provide reasons - for example, if the user has traveled, mention they might be tired and suggest accordingly.
+
+Strict instruction: Only use the information provided above, do not use external knowledge.
+"""
+
+_WORD = re.compile(r"[a-z0-9]+")
+
+
+class TokenCounter:
+    """Counts tokens with the model's tiktoken encoding, or estimates ~4 characters per token"""
+
+    def __init__(self, model=Config.OPENAI_MODEL):
+        self.encoding = None
+        if tiktoken is not None:
+            try:
+                self.encoding = tiktoken.encoding_for_model(model)
+            except KeyError:
+                self.encoding = tiktoken.get_encoding("o200k_base")
+
+    def __call__(self, text):
+        if self.encoding is not None:
+            return len(self.encoding.encode(text))
+        return math.ceil(len(text) / 4)
+
+
+def terms(text):
+    return set(_WORD.findall(str(text).lower()))
+
+
+def _missing(value):
+    return value is None or (not isinstance(value, str) and pd.isna(value))
+
+
+def render_record(record, columns, max_field_chars=None):
+    """One compact line per record: `column=value` pairs, missing values skipped.
+
+    A column in FALLBACK_COLUMNS is skipped when the column it stands in for has a value.
+    """
+    max_field_chars = max_field_chars or Config.PROMPT_MAX_FIELD_CHARS
+    fields = []
+    for column in columns:
+        value = record.get(column)
+        if _missing(value):
+            continue
+        if column in FALLBACK_COLUMNS and not _missing(record.get(FALLBACK_COLUMNS[column])):
+            continue
+        if isinstance(value, float) and value.is_integer():
+            value = int(value)
+        text = ' '.join(str(value).split())
+        if len(text) > max_field_chars:
+            text = text[:max_field_chars - 1] + '…'
+        fields.append(f"{column}={text}")
+    return ' | '.join(fields)
+
+
+class PromptBuilder:
+    """Builds the recommendation prompt within a token budget.
+
+    Records are ranked by relevance to the user prompt and added until their
+    section's share of the budget is spent. Rendered lines and their token
+    counts are cached per (dataset version, table, row), so repeat requests
+    against the same version do not re-render or re-tokenize them.
+    """
+
+    def __init__(self, token_budget=None, counter=None, snippet_cache_size=None):
+        self.token_budget = token_budget or Config.PROMPT_TOKEN_BUDGET
+        self.count_tokens = counter or TokenCounter()
+        self.snippet_cache_size = snippet_cache_size or Config.PROMPT_SNIPPET_CACHE_SIZE
+        self._snippets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def evict_version(self, version):
+        """Drop the cached snippets of a dataset version that is no longer served"""
+        with self._lock:
+            for key in [key for key in self._snippets if key[0] == version]:
+                del self._snippets[key]
+
+    def snippets(self, frame, table, columns, version):
+        """(line, tokens) for each row of frame, rendered once per dataset version.
+
+        Rows are identified by their index label, so frames must be slices of
+        the version's tables. Without a version nothing is cached.
+        """
+        if frame is None or frame.empty:
+            return []
+        present = [column for column in columns if column in frame.columns]
+        if version is None:
+            out = [None] * len(frame)
+            missing = list(range(len(frame)))
+        else:
+            out = []
+            missing = []
+            with self._lock:
+                for label in frame.index:
+                    key = (version, table, label)
+                    cached = self._snippets.get(key)
+                    if cached is not None:
+                        self._snippets.move_to_end(key)
+                    else:
+                        missing.append(len(out))
+                    out.append(cached)
+
+        if missing:
+            records = frame.iloc[missing][present].to_dict('records')
+            rendered = {}
+            for position, record in zip(missing, records):
+                line = render_record(record, present)
+                out[position] = (line, self.count_tokens(line) + 1)
+                rendered[(version, table, frame.index[position])] = out[position]
+            if version is None:
+                return out
+            with self._lock:
+                self._snippets.update(rendered)
+                while len(self._snippets) > self.snippet_cache_size:
+                    self._snippets.popitem(last=False)
+        return out
+
+    @staticmethod
+    def relevance(frame, user_prompt, text_columns):
+        """Share of the user's words found in each row's text columns"""
+        prompt_terms = terms(user_prompt)
+        if frame is None or frame.empty or not prompt_terms:
+            return pd.Series(0.0, index=getattr(frame, 'index', None), dtype=float)
+        text = pd.Series('', index=frame.index, dtype=object)
+        for column in text_columns:
+            if column in frame.columns:
+                text = text + ' ' + frame[column].astype(object).fillna('').map(str)
+        return text.map(lambda row_text: len(prompt_terms & terms(row_text)) / len(prompt_terms))
+
+    @staticmethod
+    def _take(snippets, order, budget):
+        lines, used = [], 0
+        for position in order:
+            line, tokens = snippets[position]
+            if used + tokens > budget:
+                continue
+            lines.append(line)
+            used += tokens
+        return lines, used
+
+    def build(self, user_prompt, user_mode, places, city_picker, posts, version=None, place_scores=None):
+        """Return (prompt, report) with as many relevant records as the token budget allows.
+
+        place_scores, when given, overrides the built-in relevance ranking of places.
+        """
+        city_picker_lines = [line for line, _ in self.snippets(city_picker, 'city_picker', CITY_PICKER_COLUMNS, version)]
+        header = PROMPT_HEADER.format(city_picker='\n'.join(city_picker_lines), user_prompt=user_prompt.strip())
+        footer = PROMPT_FOOTER.format(user_mode=user_mode)
+        fixed_tokens = self.count_tokens(header) + self.count_tokens(PROMPT_POSTS) + self.count_tokens(footer)
+        record_budget = max(0, self.token_budget - fixed_tokens)
+
+        place_snippets = self.snippets(places, 'places', PLACE_COLUMNS, version)
+        if place_scores is None:
+            place_scores = self.relevance(places, user_prompt, ['title', 'categoryName', 'summarization', 'description'])
+        elif isinstance(place_scores, pd.Series) and places is not None:
+            place_scores = place_scores.reindex(places.index).fillna(0.0)
+        place_order = _ranked(place_scores, len(place_snippets))
+        place_lines, place_tokens = self._take(place_snippets, place_order, int(record_budget * PLACES_BUDGET_SHARE))
+
+        post_snippets = self.snippets(posts, 'posts', POST_COLUMNS, version)
+        post_scores = self.relevance(posts, user_prompt, ['Phase1.transcript.0', 'caption'])
+        if posts is not None and not posts.empty and 'followersCount' in posts.columns:
+            # Break ties towards better known creators
+            followers = pd.to_numeric(posts['followersCount'], errors='coerce').fillna(0)
+            post_scores = post_scores + 1e-3 * (followers.rank(pct=True))
+        post_order = _ranked(post_scores, len(post_snippets))
+        post_lines, post_tokens = self._take(post_snippets, post_order, record_budget - place_tokens)
+
+        prompt = header + '\n'.join(place_lines) + '\n' + PROMPT_POSTS + '\n'.join(post_lines) + '\n' + footer
+        report = {
+            'tokens': self.count_tokens(prompt),
+            'budget': self.token_budget,
+            'places_included': len(place_lines),
+            'places_total': len(place_snippets),
+            'posts_included': len(post_lines),
+            'posts_total': len(post_snippets),
+        }
+        return prompt, report
+
+
+def _ranked(scores, size):
+    """Row positions ordered by descending score, stable for ties"""
+    if size == 0:
+        return []
+    values = pd.Series(scores).to_numpy(dtype=float)
+    return np.argsort(-values, kind='stable').tolist()
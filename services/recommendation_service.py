@@ -1,129 +1,425 @@
-import openai
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
 from services.mood_classifier import MoodClassifier
 from services.geo_service import GeoService
+from services.prompt_builder import CITY_PICKER_COLUMNS, PLACE_COLUMNS, POST_COLUMNS, PromptBuilder
+from services.request_context import RequestContext
+from services.cache import RecommendationCache
+from tracing.tracer import get_tracer
 from data.loader import DatasetLoader
 from config.settings import Config
 import pandas as pd
 
+SYSTEM_MESSAGE = "You are DumplinAI, a helpful restaurant and place recommendation assistant."
+
 class RecommendationService:
-    def __init__(self, datasets=None):
+    """Recommendation pipeline over shared datasets, classifier and geo index.
+
+    The service holds no per-request state: every stage takes and returns a
+    RequestContext, so one instance can be shared across threads.
+    """
+
+    # Stages that turn a request into a compiled prompt, in order
+    STAGES = ('set_user_mood', 'get_places_in_boundaries', 'retrieve_candidates',
+              'get_posts_for_user_city_and_boundaries', 'compile_prompt')
+
+    def __init__(self, datasets=None, client=None, async_client=None, mood_classifier=None, geo_service=None,
+                 cache=None, cache_enabled=None, tracer=None):
         self.datasets = datasets or DatasetLoader()
-        self.mood_classifier = MoodClassifier()
-        self.geo_service = GeoService()
-        self.user_prompt = None
-        self.user_city = None
-        self.user_mode = None
-        self.places_dictionary = None
-        self.city_picker_dictionary = None
-        self.posts_dictionary = None
-        self.compiled_prompt = None
-        self.filtered_places = None
-        self.filtered_posts = None
-        
-        # OpenAI client
-        openai.api_key = Config.OPENAI_API_KEY
-        self.client = openai.OpenAI(api_key=Config.OPENAI_API_KEY)
-
-    def set_user_city(self, user_city):
-        """Set the user's city"""
-        self.user_city = user_city
-        return self
-
-    def set_user_prompt(self, user_prompt):
-        """Set the user's request prompt"""
-        self.user_prompt = user_prompt
-        return self
-
-    def set_user_mood(self):
-        """Classify and set user mood based on their prompt"""
-        self.user_mode = self.mood_classifier.classify_user_mood(self.user_prompt)
-        return self
-
-    def get_places_in_boundaries(self):
-        """Get places within city boundaries and matching user mood"""
-        all_places = self.datasets.get_places()
-        places_by_user_city = all_places[all_places['city'] == self.user_city]
+        self.mood_classifier = mood_classifier or MoodClassifier()
+        self.geo_service = geo_service or GeoService()
+        self.prompt_builder = PromptBuilder()
+        cache_enabled = Config.RESULT_CACHE_ENABLED if cache_enabled is None else cache_enabled
+        self.cache = None
+        if cache_enabled:
+            self.cache = cache if cache is not None else RecommendationCache()
+        self.tracer = tracer or get_tracer()
         
-        # Get places within city boundaries using geo service
+        # OpenAI clients; the async one is only created when first needed.
+        # openai is imported only then, so injected clients work without it
+        if client is None:
+            import openai
+            openai.api_key = Config.OPENAI_API_KEY
+            client = openai.OpenAI(api_key=Config.OPENAI_API_KEY, base_url=Config.OPENAI_BASE_URL)
+        self.client = client
+        self._async_client = async_client
+
+    @property
+    def async_client(self):
+        if self._async_client is None:
+            import openai
+            self._async_client = openai.AsyncOpenAI(api_key=Config.OPENAI_API_KEY, base_url=Config.OPENAI_BASE_URL)
+        return self._async_client
+
+    def pin_datasets(self, ctx):
+        """The dataset snapshot the request runs against, pinned on first use"""
+        if ctx.datasets is None:
+            ctx.datasets = self.datasets
+            ctx.version = ctx.datasets.version
+        return ctx.datasets
+
+    def swap_datasets(self, datasets):
+        """Serve new requests from `datasets` and return the previous loader.
+
+        Requests already past pin_datasets keep the snapshot they pinned.
+        """
+        previous, self.datasets = self.datasets, datasets
+        if previous is not None:
+            self.prompt_builder.evict_version(previous.version)
+        return previous
+
+    def set_user_mood(self, ctx):
+        """Classify and set user mood based on their prompt, unless already classified"""
+        if ctx.user_mode is None:
+            ctx.user_mode = self.mood_classifier.classify_user_mood(ctx.user_prompt)
+        ctx.metrics['set_user_mood'] = {'mood': ctx.user_mode}
+        return ctx
+
+    @staticmethod
+    def _nearby_key(ctx):
+        """Cache key part for location-based requests, None for city-wide ones"""
+        if ctx.user_location is None:
+            return None
+        lon, lat = ctx.user_location
+        return [round(lon, 4), round(lat, 4), bool(ctx.order_by_distance),
+                Config.NEARBY_RADIUS_KM, Config.NEARBY_MIN_PLACES]
+
+    def _cities_around(self, ctx, datasets):
+        """The user's city and the cities whose boundaries neighbour it, with stage metrics"""
+        neighbours = self.geo_service.neighbouring_cities(ctx.user_city)
+        if neighbours is not None:
+            cities = [ctx.user_city] + [city for city in neighbours if city != ctx.user_city]
+            return cities, {'boundary_match': True, 'neighbour_graph': True, 'cities': len(cities)}
+
+        # No boundary named after the city: locate its places among the boundaries instead
+        places_by_user_city = datasets.get_places_for_cities([ctx.user_city])
         is_boundaries_found, places_found_based_on_boundaries = self.geo_service.find_cities_in_boundaries(places_by_user_city)
-        places_found_based_on_boundaries = places_found_based_on_boundaries.drop_duplicates()
+        cities = [ctx.user_city]
         if is_boundaries_found:
-            bplaces =[]
-            for _, bplace in places_found_based_on_boundaries.iterrows():
-                p = all_places[all_places['city'] == bplace['properties.name']].to_dict()
-                bplaces.append(p)
-            bplacesDF = pd.DataFrame(bplaces)
-            places_by_user_city = pd.concat([places_by_user_city,bplacesDF])
-            
-
-        # Filter by user mood
-        mood_filtered_places = places_by_user_city[places_by_user_city['label'] == self.user_mode]
-        self.filtered_places = mood_filtered_places
-        self.places_dictionary = mood_filtered_places.to_dict()
-        
+            for boundary_name in places_found_based_on_boundaries['properties.name'].dropna().unique():
+                if boundary_name not in cities:
+                    cities.append(boundary_name)
+        return cities, {'boundary_match': is_boundaries_found, 'neighbour_graph': False,
+                        'cities': len(cities), 'rows_in': len(places_by_user_city)}
+
+    def get_places_in_boundaries(self, ctx):
+        """Get places matching the user mood near the user's location, or in their city and neighbouring cities.
+
+        Candidate rows are cached per dataset version, city, mood and location.
+        """
+        datasets = self.pin_datasets(ctx)
+        key = None
+        if self.cache is not None:
+            key = self.cache.candidates_key(datasets.version, ctx.user_city, ctx.user_mode, self._nearby_key(ctx))
+            cached = self.cache.candidates.get(key)
+            if cached is not None:
+                ctx.filtered_places = datasets.get_rows('places', cached['places'])
+                ctx.city_picker = datasets.get_rows('city_picker', cached['city_picker'])
+                if cached.get('distances') is not None:
+                    ctx.place_distances = pd.Series(cached['distances'], index=ctx.filtered_places.index)
+                ctx.cache_hits.append('candidates')
+                ctx.metrics['get_places_in_boundaries'] = {'cache_hit': True, 'rows_out': len(ctx.filtered_places)}
+                return ctx
+
+        if ctx.user_location is not None:
+            lon, lat = ctx.user_location
+            ctx.filtered_places, ctx.place_distances = datasets.get_places_near(lon, lat, label=ctx.user_mode)
+        if ctx.filtered_places is not None:
+            metrics = {'nearby': True, 'max_distance_km': float(ctx.place_distances.max()) if len(ctx.place_distances) else None}
+        else:
+            # City-wide request, or a dataset without place coordinates to search around the location
+            cities, metrics = self._cities_around(ctx, datasets)
+            ctx.filtered_places = datasets.get_places_for_cities(cities, label=ctx.user_mode)
+
         # Get city picker info
-        city_picker_data = self.datasets.get_city_picker()
-        city_pickers = []
-        for _, row in mood_filtered_places.iterrows():
-            city_pickers.append(city_picker_data[city_picker_data['city'] == row['city']].to_dict())
-        city_info = pd.DataFrame(city_pickers)
-        self.city_picker_dictionary = city_info.to_dict() if not city_info.empty else {}
-        
-        return self
-
-    def get_posts_for_user_city_and_boundaries(self):
-        # Get posts for all these cities
-        all_posts = self.datasets.get_posts()
-        filtered_posts = []
-        for _, row in self.filtered_places.iterrows():
-            city_posts = all_posts[all_posts['city'] == row['city']]
-            filtered_posts.append(city_posts.to_dict())
-        self.filtered_posts = pd.DataFrame(filtered_posts)
-        
-        self.posts_dictionary = self.filtered_posts.to_dict()
-        return self
-
-    def compile_prompt(self):
-        """Compile the prompt for OpenAI API"""
-        self.compiled_prompt = f"""
-        You are DumplinAI, a helpful and creative assistant that recommends places based on user input.
-        Here is the user's current city and state: {self.city_picker_dictionary}
-        Here is the user's city picker line: {self.city_picker_dictionary}
-        Here is the user's description of what they are looking for: {self.user_prompt}
-        Here are the places that match the user's desired mode: {self.places_dictionary}
-        Here are the social media posts from influencers in the area: {self.posts_dictionary}
-        
-        You can reference social media posts like this: Influencer @username who has @followersCount followers posted @url and says: @Phase1.transcript.0
-        
-        The user mood detected is: "{self.user_mode}"
-        
-        Based on the user's description and the provided places within the city boundaries, recommend a place from the list that best fits the user's needs.
-        When suggesting, provide reasons - for example, if the user has traveled, mention they might be tired and suggest accordingly.
-        
-        Strict instruction: Only use the information provided above, do not use external knowledge.
+        ctx.city_picker = datasets.get_city_picker_for_cities(ctx.filtered_places['city'].unique())
+        ctx.metrics['get_places_in_boundaries'] = {
+            'cache_hit': False if key is not None else None,
+            **metrics,
+            'rows_out': len(ctx.filtered_places),
+        }
+
+        if key is not None:
+            self.cache.candidates.set(key, {
+                'places': ctx.filtered_places.index.tolist(),
+                'city_picker': ctx.city_picker.index.tolist(),
+                'distances': ctx.place_distances.tolist() if ctx.place_distances is not None else None,
+            })
+        return ctx
+
+    def retrieve_candidates(self, ctx, top_k=None):
+        """Keep the top-k mood-matching places by BM25 relevance to the user prompt.
+
+        With ctx.order_by_distance, the kept places are ranked closest first instead.
         """
-        return self
+        top_k = top_k or Config.RETRIEVAL_TOP_K
+        index = self.pin_datasets(ctx).get_place_index()
+        if index is None or ctx.filtered_places.empty:
+            ctx.place_scores = None
+            return ctx
 
-    def get_response(self):
-        """Get recommendation response from OpenAI"""
+        # Frames from the loader keep their row positions as index labels
+        positions, scores = index.top_k(ctx.user_prompt, ctx.filtered_places.index.to_numpy(), top_k)
+        ctx.metrics['retrieve_candidates'] = {'rows_in': len(ctx.filtered_places), 'rows_out': len(positions)}
+        ctx.filtered_places = ctx.filtered_places.loc[positions]
+        ctx.place_scores = pd.Series(scores, index=positions)
+        if ctx.place_distances is not None:
+            ctx.place_distances = ctx.place_distances.loc[positions]
+            if ctx.order_by_distance:
+                ctx.place_scores = -ctx.place_distances
+        return ctx
+
+    def get_posts_for_user_city_and_boundaries(self, ctx):
+        # Get posts for all these cities, once per city
+        cities = ctx.filtered_places['city'].unique()
+        ctx.filtered_posts = self.pin_datasets(ctx).get_posts_for_cities(cities)
+        ctx.metrics['get_posts_for_user_city_and_boundaries'] = {'cities': len(cities), 'rows_out': len(ctx.filtered_posts)}
+        return ctx
+
+    def compile_prompt(self, ctx):
+        """Compile the prompt for OpenAI API within the configured token budget"""
+        datasets = self.pin_datasets(ctx)
+        # Text columns a compact load profile left on disk, read for these rows only
+        places = datasets.with_columns(ctx.filtered_places, 'places', PLACE_COLUMNS)
+        city_picker = datasets.with_columns(ctx.city_picker, 'city_picker', CITY_PICKER_COLUMNS)
+        posts = datasets.with_columns(ctx.filtered_posts, 'posts', POST_COLUMNS)
+        ctx.compiled_prompt, ctx.prompt_report = self.prompt_builder.build(
+            ctx.user_prompt, ctx.user_mode, places, city_picker, posts,
+            version=ctx.version, place_scores=ctx.place_scores
+        )
+        ctx.metrics['compile_prompt'] = {
+            'prompt_tokens': ctx.prompt_report['tokens'],
+            'rows_in': ctx.prompt_report['places_total'],
+            'rows_out': ctx.prompt_report['places_included'],
+        }
+        return ctx
+
+    @staticmethod
+    def _messages(ctx):
+        return [
+            {"role": "system", "content": SYSTEM_MESSAGE},
+            {"role": "user", "content": ctx.compiled_prompt}
+        ]
+
+    @staticmethod
+    def _chunk_text(chunk):
+        """Text delta of a streamed completion chunk, if any"""
+        if not chunk.choices:
+            return None
+        return chunk.choices[0].delta.content
+
+    def _record_timing(self, ctx, started, first_token_at):
+        finished = time.perf_counter()
+        ctx.response_timings = {
+            'time_to_first_token': (first_token_at - started) if first_token_at is not None else None,
+            'total': finished - started,
+        }
+        ctx.timings['get_response'] = finished - started
+        ctx.metrics['get_response'] = {
+            'first_token_seconds': ctx.response_timings['time_to_first_token'],
+            'prompt_tokens': ctx.prompt_report['tokens'] if ctx.prompt_report else None,
+        }
+        self.tracer.record('get_response', 'recommendation', finished - started,
+                           error='LLMError' if ctx.error is not None else None, **ctx.metrics['get_response'])
+
+    def stream_response(self, ctx):
+        """Yield the OpenAI response text as chunks arrive, recording time to first token"""
+        started = time.perf_counter()
+        first_token_at = None
         try:
-            response = self.client.chat.completions.create(
+            stream = self.client.chat.completions.create(
                 model=Config.OPENAI_MODEL,
-                messages=[
-                    {"role": "system", "content": "You are DumplinAI, a helpful restaurant and place recommendation assistant."},
-                    {"role": "user", "content": self.compiled_prompt}
-                ]
+                messages=self._messages(ctx),
+                stream=True
             )
-            return response.choices[0].message.content
+            for chunk in stream:
+                text = self._chunk_text(chunk)
+                if text:
+                    if first_token_at is None:
+                        first_token_at = time.perf_counter()
+                    yield text
         except Exception as e:
-            return f"Error generating response: {e}"
+            ctx.error = str(e)
+            yield f"Error generating response: {e}"
+        finally:
+            self._record_timing(ctx, started, first_token_at)
+
+    async def astream_response(self, ctx):
+        """Async counterpart of stream_response"""
+        started = time.perf_counter()
+        first_token_at = None
+        try:
+            stream = await self.async_client.chat.completions.create(
+                model=Config.OPENAI_MODEL,
+                messages=self._messages(ctx),
+                stream=True
+            )
+            async for chunk in stream:
+                text = self._chunk_text(chunk)
+                if text:
+                    if first_token_at is None:
+                        first_token_at = time.perf_counter()
+                    yield text
+        except Exception as e:
+            ctx.error = str(e)
+            yield f"Error generating response: {e}"
+        finally:
+            self._record_timing(ctx, started, first_token_at)
+
+    def get_response(self, ctx):
+        """Get recommendation response from OpenAI"""
+        ctx.response = "".join(self.stream_response(ctx))
+        return ctx.response
+
+    def run_stage(self, name, ctx):
+        """Run one pipeline stage on the context, recording its wall time and tracing it"""
+        started = time.perf_counter()
+        with self.tracer.span(name, 'recommendation') as span:
+            getattr(self, name)(ctx)
+            span.set(**ctx.metrics.get(name, {}))
+        ctx.timings[name] = time.perf_counter() - started
+        return ctx
+
+    def _lookup_response(self, ctx):
+        """Fill ctx.response from the final tier; True on a hit"""
+        if self.cache is None:
+            return False
+        with self.tracer.span('response_cache', 'recommendation') as span:
+            key = self.cache.response_key(ctx.user_prompt, ctx.user_city, ctx.user_mode, self.pin_datasets(ctx).version,
+                                          self._nearby_key(ctx))
+            ctx.response = self.cache.responses.get(key)
+            span.set(cache_hit=ctx.response is not None)
+        if ctx.response is not None:
+            ctx.cache_hits.append('responses')
+        return ctx.response is not None
+
+    def _lookup_prompt_response(self, ctx):
+        """Fill ctx.response from responses to an identical compiled prompt; True on a hit"""
+        if self.cache is None:
+            return False
+        with self.tracer.span('prompt_cache', 'recommendation') as span:
+            ctx.response = self.cache.prompts.get(self.cache.prompt_key(ctx.compiled_prompt))
+            span.set(cache_hit=ctx.response is not None)
+        if ctx.response is not None:
+            ctx.cache_hits.append('prompts')
+            self._store_response(ctx)
+        return ctx.response is not None
+
+    def _store_response(self, ctx):
+        """Cache a successful response under its compiled prompt and its request key"""
+        if self.cache is None or ctx.error is not None or not ctx.response:
+            return
+        if ctx.compiled_prompt is not None:
+            self.cache.prompts.set(self.cache.prompt_key(ctx.compiled_prompt), ctx.response)
+        self.cache.responses.set(
+            self.cache.response_key(ctx.user_prompt, ctx.user_city, ctx.user_mode, ctx.version, self._nearby_key(ctx)),
+            ctx.response
+        )
+
+    def prepare(self, user_city, user_prompt, user_mode=None, ctx=None):
+        """Run every stage up to and including prompt compilation; returns the request context.
+
+        Stops early with ctx.response set when a cached response answers the request.
+        Stages already recorded in ctx.timings are skipped. All stages read the
+        dataset snapshot pinned at the start, even if a newer one is swapped in.
+        """
+        ctx = ctx or RequestContext(user_city, user_prompt, user_mode)
+        self.pin_datasets(ctx)
+        try:
+            for name in self.STAGES:
+                if name not in ctx.timings:
+                    self.run_stage(name, ctx)
+                if name == 'set_user_mood' and self._lookup_response(ctx):
+                    return ctx
+            self._lookup_prompt_response(ctx)
+        finally:
+            # Only these stages read the datasets; unpin so a swapped-out
+            # version can be freed while the LLM call is still running
+            ctx.datasets = None
+        return ctx
 
-    def get_recommendation(self, user_city, user_prompt):
+    def _stream_prepared(self, ctx):
+        if ctx.response is not None:
+            yield ctx.response
+            return
+        chunks = []
+        for text in self.stream_response(ctx):
+            chunks.append(text)
+            yield text
+        ctx.response = "".join(chunks)
+        self._store_response(ctx)
+
+    def stream_recommendation(self, user_city, user_prompt, user_location=None, order_by_distance=False):
+        """Recommendation pipeline that yields the response in chunks as they are generated.
+
+        With user_location (lon, lat), places are searched around it; order_by_distance
+        then ranks them closest first.
+        """
+        ctx = self.prepare(user_city, user_prompt, ctx=RequestContext(
+            user_city, user_prompt, user_location=user_location, order_by_distance=order_by_distance))
+        yield from self._stream_prepared(ctx)
+
+    async def astream_recommendation(self, user_city, user_prompt, user_location=None, order_by_distance=False,
+                                     executor=None, ctx=None):
+        """Async stream_recommendation; the CPU-bound stages run in `executor` (default executor if None).
+
+        A caller that wants the request context afterwards passes its own ctx,
+        which then carries the location options.
+        """
+        ctx = ctx or RequestContext(user_city, user_prompt, user_location=user_location,
+                                    order_by_distance=order_by_distance)
+        ctx = await asyncio.get_running_loop().run_in_executor(
+            executor, lambda: self.prepare(user_city, user_prompt, ctx=ctx))
+        if ctx.response is not None:
+            yield ctx.response
+            return
+        chunks = []
+        async for text in self.astream_response(ctx):
+            chunks.append(text)
+            yield text
+        ctx.response = "".join(chunks)
+        self._store_response(ctx)
+
+    async def aget_recommendation(self, user_city, user_prompt, user_location=None, order_by_distance=False):
+        """Async complete recommendation pipeline"""
+        chunks = self.astream_recommendation(user_city, user_prompt, user_location, order_by_distance)
+        return "".join([text async for text in chunks])
+
+    def get_recommendation(self, user_city, user_prompt, user_location=None, order_by_distance=False):
         """Complete recommendation pipeline"""
-        return (self.set_user_city(user_city)
-                   .set_user_prompt(user_prompt)
-                   .set_user_mood()
-                   .get_places_in_boundaries()
-                   .get_posts_for_user_city_and_boundaries()
-                   .compile_prompt()
-                   .get_response())
+        return "".join(self.stream_recommendation(user_city, user_prompt, user_location, order_by_distance))
+
+    def _complete(self, ctx):
+        """Run the remaining stages and the LLM call for a pre-classified context"""
+        try:
+            self.prepare(ctx.user_city, ctx.user_prompt, ctx=ctx)
+            if ctx.response is None:
+                self.get_response(ctx)
+                self._store_response(ctx)
+        except Exception as e:
+            ctx.error = str(e)
+            ctx.response = f"Error generating response: {e}"
+        return ctx
+
+    def get_recommendations(self, batch, max_workers=None):
+        """Answer many (user_city, user_prompt) requests concurrently.
+
+        All prompts are mood-classified in one batched call first; the other
+        stages and the LLM calls then run on a thread pool. Returns one
+        RequestContext per request, in order, with `response` and per-stage
+        `timings` filled in.
+        """
+        contexts = [RequestContext(user_city, user_prompt) for user_city, user_prompt in batch]
+        if not contexts:
+            return []
+
+        started = time.perf_counter()
+        moods = self.mood_classifier.classify_many([ctx.user_prompt for ctx in contexts])
+        elapsed = time.perf_counter() - started
+        for ctx, (label, _) in zip(contexts, moods):
+            ctx.user_mode = label
+            ctx.timings['set_user_mood'] = elapsed
+
+        with ThreadPoolExecutor(max_workers=max_workers or Config.RECOMMENDATION_WORKERS) as pool:
+            return list(pool.map(self._complete, contexts))
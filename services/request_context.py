@@ -0,0 +1,54 @@
+class RequestContext:
+    """Everything one recommendation request produces along the pipeline.
+
+    RecommendationService keeps only shared, read-mostly resources; each
+    request carries its own state here, so one service instance can serve
+    many threads at once.
+    """
+
+    def __init__(self, user_city, user_prompt, user_mode=None, user_location=None, order_by_distance=False):
+        self.user_city = user_city
+        self.user_prompt = user_prompt
+        self.user_mode = user_mode
+        # Optional (lon, lat) of the user; places are then searched around it
+        # instead of across the city, and can be ranked closest first
+        self.user_location = tuple(float(value) for value in user_location) if user_location is not None else None
+        self.order_by_distance = order_by_distance
+        # Dataset snapshot (DatasetLoader) the stages read, pinned for the whole
+        # request so a hot reload cannot switch versions half way through
+        self.datasets = None
+        self.version = None
+        self.filtered_places = None
+        self.place_scores = None
+        # Distance in km of each filtered place from user_location
+        self.place_distances = None
+        self.city_picker = None
+        self.filtered_posts = None
+        self.compiled_prompt = None
+        self.prompt_report = None
+        self.response = None
+        self.response_timings = None
+        self.error = None
+        # Cache tiers that answered part of this request
+        self.cache_hits = []
+        # Stage name -> wall time in seconds
+        self.timings = {}
+        # Stage name -> counters the stage recorded (rows in/out, prompt tokens, cache hits)
+        self.metrics = {}
+
+    def as_dict(self):
+        """Request outcome without the intermediate frames"""
+        return {
+            'user_city': self.user_city,
+            'user_prompt': self.user_prompt,
+            'user_mode': self.user_mode,
+            'user_location': list(self.user_location) if self.user_location is not None else None,
+            'version': self.version,
+            'response': self.response,
+            'error': self.error,
+            'timings': dict(self.timings),
+            'metrics': {stage: dict(values) for stage, values in self.metrics.items()},
+            'response_timings': self.response_timings,
+            'prompt_report': self.prompt_report,
+            'cache_hits': list(self.cache_hits),
+        }
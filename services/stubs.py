@@ -0,0 +1,115 @@
+"""
+Offline stand-ins for the OpenAI client and the zero-shot pipeline.
+
+They mirror the small surface the services use (`chat.completions.create`,
+with and without `stream=True`, and `classifier(texts, labels)`), so the
+server and benchmarks can run without network access or model downloads.
+"""
+
+import asyncio
+import hashlib
+import time
+from types import SimpleNamespace
+
+
+def _stable_hash(text):
+    return int.from_bytes(hashlib.blake2b(str(text).encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+def _completion(text):
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=text), finish_reason='stop')])
+
+
+def _chunk(text):
+    return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=text), finish_reason=None)])
+
+
+def stub_reply(messages):
+    """Deterministic reply derived from the last message"""
+    prompt = messages[-1]['content']
+    return (f"[stub] Recommendation for a {len(prompt)}-character prompt "
+            f"(#{_stable_hash(prompt) % 10000:04d}). Try the first place listed; it fits the mood.")
+
+
+class _StubCompletions:
+    def __init__(self, first_token_latency, chunk_latency, chunk_chars):
+        self.first_token_latency = first_token_latency
+        self.chunk_latency = chunk_latency
+        self.chunk_chars = chunk_chars
+        self.calls = 0
+
+    def _pieces(self, text):
+        return [text[i:i + self.chunk_chars] for i in range(0, len(text), self.chunk_chars)]
+
+    def create(self, model=None, messages=None, stream=False, **kwargs):
+        self.calls += 1
+        text = stub_reply(messages)
+        if not stream:
+            time.sleep(self.first_token_latency + self.chunk_latency * len(self._pieces(text)))
+            return _completion(text)
+
+        def chunks():
+            time.sleep(self.first_token_latency)
+            for piece in self._pieces(text):
+                yield _chunk(piece)
+                time.sleep(self.chunk_latency)
+        return chunks()
+
+
+class _AsyncStubCompletions(_StubCompletions):
+    async def create(self, model=None, messages=None, stream=False, **kwargs):
+        self.calls += 1
+        text = stub_reply(messages)
+        if not stream:
+            await asyncio.sleep(self.first_token_latency + self.chunk_latency * len(self._pieces(text)))
+            return _completion(text)
+
+        async def chunks():
+            await asyncio.sleep(self.first_token_latency)
+            for piece in self._pieces(text):
+                yield _chunk(piece)
+                await asyncio.sleep(self.chunk_latency)
+        return chunks()
+
+
+class StubOpenAI:
+    """Drop-in for openai.OpenAI with configurable latency"""
+
+    def __init__(self, first_token_latency=0.0, chunk_latency=0.0, chunk_chars=16):
+        self.chat = SimpleNamespace(completions=_StubCompletions(first_token_latency, chunk_latency, chunk_chars))
+
+
+class AsyncStubOpenAI:
+    """Drop-in for openai.AsyncOpenAI with configurable latency"""
+
+    def __init__(self, first_token_latency=0.0, chunk_latency=0.0, chunk_chars=16):
+        self.chat = SimpleNamespace(completions=_AsyncStubCompletions(first_token_latency, chunk_latency, chunk_chars))
+
+
+class StubZeroShotClassifier:
+    """Drop-in for a transformers zero-shot pipeline.
+
+    Scores are a deterministic function of the text, biased towards labels
+    named in it, with an optional fixed cost per sequence.
+    """
+
+    def __init__(self, latency_per_text=0.0):
+        self.latency_per_text = latency_per_text
+        self.calls = 0
+
+    def _classify(self, text, labels):
+        lowered = str(text).lower()
+        seed = _stable_hash(text)
+        raw = [((seed >> (8 * i)) & 0xFF) + (200 if label in lowered else 0) + 1 for i, label in enumerate(labels)]
+        total = float(sum(raw))
+        ranked = sorted(zip(labels, [value / total for value in raw]), key=lambda pair: -pair[1])
+        return {'sequence': text, 'labels': [label for label, _ in ranked], 'scores': [score for _, score in ranked]}
+
+    def __call__(self, sequences, candidate_labels, **kwargs):
+        self.calls += 1
+        single = isinstance(sequences, str)
+        texts = [sequences] if single else list(sequences)
+        if self.latency_per_text:
+            time.sleep(self.latency_per_text * len(texts))
+        results = [self._classify(text, candidate_labels) for text in texts]
+        return results[0] if single else results
@@ -0,0 +1,177 @@
+"""
+The compact load profile must not change what the recommendation service sends or returns.
+
+Datasets are built around the city boundaries shipped in the repo, with the
+cases the compact profile has to get right: integer columns with gaps and
+values beyond float32 precision, high-cardinality strings, missing
+categories, summaries, and a posts table partitioned by city whose parts
+were written with different column types.
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from config.settings import Config
+from data.columnar import partition_key, save_partition, save_table, write_manifest
+from data.loader import DatasetLoader
+from data.retrieval import INDEX_FILE, PlaceIndex
+from geo_locator.preprocessor import load_and_preprocess
+from services.geo_service import GeoService
+from services.mood_classifier import MoodClassifier
+from services.recommendation_service import RecommendationService
+from services.request_context import RequestContext
+from services.stubs import StubOpenAI, StubZeroShotClassifier
+
+BOUNDARIES_CSV = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                              'DumplinAI.city_boundaries.csv')
+QUERIES = ["quiet natural wine bar for a date", "late night spicy ramen", "cheap tacos and cocktails"]
+CATEGORIES = ['Restaurant', 'Bar', 'Cafe', 'Bakery', None]
+
+
+def sample_tables(seed=0):
+    rng = np.random.default_rng(seed)
+    boundaries = load_and_preprocess(BOUNDARIES_CSV)
+    boundaries = boundaries[boundaries['properties.name'].notna()]
+    names = boundaries['properties.name'].tolist()
+    anchors = boundaries.geometry.representative_point()
+
+    places = []
+    for i in range(600):
+        boundary = i % len(names)
+        # A few places belong to a city without a boundary of its own
+        city = 'Nowhere Springs' if i % 50 == 0 else names[boundary]
+        lon = anchors.iloc[boundary].x + rng.normal(0, 0.002)
+        lat = anchors.iloc[boundary].y + rng.normal(0, 0.002)
+        places.append({
+            'title': f"Place {i}",
+            'description': f"{rng.choice(['quiet', 'lively', 'spicy', 'cozy'])} spot number {i} with wine and tacos",
+            'categoryName': CATEGORIES[i % len(CATEGORIES)] if i % 7 else f"Unique category {i}",
+            'city': city,
+            'location.coordinates[0]': lon,
+            'location.coordinates[1]': lat,
+            'summarization': None if i % 3 == 0 else f"Summary {i}: good for a {rng.choice(['date', 'night out'])}",
+            'label': Config.MOOD_LABELS[i % len(Config.MOOD_LABELS)],
+        })
+    places = pd.DataFrame(places)
+
+    cities = sorted(set(places['city']))
+    city_picker = pd.DataFrame({'city': cities, 'state': ['FL'] * len(cities),
+                                'cuisine_summary': [f"{city} loves seafood" for city in cities]})
+
+    creators = pd.DataFrame({
+        '_id': [f"c{i}" for i in range(200)],
+        'username': [f"creator_{i}" for i in range(200)],
+        # Beyond float32 and int32 precision
+        'followersCount': [3_000_000_000 + i if i % 10 == 0 else 16_777_217 + i for i in range(200)],
+        'profilePicUrl': [f"https://example.com/{i}.jpg" for i in range(200)],
+    })
+    posts = pd.DataFrame({
+        'city': rng.choice(cities, 1500),
+        'platform': rng.choice(['tiktok', 'instagram'], 1500),
+        # Some creators are unknown, so the join leaves gaps in followersCount
+        'creator_id': [f"c{i}" for i in rng.integers(0, 260, 1500)],
+        'url': [f"https://example.com/posts/{i}" for i in range(1500)],
+        'Phase1.transcript.0': [f"transcript {i} about wine and ramen" for i in range(1500)],
+        'caption': [None if i % 11 == 0 else f"caption {i} tacos" for i in range(1500)],
+    })
+    posts = pd.merge(posts, creators, how='left', left_on='creator_id', right_on='_id')
+    return places, city_picker, posts, creators
+
+
+def write_version(root, tables, partition_posts=False):
+    places, city_picker, posts, creators = tables
+    dir_path = os.path.join(root, 'datasets_v1')
+    os.makedirs(dir_path)
+    save_table(places, dir_path, 'places')
+    save_table(city_picker, dir_path, 'city_picker')
+    save_table(creators, dir_path, 'creators')
+    if partition_posts:
+        # As if written by different runs: the first city's part has a dictionary-encoded url
+        # and nullable integer followers, the others plain strings and double
+        for part, (city, group) in enumerate(posts.groupby('city', sort=True)):
+            if part == 0:
+                group = group.astype({'url': 'category', 'followersCount': 'Int64'})
+            save_partition(group, dir_path, 'posts', partition_key(city), 0)
+    else:
+        save_table(posts, dir_path, 'posts')
+    PlaceIndex.build(places).save(os.path.join(dir_path, INDEX_FILE))
+    write_manifest(dir_path, {'places': places, 'city_picker': city_picker, 'posts': len(posts), 'creators': creators})
+    return dir_path
+
+
+def make_service(root, profile):
+    return RecommendationService(
+        datasets=DatasetLoader(root, profile=profile).warm_up(),
+        client=StubOpenAI(),
+        mood_classifier=MoodClassifier(classifier=StubZeroShotClassifier(), cache_size=0),
+        geo_service=GeoService(BOUNDARIES_CSV),
+        cache_enabled=False,
+    )
+
+
+def run_request(service, user_city, user_prompt, location=None):
+    ctx = RequestContext(user_city, user_prompt, user_location=location, order_by_distance=location is not None)
+    for name in service.STAGES + ('get_response',):
+        service.run_stage(name, ctx)
+    assert ctx.error is None
+    return ctx
+
+
+@pytest.fixture(autouse=True)
+def snapshot_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, 'BOUNDARY_SNAPSHOT_DIR', str(tmp_path / 'snapshots'))
+
+
+@pytest.mark.parametrize('partition_posts', [False, True], ids=['whole', 'partitioned'])
+@pytest.mark.parametrize('arrow', [True, False], ids=['arrow', 'csv'])
+def test_compact_profile_keeps_recommendations(tmp_path, partition_posts, arrow):
+    tables = sample_tables()
+    dir_path = write_version(str(tmp_path), tables, partition_posts)
+    if not arrow:
+        for folder, _, files in os.walk(dir_path):
+            for name in files:
+                if name.endswith('.arrow'):
+                    os.remove(os.path.join(folder, name))
+
+    full, compact = make_service(str(tmp_path), 'full'), make_service(str(tmp_path), 'compact')
+    places = tables[0]
+    requests = [(city, query, None) for city in sorted(set(places['city'])) for query in QUERIES[:1]]
+    requests += [(places['city'][i], QUERIES[i % len(QUERIES)],
+                  (places['location.coordinates[0]'][i], places['location.coordinates[1]'][i]))
+                 for i in range(0, 600, 97)]
+
+    for user_city, user_prompt, location in requests:
+        expected = run_request(full, user_city, user_prompt, location)
+        actual = run_request(compact, user_city, user_prompt, location)
+        assert actual.compiled_prompt == expected.compiled_prompt, (user_city, user_prompt, location)
+        assert actual.response == expected.response
+        assert actual.prompt_report['places_included'] > 0
+
+
+def test_compact_profile_dtypes_and_memory(tmp_path):
+    tables = sample_tables()
+    write_version(str(tmp_path), tables, partition_posts=True)
+    full = DatasetLoader(str(tmp_path), profile='full')
+    compact = DatasetLoader(str(tmp_path), profile='compact')
+    full.load_datasets()
+    compact.load_datasets()
+
+    posts = compact.get_posts()
+    assert isinstance(posts['city'].dtype, pd.CategoricalDtype)
+    assert str(posts['followersCount'].dtype) == 'Int64'  # gaps, and values beyond int32
+    assert 'caption' not in posts.columns and 'summarization' in compact.get_places().columns
+    assert posts['followersCount'].max() == tables[2]['followersCount'].max()
+
+    # Cold columns come back for exactly the rows asked for, with the values as stored
+    rows = compact.with_columns(posts.iloc[::37], 'posts', ['caption', 'url'])
+    stored = full.get_posts().iloc[::37]
+    pd.testing.assert_series_equal(rows['url'].astype(object), stored['url'].astype(object), check_names=False)
+    assert rows['caption'].isna().equals(stored['caption'].isna())
+
+    full_report, compact_report = full.memory_report(), compact.memory_report()
+    assert set(compact_report) == set(full_report)
+    assert sum(entry['bytes'] for entry in compact_report.values()) < sum(entry['bytes'] for entry in full_report.values())
+    assert compact_report['posts']['cold_columns'] == ['url', 'Phase1.transcript.0', 'caption', 'profilePicUrl']
@@ -0,0 +1,212 @@
+import abc
+import json
+import os
+import re
+import sys
+import threading
+from bisect import bisect_left
+from config.settings import Config
+
+
+class TraceSink(abc.ABC):
+    """Receives every finished span"""
+
+    @abc.abstractmethod
+    def record(self, span):
+        """Handle one finished span"""
+
+
+class LogSink(TraceSink):
+    """One JSON line per span, printed to `stream` (stdout by default).
+
+    Spans faster than `min_seconds` are skipped, to keep only slow stages.
+    """
+
+    def __init__(self, stream=None, min_seconds=0.0):
+        self.stream = stream
+        self.min_seconds = min_seconds
+
+    def record(self, span):
+        if span.seconds < self.min_seconds:
+            return
+        line = {'pipeline': span.pipeline, 'stage': span.name, 'seconds': round(span.seconds, 6)}
+        if span.error is not None:
+            line['error'] = span.error
+        line.update(span.attributes)
+        print(json.dumps(line, default=str), file=self.stream or sys.stdout)
+
+
+class Histogram:
+    """Fixed-bucket histogram; bucket i counts values <= buckets[i], the last one the rest"""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q):
+        """Estimate of the q-quantile, interpolating linearly inside its bucket"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, bucket_count in enumerate(self.counts):
+            if seen + bucket_count >= rank and bucket_count:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else self.buckets[-1]
+                return lower + (upper - lower) * (rank - seen) / bucket_count
+            seen += bucket_count
+        return self.buckets[-1]
+
+    def summary(self):
+        return {'count': self.count, 'sum': self.sum, 'mean': self.sum / self.count if self.count else None,
+                'p50': self.quantile(0.5), 'p95': self.quantile(0.95), 'p99': self.quantile(0.99)}
+
+
+# Numeric span attributes that add up across spans; booleans (cache_hit, ...) count the spans where they hold
+COUNTER_ATTRIBUTES = ('rows_in', 'rows_out', 'prompt_tokens', 'cache_hits')
+
+
+class _Series:
+    """Everything recorded for one (pipeline, stage)"""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.errors = 0
+        # Wall time plus any other `*_seconds` attribute, e.g. model latency
+        self.histograms = {'seconds': Histogram(buckets)}
+        # Sums of the counter attributes and counts of the boolean ones
+        self.totals = {}
+        # Last and largest value of every other numeric attribute: cities, max_distance_km, workers...
+        self.gauges = {}
+
+    def observe(self, span):
+        self.histograms['seconds'].observe(span.seconds)
+        if span.error is not None:
+            self.errors += 1
+        for name, value in span.attributes.items():
+            if value is None or not isinstance(value, (int, float)):
+                continue
+            if name.endswith('_seconds'):
+                histogram = self.histograms.get(name)
+                if histogram is None:
+                    histogram = self.histograms[name] = Histogram(self.buckets)
+                histogram.observe(value)
+            elif isinstance(value, bool) or name in COUNTER_ATTRIBUTES:
+                self.totals[name] = self.totals.get(name, 0) + value
+            else:
+                gauge = self.gauges.get(name)
+                self.gauges[name] = {'last': value, 'max': value if gauge is None else max(gauge['max'], value)}
+
+
+class HistogramSink(TraceSink):
+    """In-memory latency histograms, counter totals and gauges per (pipeline, stage)"""
+
+    def __init__(self, buckets=None):
+        self.buckets = tuple(sorted(buckets or Config.TRACING_BUCKETS))
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def record(self, span):
+        key = (span.pipeline, span.name)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = _Series(self.buckets)
+            series.observe(span)
+
+    def snapshot(self):
+        """{pipeline: {stage: {'errors', '<histogram>': summary, 'totals', 'gauges'}}}"""
+        with self._lock:
+            result = {}
+            for (pipeline, stage), series in self._series.items():
+                entry = {name: histogram.summary() for name, histogram in series.histograms.items()}
+                entry['errors'] = series.errors
+                entry['totals'] = dict(series.totals)
+                entry['gauges'] = {name: dict(gauge) for name, gauge in series.gauges.items()}
+                result.setdefault(pipeline, {})[stage] = entry
+            return result
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+
+def _metric_name(name):
+    return re.sub(r'[^a-zA-Z0-9_]', '_', name)
+
+
+def _labels(pipeline, stage, **extra):
+    pairs = {'pipeline': pipeline, 'stage': stage, **extra}
+    return '{' + ','.join(f'{key}="{value}"' for key, value in pairs.items()) + '}'
+
+
+class PrometheusSink(HistogramSink):
+    """HistogramSink that renders the Prometheus text exposition format.
+
+    Serve `render()` from a /metrics endpoint, or `dump()` it to a file for
+    the node exporter textfile collector after batch jobs.
+    """
+
+    PREFIX = 'dumplinai_stage'
+
+    def render(self):
+        with self._lock:
+            series = sorted(self._series.items())
+            histograms, counters, gauges = {}, {'errors': []}, {}
+            for (pipeline, stage), entry in series:
+                for name, histogram in entry.histograms.items():
+                    histograms.setdefault(name, []).append((pipeline, stage, histogram))
+                counters['errors'].append((pipeline, stage, entry.errors))
+                for name, total in entry.totals.items():
+                    counters.setdefault(name, []).append((pipeline, stage, total))
+                for name, gauge in entry.gauges.items():
+                    gauges.setdefault(name, []).append((pipeline, stage, gauge['last']))
+                    gauges.setdefault(f"{name}_max", []).append((pipeline, stage, gauge['max']))
+
+            lines = []
+            for name, rows in histograms.items():
+                metric = f"{self.PREFIX}_{_metric_name(name)}"
+                lines.append(f"# TYPE {metric} histogram")
+                for pipeline, stage, histogram in rows:
+                    cumulative = 0
+                    for bound, bucket_count in zip(self.buckets, histogram.counts):
+                        cumulative += bucket_count
+                        lines.append(f"{metric}_bucket{_labels(pipeline, stage, le=bound)} {cumulative}")
+                    lines.append(f"{metric}_bucket{_labels(pipeline, stage, le='+Inf')} {histogram.count}")
+                    lines.append(f"{metric}_sum{_labels(pipeline, stage)} {histogram.sum}")
+                    lines.append(f"{metric}_count{_labels(pipeline, stage)} {histogram.count}")
+            for name, rows in counters.items():
+                metric = f"{self.PREFIX}_{_metric_name(name)}_total"
+                lines.append(f"# TYPE {metric} counter")
+                lines.extend(f"{metric}{_labels(pipeline, stage)} {total}" for pipeline, stage, total in rows)
+            for name, rows in gauges.items():
+                metric = f"{self.PREFIX}_{_metric_name(name)}"
+                lines.append(f"# TYPE {metric} gauge")
+                lines.extend(f"{metric}{_labels(pipeline, stage)} {value}" for pipeline, stage, value in rows)
+        return '\n'.join(lines) + '\n'
+
+    def dump(self, path):
+        """Write render() atomically to path"""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(self.render())
+        os.replace(tmp_path, path)
+        return path
+
+
+SINKS = {'log': LogSink, 'histogram': HistogramSink, 'prometheus': PrometheusSink}
+
+
+def make_sinks(names):
+    """Build the sinks named in Config.TRACING_SINKS"""
+    unknown = [name for name in names if name not in SINKS]
+    if unknown:
+        raise ValueError(f"Unknown trace sinks {unknown}, expected any of {sorted(SINKS)}")
+    return [SINKS[name]() for name in names]
@@ -0,0 +1,86 @@
+import contextlib
+import threading
+import time
+from config.settings import Config
+from tracing.sinks import make_sinks
+
+
+class Span:
+    """One timed run of a pipeline stage, with its counters"""
+
+    __slots__ = ('name', 'pipeline', 'attributes', 'seconds', 'error')
+
+    def __init__(self, name, pipeline, attributes, seconds=0.0, error=None):
+        self.name = name
+        self.pipeline = pipeline
+        self.attributes = attributes
+        self.seconds = seconds
+        self.error = error
+
+    def set(self, **attributes):
+        """Attach counters such as rows_in, rows_out, prompt_tokens or cache_hit.
+
+        Numeric and boolean values are summed by the histogram sinks; names
+        ending in `_seconds` get their own latency histogram.
+        """
+        self.attributes.update(attributes)
+        return self
+
+
+class Tracer:
+    """Times pipeline stages and hands each finished span to the sinks.
+
+    A span costs two perf_counter calls and one small dict, so tracing is
+    meant to stay on in production; set Config.TRACING_ENABLED = False to
+    make spans no-ops.
+    """
+
+    def __init__(self, sinks=None, enabled=None):
+        self.sinks = list(sinks) if sinks is not None else make_sinks(Config.TRACING_SINKS)
+        self.enabled = Config.TRACING_ENABLED if enabled is None else enabled
+
+    @contextlib.contextmanager
+    def span(self, name, pipeline, **attributes):
+        span = Span(name, pipeline, attributes)
+        if not self.enabled:
+            yield span
+            return
+        started = time.perf_counter()
+        try:
+            yield span
+        except Exception as e:
+            span.error = type(e).__name__
+            raise
+        finally:
+            span.seconds = time.perf_counter() - started
+            self.emit(span)
+
+    def record(self, name, pipeline, seconds, error=None, **attributes):
+        """Emit a span for work that was timed elsewhere"""
+        if self.enabled:
+            self.emit(Span(name, pipeline, attributes, seconds, error))
+
+    def emit(self, span):
+        for sink in self.sinks:
+            try:
+                sink.record(span)
+            except Exception as e:
+                print(f"Error recording span {span.pipeline}.{span.name}: {e}")
+
+    def find_sink(self, sink_type):
+        """First sink of the given type, e.g. the PrometheusSink behind a /metrics endpoint"""
+        return next((sink for sink in self.sinks if isinstance(sink, sink_type)), None)
+
+
+_default_tracer = None
+_default_lock = threading.Lock()
+
+
+def get_tracer():
+    """Process-wide tracer built from Config, shared by the services and preprocessors"""
+    global _default_tracer
+    if _default_tracer is None:
+        with _default_lock:
+            if _default_tracer is None:
+                _default_tracer = Tracer()
+    return _default_tracer